@@ -0,0 +1,97 @@
+import json
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+from searchEngine.SearchCodeEngine import SearchCodeEngine
+from searchEngine.SearchCodeDocEngine import SearchCodeDocEngine
+from searchEngine.VectorBackend import ollama_embed_function
+from Tracer import get_tracer
+
+
+def read_questions(questions_path: str) -> Iterator[Dict[str, Any]]:
+    '''
+    Stream questions from a file: JSON lines with a "question" field (other fields are kept and
+    echoed into the output) or plain text with one question per line.
+    '''
+    with open(questions_path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                record = json.loads(line)
+                record.setdefault("id", line_number)
+                yield record
+            else:
+                yield {"id": line_number, "question": line}
+
+
+class BatchSearchService:
+    '''Retrieval for large question sets: batched embedding and one vector lookup per collection per batch'''
+
+    def __init__(self, code_persistence_directory: str = "./embeddings/code",
+                 doc_persistence_directory: str = "./embeddings/docs",
+                 databases: Optional[List[str]] = None, batch_size: int = 256, n_results: int = 5):
+        self.databases = databases or ["code_db", "documentation_db"]
+        self.batch_size = batch_size
+        self.n_results = n_results
+        self.code_search_engine = SearchCodeEngine(code_persistence_directory) if "code_db" in self.databases else None
+        self.doc_search_engine = SearchCodeDocEngine(doc_persistence_directory) if "documentation_db" in self.databases else None
+        self.tracer = get_tracer()
+
+    def search_batch(self, questions: List[str]) -> List[Dict[str, List[Dict[str, Any]]]]:
+        """
+        Search every selected collection for a batch of questions.
+
+        Args:
+            questions (List[str]): The questions of one batch
+
+        Returns:
+            List[Dict[str, List[Dict[str, Any]]]]: Per question, the results of each database
+        """
+        results = [{} for _ in questions]
+        engines = [
+            ("code_db", self.code_search_engine, lambda engine, vectors: engine.query_similar_code_batch(vectors, self.n_results)),
+            ("documentation_db", self.doc_search_engine, lambda engine, vectors: engine.query_similar_docs_batch(vectors, self.n_results)),
+        ]
+        for db_name, engine, lookup in engines:
+            if engine is None:
+                continue
+            with self.tracer.span("batch.embed", db=db_name, questions=len(questions)):
+                # The batch path bypasses the interactive query cache so sweeps do not evict it
+                vectors = ollama_embed_function(engine.model_name, priority="batch")(questions)
+            with self.tracer.span("batch.search", db=db_name, questions=len(questions)):
+                for result, matches in zip(results, lookup(engine, vectors)):
+                    result[db_name] = matches
+        return results
+
+    def run(self, questions: Iterable[Dict[str, Any]], output_path: str) -> Dict[str, Any]:
+        """
+        Stream questions through search_batch and write one JSON line per question as soon as
+        its batch completes.
+
+        Args:
+            questions (Iterable[Dict[str, Any]]): Question records with a "question" field
+            output_path (str): JSON lines output file
+
+        Returns:
+            Dict[str, Any]: Number of questions and batches processed
+        """
+        summary = {"questions": 0, "batches": 0}
+        with open(output_path, 'w', encoding='utf-8') as output:
+            batch = []
+            for record in questions:
+                batch.append(record)
+                if len(batch) == self.batch_size:
+                    self._write_batch(batch, output, summary)
+                    batch = []
+            if batch:
+                self._write_batch(batch, output, summary)
+        return summary
+
+    def _write_batch(self, batch: List[Dict[str, Any]], output, summary: Dict[str, Any]):
+        search_results = self.search_batch([record["question"] for record in batch])
+        for record, results in zip(batch, search_results):
+            output.write(json.dumps({**record, "results": results}) + "\n")
+        output.flush()
+        summary["questions"] += len(batch)
+        summary["batches"] += 1
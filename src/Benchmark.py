@@ -0,0 +1,227 @@
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any, Optional
+
+from agents.QueryAnalysisAgent import QueryAnalysisService
+from CodebaseEmbedding import CodeTextEmbedding
+from CodeDocGenerator import CodeDocGenerator
+from Reranker import Reranker
+from RerankScoreCache import RerankScoreCache
+from GenerateAnswerService import GenerateAnswerService
+from InferenceScheduler import get_inference_scheduler
+from ModelCascade import get_cascade_stats
+from mockServices.InMemoryGraph import InMemoryGraph, InMemoryGraphDriver
+from mockServices.MockOllamaServer import MockOllamaServer, use_ollama_host
+from Tracer import get_tracer, percentile
+
+DEFAULT_DATASET_PATH = os.path.join(os.path.dirname(__file__), '..', 'RapidSCADATestingData',
+                                    'valid_feedback_with_context.json')
+
+
+class BenchmarkRunner:
+    '''Replays the RapidSCADA doc-quality dataset through doc generation and question answering'''
+
+    def __init__(self, dataset_path: str = DEFAULT_DATASET_PATH, ollama_host: Optional[str] = None,
+                 max_methods: Optional[int] = None, max_queries: Optional[int] = None,
+                 candidates_per_query: int = 5):
+        """
+        Args:
+            dataset_path (str): Path to the JSON file of ranked method docs keyed by class FQN
+            ollama_host (Optional[str]): Real ollama host to benchmark; a deterministic local stub is used when None
+            max_methods (Optional[int]): Cap on replayed methods for the doc generation phase
+            max_queries (Optional[int]): Cap on questions for the question answering phase
+            candidates_per_query (int): Number of candidate documents reranked per question
+        """
+        self.dataset_path = dataset_path
+        self.ollama_host = ollama_host
+        self.max_methods = max_methods
+        self.max_queries = max_queries
+        self.candidates_per_query = candidates_per_query
+        self._stage_durations: Dict[str, List[float]] = {}
+        self._cache_flags: Dict[str, List[bool]] = {}
+
+    def load_methods(self) -> List[Dict[str, str]]:
+        with open(self.dataset_path, 'r', encoding='utf-8') as file:
+            dataset = json.load(file)
+
+        methods = []
+        for class_name, entries in dataset.items():
+            for entry in entries:
+                methods.append({
+                    "class_name": class_name,
+                    "function_name": entry["function_name"],
+                    "ranking": entry.get("ranking", ""),
+                    # A few entries use a lower-case key
+                    "reasoning": entry.get("Reasoning", entry.get("reasoning", ""))
+                })
+        return methods
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Run both benchmark phases and collect the results.
+
+        Returns:
+            Dict[str, Any]: Machine-readable results with throughput, latency percentiles,
+                per-stage timings, cache hit rates and peak RSS
+        """
+        methods = self.load_methods()
+        stub_server = None
+        if self.ollama_host is None:
+            stub_server = MockOllamaServer().start()
+            use_ollama_host(stub_server.url)
+        else:
+            use_ollama_host(self.ollama_host)
+
+        tracer = get_tracer()
+        tracer.add_listener(self._collect_span)
+        try:
+            doc_results = self._bench_doc_generation()
+            qa_results = self._bench_question_answering(methods)
+        finally:
+            tracer.remove_listener(self._collect_span)
+            if stub_server:
+                stub_server.stop()
+
+        return {
+            "dataset": os.path.abspath(self.dataset_path),
+            "backend": self.ollama_host or "stub",
+            "doc_generation": doc_results,
+            "question_answering": qa_results,
+            "stages": {name: self._latency_summary(values) for name, values in self._stage_durations.items()},
+            "cache_hit_rates": {name: sum(flags) / len(flags) for name, flags in self._cache_flags.items()},
+            "llm_requests": stub_server.request_count if stub_server else None,
+            "model_cascade": get_cascade_stats(),
+            "scheduler": get_inference_scheduler().stats(),
+            "peak_rss_mb": self._peak_rss_mb()
+        }
+
+    def _bench_doc_generation(self) -> Dict[str, Any]:
+        '''
+        Document the dataset's methods with CodeDocGenerator on an in-memory graph, then embed the
+        records twice: the second pass measures the skip of unchanged inputs.
+        '''
+        graph = InMemoryGraph().load_from_feedback_dataset(self.dataset_path, max_methods=self.max_methods)
+        with tempfile.TemporaryDirectory() as working_directory:
+            docs_directory = os.path.join(working_directory, "generated_docs")
+            started = time.monotonic()
+            summary = CodeDocGenerator(driver=InMemoryGraphDriver(graph)).generate_codebase_docs(docs_directory)
+            elapsed = time.monotonic() - started
+
+            embedder = CodeTextEmbedding(os.path.join(working_directory, "embeddings"))
+            embed_passes = []
+            for _ in range(2):
+                embed_started = time.monotonic()
+                embed_summary = embedder.embed_directory(docs_directory, follow=False)
+                embed_passes.append({
+                    "seconds": time.monotonic() - embed_started,
+                    "embedded": embed_summary["successful_embeddings"],
+                    "skipped_unchanged": embed_summary["skipped_unchanged"]
+                })
+
+        methods = summary["documented_methods"]
+        return {
+            "methods": methods,
+            "seconds": elapsed,
+            "methods_per_second": methods / elapsed if elapsed else 0.0,
+            "template_methods": summary["template_methods"],
+            "generated_methods": summary["generated_methods"],
+            "duplicate_methods": summary["duplicate_methods"],
+            "field_fallbacks": summary["field_fallbacks"],
+            "embedding": embed_passes
+        }
+
+    def _bench_question_answering(self, methods: List[Dict[str, str]]) -> Dict[str, Any]:
+        analysis_service = QueryAnalysisService()
+        # A fresh score cache, so scores left by an earlier run do not inflate the hit rate
+        self._score_cache_directory = tempfile.TemporaryDirectory()
+        reranker = Reranker(score_cache=RerankScoreCache(
+            os.path.join(self._score_cache_directory.name, "rerank_scores.sqlite")))
+        answer_service = GenerateAnswerService()
+        tracer = get_tracer()
+
+        methods_by_class: Dict[str, List[Dict[str, str]]] = {}
+        for method in methods:
+            methods_by_class.setdefault(method["class_name"], []).append(method)
+
+        questions = []
+        for class_name, class_methods in methods_by_class.items():
+            candidates = [
+                {"title": m["function_name"], "content": m["reasoning"], "source_db": "documentation_db"}
+                for m in class_methods[:self.candidates_per_query]
+            ]
+            question = f"What does {class_name}.{class_methods[0]['function_name']} do?"
+            questions.append((question, candidates))
+        questions = questions[:self.max_queries]
+
+        latencies = []
+        started = time.monotonic()
+        for question, candidates in questions:
+            query_started = time.monotonic()
+            with tracer.span("bench.query"):
+                with tracer.span("query.analysis"):
+                    analysis_service.analyze_query(question)
+                with tracer.span("rerank", candidates=len(candidates)):
+                    reranked = reranker.rerank(question, candidates)
+                with tracer.span("answer.generation"):
+                    answer_service.generate_answer(question, reranked)
+            latencies.append((time.monotonic() - query_started) * 1000.0)
+        elapsed = time.monotonic() - started
+
+        return {
+            "queries": len(questions),
+            "seconds": elapsed,
+            "queries_per_second": len(questions) / elapsed if elapsed else 0.0,
+            "latency_ms": self._latency_summary(latencies)
+        }
+
+    def _collect_span(self, record: Dict[str, Any]):
+        self._stage_durations.setdefault(record["name"], []).append(record["duration_ms"])
+        if "cache_hit" in record["attributes"]:
+            self._cache_flags.setdefault(record["name"], []).append(record["attributes"]["cache_hit"])
+
+    def _latency_summary(self, values: List[float]) -> Dict[str, float]:
+        ordered = sorted(values)
+        return {
+            "count": len(ordered),
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1] if ordered else 0.0
+        }
+
+    def _peak_rss_mb(self) -> float:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def format_benchmark_report(results: Dict[str, Any]) -> str:
+    doc = results["doc_generation"]
+    qa = results["question_answering"]
+    lines = [
+        f"Backend: {results['backend']}",
+        f"Doc generation: {doc['methods']} methods, {doc['methods_per_second']:.2f} methods/s; "
+        f"{doc['generated_methods']} generated, {doc['template_methods']} from templates, "
+        f"{doc['duplicate_methods']} reused from a near duplicate"
+    ]
+    for number, embed_pass in enumerate(doc["embedding"], 1):
+        lines.append(f"Doc embedding pass {number}: {embed_pass['embedded']} embedded, "
+                     f"{embed_pass['skipped_unchanged']} unchanged skipped, {embed_pass['seconds']:.2f} s")
+    lines += [
+        f"Question answering: {qa['queries']} queries, {qa['queries_per_second']:.2f} queries/s, "
+        f"p50 {qa['latency_ms']['p50']:.1f} ms, p95 {qa['latency_ms']['p95']:.1f} ms, p99 {qa['latency_ms']['p99']:.1f} ms",
+        f"Peak RSS: {results['peak_rss_mb']:.1f} MB"
+    ]
+    for name, rate in sorted(results["cache_hit_rates"].items()):
+        lines.append(f"Cache hit rate [{name}]: {rate:.1%}")
+    for task, stats in sorted(results.get("model_cascade", {}).items()):
+        lines.append(f"Escalation rate [{task}]: {stats['escalation_rate']:.1%} of {stats['requests']} requests")
+    for priority, stats in results.get("scheduler", {}).items():
+        if stats["calls"]:
+            lines.append(f"Scheduler [{priority}]: {stats['calls']} calls, {stats['queued']} queued "
+                         f"({stats['queue_seconds'] * 1000:.1f} ms total), {stats['preempted']} preempted")
+    return "\n".join(lines)
@@ -1,68 +1,232 @@
-from typing import List, Dict
-
-from neo4j import GraphDatabase
-
-from agents.CodeDocGenerationAgent import CodeDocGenerationAgent
-from agents.FormattingAgent import FormattingAgent
-from agents.PseudocodeGenerationAgent import PseudocodeGenerationAgent
-from MethodGraphAnalyzer import MethodGraphAnalyzer
-from CodeEntity import CodeEntity, MethodEntity, CodeEntityFactory
-
-
-class CodeDocGenerator:
-    '''The class will generate code documentation and pseudocode'''
-    
-    def __init__(self):
-        self._doc_generation_agent = CodeDocGenerationAgent()
-        self._pseudocode_agent = PseudocodeGenerationAgent()
-        self._format_agent = FormattingAgent()
-        self._graph_analyzer = MethodGraphAnalyzer()
-        self._load_prompt_templates()
-
-    def _generate_method_docs(self, method: MethodEntity) -> Dict[str, str]:
-        # todo: refine the code context
-        code_context = f"Method in class {method.namespace}.{method.name}"
-        docs = self._doc_generation_agent.generate_docs(
-            code_context=code_context,
-            code_snippet=method.code_snippet
-        )
-    
-    def _generate_pseudocode(self, method: MethodEntity) -> str:
-        # todo: refine the code context
-        code_context = f"Method in class {method.namespace}.{method.name}"
-        return self._pseudocode_agent.generate_pseudocode(code_context, method.code_snippet)
-    
-    def generate_codebase_docs(self):
-        method_names: List[str] = self._graph_analyzer.generate_topology_order()
-        codebase_docs = []
-        
-        for method_name in method_names:
-            with self._graph_analyzer.driver.session() as session:
-                result = session.run(
-                    "MATCH (m:Method {FullyQualifiedName: $name}) RETURN m",
-                    name=method_name
-                )
-                method_node = result.single()['m']
-            
-            method_entity = self._entity_factory.create_code_entity_from_node(method_node)
-            docs = self._generate_method_docs(method_entity)
-            pseudocode = self._generate_pseudocode(method_entity)
-            formatted_code = self._format_agent.format_code(docs["code_with_comments"])
-            
-            method_info = {
-                "name": method_entity.name,
-                "fully_qualified_name": method_entity.fully_qualified_name,
-                "documentation": docs["documentation"],
-                "code_with_comments": formatted_code,
-                "pseudocode": pseudocode,
-                "raw_declaration": method_entity.raw_declaration,
-                "accessibility": method_entity.accessibility,
-                "is_abstract": method_entity.is_abstract,
-                "is_construct": method_entity.is_construct,
-                "is_destructor": method_entity.is_destructor,
-                "return_type": method_entity.return_type,
-                "variable_context": method_entity.variable_context,
-                "invoked_context": method_entity.invoked_context,
-            }
-            
-            codebase_docs.append(method_info)
+import json
+from typing import List, Dict, Any, Optional, Tuple
+
+from agents.CodeDocGenerationAgent import CodeDocGenerationAgent
+from agents.FormattingAgent import FormattingAgent
+from agents.PseudocodeGenerationAgent import PseudocodeGenerationAgent
+from MethodGraphAnalyzer import MethodGraphAnalyzer
+from NearDuplicateDetector import NearDuplicateDetector, DuplicateClusters
+from TrivialMethodClassifier import TrivialMethodClassifier
+from CodeEntity import CodeEntity, MethodEntity, CodeEntityFactory
+from DocRecordSink import DocRecordSink
+
+
+class CodeDocGenerator:
+    '''The class will generate code documentation and pseudocode'''
+
+    def __init__(self, driver=None, deduplicate: bool = True, duplicate_threshold: float = 0.9,
+                 use_templates: bool = True, combined: bool = True):
+        """
+        Args:
+            driver: Optional neo4j driver; by default one is opened from the environment
+            deduplicate (bool): Document one representative per cluster of near-duplicate methods
+                and reuse its documentation and pseudocode for the other members
+            duplicate_threshold (float): Minimum estimated Jaccard similarity of two snippets to share docs
+            use_templates (bool): Document trivial methods (accessors, field-assigning constructors,
+                delegators, empty and abstract methods) from templates without a model call
+            combined (bool): Generate documentation, commented code and pseudocode in one structured
+                call, falling back to the separate agents only for fields that call did not produce
+        """
+        self._doc_generation_agent = CodeDocGenerationAgent()
+        self._pseudocode_agent = PseudocodeGenerationAgent()
+        self._format_agent = FormattingAgent()
+        self._graph_analyzer = MethodGraphAnalyzer(driver)
+        self._duplicate_detector = NearDuplicateDetector(threshold=duplicate_threshold) if deduplicate else None
+        self._trivial_classifier = TrivialMethodClassifier() if use_templates else None
+        self._combined = combined
+        self._field_fallbacks: Dict[str, int] = {}
+
+    def _generate_method_outputs(self, method: MethodEntity) -> Dict[str, str]:
+        if not self._combined:
+            docs = self._generate_method_docs(method)
+            docs["pseudocode"] = self._generate_pseudocode(method)
+            return docs
+
+        # todo: refine the code context
+        code_context = f"Method in class {method.namespace}.{method.name}"
+        outputs = self._doc_generation_agent.generate_combined(code_context, method.code_snippet)
+        if "documentation" not in outputs:
+            self._count_fallback("documentation")
+            outputs.update({field: value for field, value in self._generate_method_docs(method).items()
+                            if field not in outputs})
+        if "code_with_comments" not in outputs:
+            # Not worth a model call of its own: the uncommented snippet is an acceptable stand-in
+            self._count_fallback("code_with_comments")
+            outputs["code_with_comments"] = method.code_snippet
+        if "pseudocode" not in outputs:
+            self._count_fallback("pseudocode")
+            outputs["pseudocode"] = self._generate_pseudocode(method)
+        return outputs
+
+    def _count_fallback(self, field: str):
+        self._field_fallbacks[field] = self._field_fallbacks.get(field, 0) + 1
+
+    def _generate_method_docs(self, method: MethodEntity) -> Dict[str, str]:
+        # todo: refine the code context
+        code_context = f"Method in class {method.namespace}.{method.name}"
+        response = self._doc_generation_agent.generate_docs(
+            code_context=code_context,
+            code_snippet=method.code_snippet
+        )
+        docs = self._parse_docs(response)
+        if not docs.get("documentation"):
+            docs = self._format_agent.format_code(response)
+        return {
+            "documentation": docs.get("documentation") or response,
+            "code_with_comments": docs.get("code_with_comments") or method.code_snippet
+        }
+
+    def _parse_docs(self, response: str) -> Dict[str, str]:
+        # The model usually wraps the JSON object in a fenced block with some prose around it
+        start, end = response.find('{'), response.rfind('}')
+        if start == -1 or end <= start:
+            return {}
+        try:
+            docs = json.loads(response[start:end + 1])
+        except json.JSONDecodeError:
+            return {}
+        return docs if isinstance(docs, dict) else {}
+
+    def _generate_pseudocode(self, method: MethodEntity) -> str:
+        # todo: refine the code context
+        code_context = f"Method in class {method.namespace}.{method.name}"
+        return self._pseudocode_agent.generate_pseudocode(code_context, method.code_snippet)
+
+    def _classify_methods(self, method_names: List[str]) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """
+        First pass: classify every method and take the near-duplicate signature of the rest. Methods
+        are loaded a page at a time and dropped after, so only the kinds and signatures stay in memory.
+
+        Returns:
+            Tuple[Dict[str, str], Dict[str, Any]]: Template kind per trivial method, and MinHash
+                signature per other method (empty without deduplication)
+        """
+        trivial_kinds: Dict[str, str] = {}
+        signatures: Dict[str, Any] = {}
+        for method_entity in CodeEntityFactory.load_code_entities(self._graph_analyzer.driver, "Method", method_names):
+            name = method_entity.fully_qualified_name
+            kind = self._trivial_classifier.classify(method_entity) if self._trivial_classifier else None
+            if kind:
+                trivial_kinds[name] = kind
+            elif self._duplicate_detector:
+                signatures[name] = self._duplicate_detector.signature(method_entity.code_snippet)
+        return trivial_kinds, signatures
+
+    def _cluster_methods(self, method_names: List[str], signatures: Dict[str, Any]) -> DuplicateClusters:
+        # Methods come in topological order, so each representative is documented before its duplicates
+        if self._duplicate_detector:
+            return self._duplicate_detector.cluster_signatures((name, signatures.get(name)) for name in method_names)
+        clusters = DuplicateClusters()
+        for name in method_names:
+            clusters.add(name, name)
+        return clusters
+
+    def _store_method_docs(self, method_info: Dict[str, Any]):
+        with self._graph_analyzer.driver.session() as session:
+            session.run(
+                "MATCH (m:Method {FullyQualifiedName: $name}) "
+                "SET m.documentation = $documentation, m.pseudo_code = $pseudo_code, "
+                "m.DuplicateCluster = $duplicate_cluster, m.DuplicateOf = $duplicate_of, m.DocSource = $doc_source",
+                name=method_info["fully_qualified_name"],
+                documentation=method_info["documentation"],
+                pseudo_code=method_info["pseudocode"],
+                duplicate_cluster=method_info["duplicate_cluster"],
+                duplicate_of=method_info["duplicate_of"],
+                doc_source=method_info["doc_source"]
+            )
+
+    def generate_codebase_docs(self, output_directory: str = "./generated_docs",
+                               output_format: str = "jsonl") -> Dict[str, Any]:
+        """
+        Document every method of the graph in topological order and write the documentation and
+        pseudocode back to the Method nodes. Trivial methods are documented from templates; the
+        rest are clustered by near-duplicate content and only the first method of each cluster is
+        sent to the model. Each method's record is streamed to a DocRecordSink as soon as it is
+        done instead of being kept for the summary, so CodeTextEmbedding can embed the output
+        while generation is still running.
+
+        Args:
+            output_directory (str): Directory of the per-namespace record shards
+            output_format (str): "jsonl" or "parquet" (needs pyarrow)
+
+        Returns:
+            Dict[str, Any]: A summary of the run, including:
+                - documented_methods: Number of methods documented
+                - output_directory: Where the records were written
+                - shards: Records per namespace shard
+                - template_methods: Methods documented from a template, without a model call
+                - template_kinds: Template-documented methods per kind (constructor, getter, ...)
+                - generated_methods: Methods documented by the model
+                - duplicate_methods: Methods that reused the documentation of their cluster's representative
+                - field_fallbacks: In combined mode, fields per name that the combined call did not produce
+        """
+        self._field_fallbacks = {}
+        method_names: List[str] = self._graph_analyzer.generate_topology_order()
+        trivial_kinds, signatures = self._classify_methods(method_names)
+        clusters = self._cluster_methods([name for name in method_names if name not in trivial_kinds], signatures)
+
+        # Only representatives with duplicates are kept, until the run ends, for their members to reuse
+        generated: Dict[str, Dict[str, str]] = {}
+        generated_methods = 0
+        template_kinds: Dict[str, int] = {}
+        documented_methods = 0
+        # Closing removes the sink's writing marker even when generation fails, so readers stop following
+        with DocRecordSink(output_directory, output_format) as sink:
+            # Loaded again page by page, in topological order, so only a page of code is held at a time
+            for method_entity in CodeEntityFactory.load_code_entities(self._graph_analyzer.driver, "Method", method_names):
+                kind = trivial_kinds.get(method_entity.fully_qualified_name)
+                if kind:
+                    docs = self._trivial_classifier.render(method_entity, kind)
+                    template_kinds[kind] = template_kinds.get(kind, 0) + 1
+                    # Template docs are cheap and exact, so trivial methods are not clustered
+                    representative = method_entity.fully_qualified_name
+                    duplicate_cluster = ""
+                else:
+                    representative = clusters.representative_of(method_entity.fully_qualified_name)
+                    duplicate_cluster = clusters.cluster_id(method_entity.fully_qualified_name)
+                    if representative in generated:
+                        # The commented code is specific to the representative's source, so a
+                        # member keeps its own snippet uncommented
+                        docs = {**generated[representative], "code_with_comments": method_entity.code_snippet}
+                    else:
+                        docs = self._generate_method_outputs(method_entity)
+                        generated_methods += 1
+                        if len(clusters.members(representative)) > 1:
+                            generated[representative] = {field: docs[field] for field in ("documentation", "pseudocode")}
+
+                method_info = {
+                    "name": method_entity.name,
+                    "namespace": method_entity.namespace,
+                    "fully_qualified_name": method_entity.fully_qualified_name,
+                    "documentation": docs["documentation"],
+                    "code_with_comments": docs["code_with_comments"],
+                    "pseudocode": docs["pseudocode"],
+                    "raw_declaration": method_entity.raw_declaration,
+                    "accessibility": method_entity.accessibility,
+                    "is_abstract": method_entity.is_abstract,
+                    "is_construct": method_entity.is_construct,
+                    "is_destructor": method_entity.is_destructor,
+                    "return_type": method_entity.return_type,
+                    "variable_context": method_entity.variable_context,
+                    "invoked_context": method_entity.invoked_context,
+                    "duplicate_cluster": duplicate_cluster,
+                    "duplicate_of": representative,
+                    "doc_source": f"template:{kind}" if kind else "model",
+                }
+
+                self._store_method_docs(method_info)
+                sink.write(method_info, method_entity.namespace)
+                documented_methods += 1
+
+        manifest = sink.close()
+        template_methods = sum(template_kinds.values())
+        return {
+            "documented_methods": documented_methods,
+            "output_directory": output_directory,
+            "shards": manifest["shards"],
+            "template_methods": template_methods,
+            "template_kinds": template_kinds,
+            "generated_methods": generated_methods,
+            "duplicate_methods": documented_methods - template_methods - generated_methods,
+            "field_fallbacks": dict(self._field_fallbacks)
+        }
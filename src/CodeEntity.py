@@ -1,87 +1,281 @@
-from dataclasses import dataclass
-from typing import List, Dict
-
-@dataclass
-class CodeEntity:
-    name: str
-    entity_type: str
-    fully_qualified_name: str
-    raw_declaration: str
-    label: str
-    accessibility: str
-    namespace: str
-    file_location: List[str]
-
-
-@dataclass
-class ClassEntity(CodeEntity):
-    entity_type: str = 'class'
-    is_abstract: bool
-    is_static: bool
-    is_sealed: bool
-    members: Dict[str, str] # [fully_qualified_name, variable_name]
-    methods: List[str]      # [fully_qualified_name]
-    code_docs: str = ''
-
-
-@dataclass
-class InterfaceEntity(CodeEntity):
-    entity_type: str = 'interface'
-    methods: List[str]       # [fully_qualified_name]
-
-
-@dataclass
-class MethodEntity(CodeEntity):
-    entity_type: str = 'method'
-    variable_context: Dict[str, str] # [fully_qualified_name, variable_name]
-    invoked_context: List[str] # [fully_qualified_name]
-    code_snippet: str
-    is_destructor: bool
-    is_construct: bool
-    is_abstract: bool
-    return_type: str
-    code_docs: str = ''
-    pseudo_code: str = ''
-
-
-@dataclass
-class EnumEntity(CodeEntity):
-    entity_type: str = 'enum'
-    code_snippet: str
-
-
-class CodeEntityFactory:
-    @staticmethod
-    def create_code_entity_from_node(node) -> CodeEntity:
-        entity_map = {
-            'Class': ClassEntity,
-            'Interface': InterfaceEntity,
-            'Method': MethodEntity,
-            'Enum': EnumEntity,
-        }
-        entity_type = list(node.labels)[0]  # Assume the first label is the entity type
-        EntityClass = entity_map.get(entity_type)
-        
-        if not EntityClass:
-            raise ValueError(f"Unknown entity type: [{entity_type}]")
-        
-        common_attrs = {
-            'name': node.get('Name', ''),
-            'fully_qualified_name': node.get('FullyQualifiedName', ''),
-            'raw_declaration': node.get('RawDeclaration', ''),
-            'label': node.get('Label', ''),
-            'accessibility': node.get('Accessibility', ''),
-            'namespace': node.get('Namespace', ''),
-            'file_location': node.get('FileLocation', [])
-        }
-
-        # Get the fields of the EntityClass
-        entity_fields = {f.name for f in EntityClass.__dataclass_fields__.values()}
-        
-        # Filter node properties to only include those in the EntityClass
-        entity_attrs = {k: v for k, v in node.items() if k in entity_fields}
-        
-        # Combine common attributes and entity-specific attributes
-        combined_attrs = {**common_attrs, **entity_attrs}
-
-        return EntityClass(**combined_attrs)
+import sys
+from typing import List, Dict, Any, Callable, Iterator, Optional
+
+# Loads a single property of a node on demand: (node_label, fully_qualified_name, property_name) -> value
+PropertyLoader = Callable[[str, str, str], Any]
+
+
+class CodeEntity:
+    '''
+    Base class of the code entities materialised from Neo4j nodes.
+    Entities are slotted, and the node property -> attribute maps are built once per entity type.
+    Heavy text attributes are left unset when a loader is given and fetched on first access.
+    '''
+    __slots__ = ('name', 'fully_qualified_name', 'raw_declaration', 'label', 'accessibility',
+                 'namespace', 'file_location', '_loader')
+
+    entity_type = ''
+    node_label = ''
+    # Neo4j node property -> attribute name
+    node_properties = {
+        'Name': 'name',
+        'FullyQualifiedName': 'fully_qualified_name',
+        'RawDeclaration': 'raw_declaration',
+        'Label': 'label',
+        'Accessibility': 'accessibility',
+        'Namespace': 'namespace',
+        'FileLocation': 'file_location',
+    }
+    defaults = {
+        'name': '', 'fully_qualified_name': '', 'raw_declaration': '', 'label': '',
+        'accessibility': '', 'namespace': '', 'file_location': [],
+    }
+    lazy_fields = frozenset({'raw_declaration'})
+    # Low-cardinality values repeated across thousands of nodes
+    interned_fields = frozenset({'label', 'accessibility', 'namespace'})
+
+    # Filled per subclass by __init_subclass__
+    fields = ()
+    attribute_properties: Dict[str, str] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.fields = tuple(
+            attr for klass in reversed(cls.__mro__) for attr in getattr(klass, '__slots__', ())
+            if not attr.startswith('_')
+        )
+        cls.attribute_properties = {attr: prop for prop, attr in cls.node_properties.items()}
+
+    def __init__(self, loader: Optional[PropertyLoader] = None, **attributes):
+        unknown = attributes.keys() - set(self.fields)
+        if unknown:
+            raise TypeError(f"{type(self).__name__} got unexpected attributes: {sorted(unknown)}")
+
+        self._loader = loader
+        for field in self.fields:
+            if field in attributes:
+                value = attributes[field]
+            elif loader is not None and field in self.lazy_fields:
+                continue
+            else:
+                value = self.defaults[field]
+                if isinstance(value, (list, dict)):
+                    value = value.copy()
+            if field in self.interned_fields and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, field, value)
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached when a slot is unset, i.e. for lazy fields that have not been loaded yet
+        if name not in self.lazy_fields or name.startswith('_'):
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        value = self._loader(self.node_label, self.fully_qualified_name, self.attribute_properties[name])
+        if value is None:
+            value = self.defaults[name]
+        setattr(self, name, value)
+        return value
+
+    def is_loaded(self, name: str) -> bool:
+        try:
+            object.__getattribute__(self, name)
+            return True
+        except AttributeError:
+            return False
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.fields)
+
+    def __repr__(self):
+        shown = ", ".join(
+            f"{field}={object.__getattribute__(self, field)!r}" for field in self.fields if self.is_loaded(field)
+        )
+        return f"{type(self).__name__}({shown})"
+
+
+class ClassEntity(CodeEntity):
+    __slots__ = ('is_abstract', 'is_static', 'is_sealed', 'members', 'methods', 'code_docs')
+
+    entity_type = 'class'
+    node_label = 'Class'
+    node_properties = {
+        **CodeEntity.node_properties,
+        'IsAbstract': 'is_abstract',
+        'IsStatic': 'is_static',
+        'IsSealed': 'is_sealed',
+        'documentation': 'code_docs',
+    }
+    defaults = {
+        **CodeEntity.defaults,
+        'is_abstract': False, 'is_static': False, 'is_sealed': False,
+        'members': {},    # [fully_qualified_name, variable_name]
+        'methods': [],    # [fully_qualified_name]
+        'code_docs': '',
+    }
+
+
+class InterfaceEntity(CodeEntity):
+    __slots__ = ('methods',)
+
+    entity_type = 'interface'
+    node_label = 'Interface'
+    defaults = {
+        **CodeEntity.defaults,
+        'methods': [],    # [fully_qualified_name]
+    }
+
+
+class MethodEntity(CodeEntity):
+    __slots__ = ('variable_context', 'invoked_context', 'code_snippet', 'is_destructor', 'is_construct',
+                 'is_abstract', 'return_type', 'code_docs', 'pseudo_code')
+
+    entity_type = 'method'
+    node_label = 'Method'
+    node_properties = {
+        **CodeEntity.node_properties,
+        'VariableContext': 'variable_context',
+        'InvokedContext': 'invoked_context',
+        'CodeSnippet': 'code_snippet',
+        'IsDestructor': 'is_destructor',
+        'IsConstruct': 'is_construct',
+        'IsAbstract': 'is_abstract',
+        'ReturnType': 'return_type',
+        'documentation': 'code_docs',
+        'pseudo_code': 'pseudo_code',
+    }
+    defaults = {
+        **CodeEntity.defaults,
+        'variable_context': '',   # JSON written by the parser
+        'invoked_context': '',    # JSON written by the parser
+        'code_snippet': '',
+        'is_destructor': False, 'is_construct': False, 'is_abstract': False,
+        'return_type': '',
+        'code_docs': '',
+        'pseudo_code': '',
+    }
+    lazy_fields = CodeEntity.lazy_fields | {'code_snippet'}
+    interned_fields = CodeEntity.interned_fields | {'return_type'}
+
+
+class EnumEntity(CodeEntity):
+    __slots__ = ('code_snippet',)
+
+    entity_type = 'enum'
+    node_label = 'Enum'
+    node_properties = {
+        **{prop: attr for prop, attr in CodeEntity.node_properties.items() if prop != 'RawDeclaration'},
+        # The parser stores enums with RawDefinition rather than RawDeclaration
+        'RawDefinition': 'raw_declaration',
+        'CodeSnippet': 'code_snippet',
+    }
+    defaults = {
+        **CodeEntity.defaults,
+        'code_snippet': '',
+    }
+    lazy_fields = CodeEntity.lazy_fields | {'code_snippet'}
+
+
+class Neo4jPropertyLoader:
+    '''PropertyLoader that reads one property of one node per call'''
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    def __call__(self, node_label: str, fully_qualified_name: str, property_name: str) -> Any:
+        with self._driver.session() as session:
+            record = session.run(
+                f"MATCH (n:{node_label} {{FullyQualifiedName: $name}}) RETURN n[$property] AS value",
+                name=fully_qualified_name, property=property_name
+            ).single()
+            return record['value'] if record else None
+
+
+class CodeEntityFactory:
+    entity_map = {
+        'Class': ClassEntity,
+        'Interface': InterfaceEntity,
+        'Method': MethodEntity,
+        'Enum': EnumEntity,
+    }
+
+    @staticmethod
+    def create_code_entity_from_node(node, loader: Optional[PropertyLoader] = None) -> CodeEntity:
+        entity_type = next((label for label in node.labels if label in CodeEntityFactory.entity_map), None)
+        if entity_type is None:
+            raise ValueError(f"Unknown entity type: [{', '.join(node.labels)}]")
+        return CodeEntityFactory.create_code_entity_from_properties(entity_type, node, loader)
+
+    @staticmethod
+    def create_code_entity_from_properties(entity_type: str, properties, loader: Optional[PropertyLoader] = None) -> CodeEntity:
+        """
+        Build an entity from a node or a property map.
+
+        Args:
+            entity_type (str): Node label, e.g. "Method"
+            properties: A neo4j Node or any mapping of node properties
+            loader (Optional[PropertyLoader]): When given, heavy text properties that are absent
+                from `properties` are fetched through it on first access instead of defaulting
+
+        Returns:
+            CodeEntity: The entity instance
+        """
+        EntityClass = CodeEntityFactory.entity_map.get(entity_type)
+        if not EntityClass:
+            raise ValueError(f"Unknown entity type: [{entity_type}]")
+
+        node_properties = EntityClass.node_properties
+        attributes = {node_properties[key]: value for key, value in properties.items()
+                      if key in node_properties and value is not None}
+        return EntityClass(loader=loader, **attributes)
+
+    @staticmethod
+    def stream_code_entities(driver, entity_type: str) -> Iterator[CodeEntity]:
+        """
+        Materialise every node of one type without transferring heavy text properties; those are
+        loaded lazily per entity when first accessed.
+
+        Args:
+            driver: neo4j driver
+            entity_type (str): Node label, e.g. "Method"
+
+        Yields:
+            CodeEntity: One entity per node
+        """
+        EntityClass = CodeEntityFactory.entity_map[entity_type]
+        light_properties = [prop for prop, attr in EntityClass.node_properties.items()
+                            if attr not in EntityClass.lazy_fields]
+        projection = ", ".join(f".{prop}" for prop in light_properties)
+        loader = Neo4jPropertyLoader(driver)
+
+        with driver.session() as session:
+            result = session.run(f"MATCH (n:{entity_type}) RETURN n {{{projection}}} AS properties")
+            for record in result:
+                yield CodeEntityFactory.create_code_entity_from_properties(entity_type, record['properties'], loader)
+
+    @staticmethod
+    def load_code_entities(driver, entity_type: str, fully_qualified_names: List[str],
+                           page_size: int = 256) -> Iterator[CodeEntity]:
+        """
+        Materialise the named nodes with all their properties, one query per page of names, so
+        only a page of heavy text properties is held at a time.
+
+        Args:
+            driver: neo4j driver
+            entity_type (str): Node label, e.g. "Method"
+            fully_qualified_names (List[str]): Nodes to load
+            page_size (int): Names looked up per query
+
+        Yields:
+            CodeEntity: One entity per name that has a node, in the order of the names
+        """
+        for start in range(0, len(fully_qualified_names), page_size):
+            page = fully_qualified_names[start:start + page_size]
+            with driver.session() as session:
+                result = session.run(
+                    f"MATCH (n:{entity_type}) WHERE n.FullyQualifiedName IN $names RETURN n", names=page
+                )
+                nodes = {record['n']['FullyQualifiedName']: record['n'] for record in result}
+            for name in page:
+                if name in nodes:
+                    yield CodeEntityFactory.create_code_entity_from_node(nodes[name])
@@ -1,218 +1,493 @@
-import os
-import ollama
-
-from typing import List, Dict, Optional
-from neo4j import GraphDatabase
-from chromadb import Client, Settings
-from chromadb.utils import embedding_functions
-
-
-class CodeFileEmbedding:
-    
-    def __init__(self, persistence_directory: str, model_name: str = "jina-embeddings-v2-base-code"):
-        self.model_name = model_name
-        self.chroma_client = Client(Settings(
-            persist_directory=persistence_directory,
-            anonymized_telemetry=False
-        ))
-        self.embedding_function = embedding_functions.OllamaEmbeddingFunction(
-            model_name=self.model_name
-        )
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="code_embeddings",
-            embedding_function=self.embedding_function
-        )
-
-    def embed_codebase(self, codebase_path: str, file_extensions: List[str]) -> Dict[str, any]:
-        """
-        Embed all files with specified extensions in the given codebase directory and its subdirectories.
-        
-        Args:
-            codebase_path (str): Path to the codebase directory.
-            file_extensions (List[str]): List of file extensions to include.
-        
-        Returns:
-            Dict[str, any]: A summary of the embedding process, including:
-                - total_files_embedded: Number of files embedded
-                - total_embedding_size: Total size of all embeddings
-                - embedded_files: List of embedded file paths
-                - persistence_path: Path where embeddings are stored
-        """
-        embedded_files = []
-        total_embedding_size = 0
-
-        for root, _, files in os.walk(codebase_path):
-            for file in files:
-                if any(file.endswith(ext) for ext in file_extensions):
-                    file_path = os.path.join(root, file)
-                    embedding = self._embed_file(file_path)
-                    if embedding:
-                        embedded_files.append(file_path)
-                        total_embedding_size += len(embedding)
-
-        return {
-            "total_files_embedded": len(embedded_files),
-            "total_embedding_size": total_embedding_size,
-            "embedded_files": embedded_files,
-            "persistence_path": self.chroma_client.persist_directory
-        }
-
-    def _embed_file(self, file_path: str) -> List[float]:
-        """
-        Embed a single file and store it in the Chroma collection.
-        
-        Args:
-            file_path (str): Path to the file to be embedded.
-        
-        Returns:
-            List[float]: The generated embedding vector.
-        """
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-
-            embedding = ollama.embed(model=self.model_name, prompt=content)['embedding']
-            
-            file_name = os.path.basename(file_path)
-            doc_id = f"file_{file_name}"
-            self.collection.upsert(
-                ids=[doc_id],
-                embeddings=[embedding],
-                metadatas=[{"file_name": file_name, "file_path": file_path}],
-                documents=[content]
-            )
-
-            return embedding
-        except Exception as e:
-            print(f"Error embedding file {file_path}: {str(e)}")
-            return None
-
-
-class CodeDocEmbedding:
-    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str, persistence_directory: str):
-        self.neo4j_driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
-        self.model_name = "nomic-embed-text-v1.5"
-        self.chroma_client = Client(Settings(
-            persist_directory=persistence_directory,
-            anonymized_telemetry=False
-        ))
-        self.embedding_function = embedding_functions.OllamaEmbeddingFunction(
-            model_name=self.model_name
-        )
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="code_doc_embeddings",
-            embedding_function=self.embedding_function
-        )
-
-    def __del__(self):
-        if self.neo4j_driver:
-            self.neo4j_driver.close()
-
-    def embed_class_documentation(self, class_name: str) -> Dict[str, any]:
-        """
-        Retrieve documentation and pseudocode for a class from Neo4j,
-        generate embeddings, and store them in Chroma.
-
-        Args:
-            class_name (str): The fully qualified name of the class.
-
-        Returns:
-            Dict[str, any]: A summary of the embedding process, including:
-                - class_name: Name of the processed class
-                - doc_embedding_size: Size of the documentation embedding
-                - pseudo_embedding_size: Size of the pseudocode embedding
-                - success: Boolean indicating if the process was successful
-        """
-        class_data = self._get_class_data_from_neo4j(class_name)
-        if not class_data:
-            return {"class_name": class_name, "success": False, "error": "Class not found in Neo4j"}
-
-        doc_embedding = self._generate_embedding(class_data['documentation'])
-        pseudo_embedding = self._generate_embedding(class_data['pseudocode'])
-
-        if doc_embedding and pseudo_embedding:
-            self._store_embeddings(class_name, doc_embedding, pseudo_embedding, class_data)
-            return {
-                "class_name": class_name,
-                "doc_embedding_size": len(doc_embedding),
-                "pseudo_embedding_size": len(pseudo_embedding),
-                "success": True
-            }
-        else:
-            return {"class_name": class_name, "success": False, "error": "Failed to generate embeddings"}
-
-    def _get_class_data_from_neo4j(self, class_name: str) -> Optional[Dict[str, str]]:
-        with self.neo4j_driver.session() as session:
-            result = session.run("""
-                MATCH (c:Class {FullyQualifiedName: $class_name})
-                OPTIONAL MATCH (c)-[:HAS_METHOD]->(m:Method)
-                WITH c, COLLECT(m.documentation) AS method_docs, COLLECT(m.pseudo_code) AS method_pseudocodes
-                RETURN c.documentation AS class_doc, 
-                       method_docs, 
-                       method_pseudocodes
-            """, class_name=class_name)
-            
-            record = result.single()
-            if record:
-                return {
-                    "documentation": f"{record['class_doc']}\n" + "\n".join(filter(None, record['method_docs'])),
-                    "pseudocode": "\n".join(filter(None, record['method_pseudocodes']))
-                }
-            return None
-
-    def _generate_embedding(self, text: str) -> Optional[List[float]]:
-        try:
-            embedding = ollama.embed(model=self.model_name, prompt=text)
-            return embedding['embedding']
-        except Exception as e:
-            print(f"Error generating embedding: {str(e)}")
-            return None
-
-    def _store_embeddings(self, class_name: str, doc_embedding: List[float], pseudo_embedding: List[float], class_data: Dict[str, str]):
-        self.collection.upsert(
-            ids=[f"doc_{class_name}", f"pseudo_{class_name}"],
-            embeddings=[doc_embedding, pseudo_embedding],
-            metadatas=[
-                {"type": "documentation", "class_name": class_name},
-                {"type": "pseudocode", "class_name": class_name}
-            ],
-            documents=[class_data['documentation'], class_data['pseudocode']]
-        )
-
-    def embed_project_documentation(self, project_namespace: str) -> Dict[str, any]:
-        """
-        Embed documentation for all classes within a project namespace.
-
-        Args:
-            project_namespace (str): The namespace of the project.
-
-        Returns:
-            Dict[str, any]: A summary of the embedding process, including:
-                - total_classes_embedded: Number of classes processed
-                - successful_embeddings: Number of successful embeddings
-                - failed_embeddings: List of classes that failed to embed
-        """
-        class_names = self._get_project_classes(project_namespace)
-        results = {
-            "total_classes_embedded": len(class_names),
-            "successful_embeddings": 0,
-            "failed_embeddings": []
-        }
-
-        for class_name in class_names:
-            result = self.embed_class_documentation(class_name)
-            if result['success']:
-                results['successful_embeddings'] += 1
-            else:
-                results['failed_embeddings'].append(class_name)
-
-        return results
-
-    def _get_project_classes(self, project_namespace: str) -> List[str]:
-        with self.neo4j_driver.session() as session:
-            result = session.run("""
-                MATCH (c:Class)
-                WHERE c.FullyQualifiedName STARTS WITH $namespace
-                RETURN c.FullyQualifiedName AS class_name
-            """, namespace=project_namespace)
-            return [record["class_name"] for record in result]
+import hashlib
+import os
+import ollama
+
+from typing import Callable, List, Dict, Optional
+from neo4j import GraphDatabase
+from chromadb import Client, Settings
+from chromadb.utils import embedding_functions
+
+from DocRecordSink import DocRecordTailer
+from FileScanner import FileScanner, DEFAULT_MAX_FILE_BYTES
+from InferenceScheduler import get_inference_scheduler
+from NearDuplicateDetector import NearDuplicateDetector, DuplicateClusters
+from ShardedEmbedding import collection_is_sharded, remove_collection_shards
+
+
+class CodeFileEmbedding:
+    
+    def __init__(self, persistence_directory: str, model_name: str = "jina-embeddings-v2-base-code"):
+        self.model_name = model_name
+        self.persistence_directory = persistence_directory
+        self.chroma_client = Client(Settings(
+            persist_directory=persistence_directory,
+            is_persistent=True,
+            anonymized_telemetry=False
+        ))
+        self.embedding_function = embedding_functions.OllamaEmbeddingFunction(
+            model_name=self.model_name
+        )
+        self.collection = self.chroma_client.get_or_create_collection(
+            name="code_embeddings",
+            embedding_function=self.embedding_function
+        )
+
+    def embed_codebase(self, codebase_path: str, file_extensions: List[str], exclude_patterns: Optional[List[str]] = None,
+                       max_file_bytes: int = DEFAULT_MAX_FILE_BYTES, workers: int = 8, batch_size: int = 16,
+                       deduplicate: bool = True, duplicate_threshold: float = 0.9,
+                       path_filter: Optional[Callable[[str], bool]] = None) -> Dict[str, any]:
+        """
+        Embed all files with specified extensions in the given codebase directory and its subdirectories.
+        Files are discovered and read by FileScanner, which honours .gitignore files and skips build output,
+        generated, binary and oversized files. With deduplication, near-duplicate files (copied or templated
+        code) are clustered first and only one representative per cluster is sent to the model; the other
+        members are stored with the representative's embedding.
+        
+        Args:
+            codebase_path (str): Path to the codebase directory.
+            file_extensions (List[str]): List of file extensions to include.
+            exclude_patterns (Optional[List[str]]): gitignore-style patterns to skip; defaults to DEFAULT_EXCLUDES.
+            max_file_bytes (int): Files larger than this are skipped.
+            workers (int): Number of file reader threads.
+            batch_size (int): Number of files sent to the embedding model per call.
+            deduplicate (bool): Embed one representative per near-duplicate cluster.
+            duplicate_threshold (float): Minimum estimated Jaccard similarity for two files to share an embedding.
+            path_filter (Optional[Callable[[str], bool]]): Only embed files whose relative path it accepts (one shard).
+        
+        Returns:
+            Dict[str, any]: A summary of the embedding process, including:
+                - total_files_embedded: Number of files embedded
+                - total_embedding_size: Total size of all embeddings
+                - embedded_files: List of embedded file paths
+                - persistence_path: Path where embeddings are stored
+                - scan: FileScanner counters (files read and skipped per reason)
+                - duplicate_files: Number of files that reused a representative's embedding
+        """
+        remove_collection_shards(self.persistence_directory, self.collection.name)
+        scanner = FileScanner(codebase_path, file_extensions, exclude_patterns=exclude_patterns,
+                              max_file_bytes=max_file_bytes, workers=workers, path_filter=path_filter)
+        embedded_files = []
+        total_embedding_size = 0
+
+        if deduplicate:
+            # Clustering needs every file before the first model call, but only their signatures
+            # are kept; contents are read again batch by batch at embed time, so memory does not
+            # grow with the codebase. Sorting makes the representatives (and so the cluster ids)
+            # independent of the read order.
+            detector = NearDuplicateDetector(threshold=duplicate_threshold)
+            signatures = sorted(((self._relative_path(scanner.root, file_path), detector.signature(content))
+                                 for file_path, content in scanner.iter_files()), key=lambda item: item[0])
+            clusters = detector.cluster_signatures(signatures)
+            read_content = lambda relative_path: scanner.read_file(os.path.join(scanner.root, relative_path), count=False)
+            representatives = self._read_again(read_content, [relative_path for relative_path, _ in signatures
+                                                              if clusters.is_representative(relative_path)])
+        else:
+            clusters = None
+            read_content = None
+            representatives = ((self._relative_path(scanner.root, file_path), content)
+                               for file_path, content in scanner.iter_files())
+
+        batch = []
+        for relative_path, content in representatives:
+            batch.append((relative_path, content))
+            if len(batch) == batch_size:
+                total_embedding_size += self._embed_files(scanner.root, batch, embedded_files, clusters, read_content)
+                batch = []
+        if batch:
+            total_embedding_size += self._embed_files(scanner.root, batch, embedded_files, clusters, read_content)
+
+        return {
+            "total_files_embedded": len(embedded_files),
+            "total_embedding_size": total_embedding_size,
+            "embedded_files": embedded_files,
+            "persistence_path": self.persistence_directory,
+            "scan": dict(scanner.stats),
+            "duplicate_files": clusters.duplicate_count() if clusters else 0
+        }
+
+    def _embed_files(self, codebase_root: str, files: List[tuple], embedded_files: List[str],
+                     clusters: Optional[DuplicateClusters] = None,
+                     read_content: Optional[Callable[[str], Optional[str]]] = None) -> int:
+        """
+        Embed a batch of files with one model call and store them in the Chroma collection.
+        
+        Args:
+            codebase_root (str): Codebase directory.
+            files (List[tuple]): (relative_path, content) pairs of cluster representatives.
+            embedded_files (List[str]): Receives the paths of the files that were stored.
+            clusters (Optional[DuplicateClusters]): Near-duplicate clusters; members are stored with their representative's embedding.
+            read_content (Optional[Callable[[str], Optional[str]]]): Reads a member's content by relative path.
+        
+        Returns:
+            int: Total size of the generated embeddings.
+        """
+        try:
+            with get_inference_scheduler().slot("batch"):
+                embeddings = ollama.embed(model=self.model_name, input=[content for _, content in files])['embeddings']
+
+            ids, record_embeddings, metadatas, documents = [], [], [], []
+            for (representative, content), embedding in zip(files, embeddings):
+                members = clusters.members(representative) if clusters else [representative]
+                for relative_path in members:
+                    member_content = content if relative_path == representative else read_content(relative_path)
+                    if member_content is None:
+                        # Deleted or no longer readable since the scan
+                        continue
+                    file_path = os.path.join(codebase_root, relative_path)
+                    metadata = {"file_name": os.path.basename(file_path), "file_path": file_path}
+                    if clusters:
+                        metadata["duplicate_cluster"] = clusters.cluster_id(relative_path)
+                        metadata["duplicate_of"] = representative
+                    # Ids use the relative path: file names alone collide across projects and folders
+                    ids.append(f"file_{relative_path}")
+                    record_embeddings.append(embedding)
+                    metadatas.append(metadata)
+                    documents.append(member_content)
+
+            self.collection.upsert(ids=ids, embeddings=record_embeddings, metadatas=metadatas, documents=documents)
+
+            embedded_files.extend(metadata["file_path"] for metadata in metadatas)
+            return sum(len(embedding) for embedding in embeddings)
+        except Exception as e:
+            print(f"Error embedding files {[relative_path for relative_path, _ in files]}: {str(e)}")
+            return 0
+
+    def _read_again(self, read_content: Callable[[str], Optional[str]], relative_paths: List[str]):
+        for relative_path in relative_paths:
+            content = read_content(relative_path)
+            # Deleted or no longer readable since the scan
+            if content is not None:
+                yield relative_path, content
+
+    def _relative_path(self, codebase_root: str, file_path: str) -> str:
+        return os.path.relpath(file_path, codebase_root).replace(os.sep, "/")
+
+
+
+class CodeTextEmbedding:
+    '''
+    Embeds the method documentation records written by CodeDocGenerator's DocRecordSink into the
+    documentation collection searched by SearchCodeDocEngine. The record directory is tailed, so
+    embedding can run while generation is still writing, and records are embedded in fixed-size
+    batches without loading the whole output.
+    '''
+
+    def __init__(self, persistence_directory: str, model_name: str = "nomic-embed-text-v1.5"):
+        self.model_name = model_name
+        self.persistence_directory = persistence_directory
+        self.chroma_client = Client(Settings(
+            persist_directory=persistence_directory,
+            is_persistent=True,
+            anonymized_telemetry=False
+        ))
+        self.embedding_function = embedding_functions.OllamaEmbeddingFunction(
+            model_name=self.model_name
+        )
+        self.collection = self.chroma_client.get_or_create_collection(
+            name="code_doc_embeddings",
+            embedding_function=self.embedding_function
+        )
+
+    def embed_directory(self, directory: str, follow: bool = True, batch_size: int = 32,
+                        poll_interval: float = 0.5, idle_timeout: float = 300.0,
+                        shard_filter: Optional[Callable[[str], bool]] = None) -> Dict[str, any]:
+        """
+        Embed the documentation and pseudocode of every method record in a DocRecordSink directory.
+        Methods whose documentation and pseudocode are unchanged since the last run are skipped.
+
+        Args:
+            directory (str): Output directory of CodeDocGenerator.generate_codebase_docs
+            follow (bool): Keep reading while the generator is still writing to the directory
+            batch_size (int): Methods embedded per model call
+            poll_interval (float): Seconds between polls for new records while following
+            idle_timeout (float): Stop following when no record arrived for this long
+            shard_filter (Optional[Callable[[str], bool]]): Only embed the namespace shards whose name it accepts
+
+        Returns:
+            Dict[str, any]: A summary of the embedding process, including:
+                - total_methods_embedded: Number of method records read
+                - successful_embeddings: Number of methods stored
+                - skipped_unchanged: Number of methods skipped because their inputs did not change
+                - failed_embeddings: List of methods that failed to embed
+                - changed_methods: List of methods stored because their documentation changed
+                - batches: Number of batches processed
+        """
+        results = {
+            "total_methods_embedded": 0,
+            "successful_embeddings": 0,
+            "skipped_unchanged": 0,
+            "failed_embeddings": [],
+            "changed_methods": [],
+            "batches": 0
+        }
+        if not os.path.isdir(directory):
+            print(f"No generated documentation in {directory}")
+            return results
+
+        remove_collection_shards(self.persistence_directory, self.collection.name)
+        tailer = DocRecordTailer(directory, poll_interval=poll_interval, idle_timeout=idle_timeout,
+                                 shard_filter=shard_filter)
+        batch = []
+        for record in tailer.iter_records(follow=follow):
+            batch.append(record)
+            if len(batch) == batch_size:
+                self._embed_batch(batch, results)
+                batch = []
+        if batch:
+            self._embed_batch(batch, results)
+        return results
+
+    def _embed_batch(self, batch: List[Dict[str, any]], results: Dict[str, any]):
+        results["total_methods_embedded"] += len(batch)
+        results["batches"] += 1
+
+        records = {}
+        for record in batch:
+            # The same method can be written twice if the directory was tailed across two runs
+            input_hash = hashlib.sha256("\0".join(
+                (self.model_name, record.get("documentation") or "", record.get("pseudocode") or "")
+            ).encode('utf-8')).hexdigest()
+            records[record["fully_qualified_name"]] = (record, input_hash)
+
+        existing = self.collection.get(ids=[f"method_doc_{name}" for name in records], include=["metadatas"])
+        stored_hashes = {
+            record_id[len("method_doc_"):]: (metadata or {}).get("input_hash")
+            for record_id, metadata in zip(existing['ids'], existing['metadatas'])
+        }
+        changed = [(name, record, input_hash) for name, (record, input_hash) in records.items()
+                   if stored_hashes.get(name) != input_hash]
+        results["skipped_unchanged"] += len(batch) - len(changed)
+        if not changed:
+            return
+
+        ids, texts, metadatas = [], [], []
+        for name, record, input_hash in changed:
+            class_name = name.split('(')[0].rsplit('.', 1)[0]
+            for kind, id_prefix in (("documentation", "method_doc_"), ("pseudocode", "method_pseudo_")):
+                ids.append(f"{id_prefix}{name}")
+                texts.append(record.get(kind) or "")
+                metadatas.append({"type": kind, "class_name": class_name, "method_name": name,
+                                  "input_hash": input_hash})
+        try:
+            with get_inference_scheduler().slot("batch"):
+                embeddings = ollama.embed(model=self.model_name, input=texts)['embeddings']
+            self.collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=texts)
+            results["successful_embeddings"] += len(changed)
+            results["changed_methods"].extend(name for name, _, _ in changed)
+        except Exception as e:
+            print(f"Error embedding method docs: {str(e)}")
+            results["failed_embeddings"].extend(name for name, _, _ in changed)
+
+
+class CodeDocEmbedding:
+    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str, persistence_directory: str, driver=None):
+        self.neo4j_driver = driver or GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.model_name = "nomic-embed-text-v1.5"
+        self.persistence_directory = persistence_directory
+        self.chroma_client = Client(Settings(
+            persist_directory=persistence_directory,
+            is_persistent=True,
+            anonymized_telemetry=False
+        ))
+        self.embedding_function = embedding_functions.OllamaEmbeddingFunction(
+            model_name=self.model_name
+        )
+        self.collection = self.chroma_client.get_or_create_collection(
+            name="code_doc_embeddings",
+            embedding_function=self.embedding_function
+        )
+
+    def __del__(self):
+        if self.neo4j_driver:
+            self.neo4j_driver.close()
+
+    def embed_class_documentation(self, class_name: str) -> Dict[str, any]:
+        """
+        Retrieve documentation and pseudocode for a class from Neo4j,
+        generate embeddings, and store them in Chroma.
+
+        Args:
+            class_name (str): The fully qualified name of the class.
+
+        Returns:
+            Dict[str, any]: A summary of the embedding process, including:
+                - class_name: Name of the processed class
+                - doc_embedding_size: Size of the documentation embedding
+                - pseudo_embedding_size: Size of the pseudocode embedding
+                - success: Boolean indicating if the process was successful
+        """
+        # One class is not the whole collection, so the shards cannot be dropped for it
+        if collection_is_sharded(self.persistence_directory, self.collection.name):
+            print(f"Not embedding {class_name}: {self.collection.name} is sharded and searches would not see it. "
+                  f"Embed the project with --shards.")
+            return {"class_name": class_name, "success": False, "error": "Collection is sharded"}
+        class_data = self._get_class_data_from_neo4j(class_name)
+        if not class_data:
+            return {"class_name": class_name, "success": False, "error": "Class not found in Neo4j"}
+
+        doc_embedding = self._generate_embedding(class_data['documentation'])
+        pseudo_embedding = self._generate_embedding(class_data['pseudocode'])
+
+        if doc_embedding and pseudo_embedding:
+            self._store_embeddings(class_name, doc_embedding, pseudo_embedding, class_data)
+            return {
+                "class_name": class_name,
+                "doc_embedding_size": len(doc_embedding),
+                "pseudo_embedding_size": len(pseudo_embedding),
+                "success": True
+            }
+        else:
+            return {"class_name": class_name, "success": False, "error": "Failed to generate embeddings"}
+
+    def _get_class_data_from_neo4j(self, class_name: str) -> Optional[Dict[str, str]]:
+        with self.neo4j_driver.session() as session:
+            result = session.run("""
+                MATCH (c:Class {FullyQualifiedName: $class_name})
+                OPTIONAL MATCH (c)-[:HAS_METHOD]->(m:Method)
+                WITH c, COLLECT(m.documentation) AS method_docs, COLLECT(m.pseudo_code) AS method_pseudocodes
+                RETURN c.documentation AS class_doc, 
+                       method_docs, 
+                       method_pseudocodes
+            """, class_name=class_name)
+            
+            record = result.single()
+            if record:
+                return self._aggregate_class_data(record)
+            return None
+
+    def _aggregate_class_data(self, record) -> Dict[str, str]:
+        documentation = f"{record['class_doc']}\n" + "\n".join(filter(None, record['method_docs']))
+        pseudocode = "\n".join(filter(None, record['method_pseudocodes']))
+        # Fingerprint of everything the embeddings depend on, used to skip unchanged classes
+        input_hash = hashlib.sha256(
+            "\0".join((self.model_name, documentation, pseudocode)).encode('utf-8')
+        ).hexdigest()
+        return {
+            "documentation": documentation,
+            "pseudocode": pseudocode,
+            "input_hash": input_hash
+        }
+
+    def _generate_embedding(self, text: str) -> Optional[List[float]]:
+        embeddings = self._generate_embeddings([text])
+        return embeddings[0] if embeddings else None
+
+    def _generate_embeddings(self, texts: List[str]) -> Optional[List[List[float]]]:
+        try:
+            with get_inference_scheduler().slot("batch"):
+                response = ollama.embed(model=self.model_name, input=texts)
+            return response['embeddings']
+        except Exception as e:
+            print(f"Error generating embeddings: {str(e)}")
+            return None
+
+    def _store_embeddings(self, class_name: str, doc_embedding: List[float], pseudo_embedding: List[float], class_data: Dict[str, str]):
+        self._store_page_embeddings([(class_name, class_data)], [doc_embedding, pseudo_embedding])
+
+    def _store_page_embeddings(self, page: List[tuple], embeddings: List[List[float]]):
+        ids, metadatas, documents = [], [], []
+        for class_name, class_data in page:
+            ids.extend([f"doc_{class_name}", f"pseudo_{class_name}"])
+            metadatas.extend([
+                {"type": "documentation", "class_name": class_name, "input_hash": class_data['input_hash']},
+                {"type": "pseudocode", "class_name": class_name, "input_hash": class_data['input_hash']}
+            ])
+            documents.extend([class_data['documentation'], class_data['pseudocode']])
+        self.collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def embed_project_documentation(self, project_namespace: str, page_size: int = 256,
+                                    class_names: Optional[List[str]] = None) -> Dict[str, any]:
+        """
+        Embed documentation for all classes within a project namespace.
+        Classes and their method docs are read with one streaming query and aggregated here;
+        each page of classes costs one Chroma lookup, one embedding call and one upsert.
+        Classes whose documentation and pseudocode are unchanged since the last run are skipped.
+
+        Args:
+            project_namespace (str): The namespace of the project.
+            page_size (int): Number of classes embedded per round trip.
+            class_names (Optional[List[str]]): Only embed these classes of the namespace (one shard).
+
+        Returns:
+            Dict[str, any]: A summary of the embedding process, including:
+                - total_classes_embedded: Number of classes processed
+                - successful_embeddings: Number of successful embeddings
+                - skipped_unchanged: Number of classes skipped because their inputs did not change
+                - failed_embeddings: List of classes that failed to embed
+                - pages: Number of pages processed
+                - error: Set when nothing was embedded because the collection is sharded
+        """
+        results = {
+            "total_classes_embedded": 0,
+            "successful_embeddings": 0,
+            "skipped_unchanged": 0,
+            "failed_embeddings": [],
+            "pages": 0
+        }
+
+        # A namespace is not the whole collection, so the shards cannot be dropped for it
+        if collection_is_sharded(self.persistence_directory, self.collection.name):
+            print(f"Not embedding {project_namespace}: {self.collection.name} is sharded and searches would not see it. "
+                  f"Embed the project with --shards.")
+            results["error"] = "Collection is sharded"
+            return results
+
+        with self.neo4j_driver.session() as session:
+            records = session.run("""
+                MATCH (c:Class)
+                WHERE c.FullyQualifiedName STARTS WITH $namespace""" + (
+                    " AND c.FullyQualifiedName IN $class_names" if class_names is not None else "") + """
+                OPTIONAL MATCH (c)-[:HAS_METHOD]->(m:Method)
+                WITH c, m ORDER BY m.FullyQualifiedName
+                WITH c, COLLECT(m.documentation) AS method_docs, COLLECT(m.pseudo_code) AS method_pseudocodes
+                RETURN c.FullyQualifiedName AS class_name,
+                       c.documentation AS class_doc,
+                       method_docs,
+                       method_pseudocodes
+            """, namespace=project_namespace, class_names=class_names)
+
+            page = []
+            for record in records:
+                page.append((record['class_name'], self._aggregate_class_data(record)))
+                if len(page) == page_size:
+                    self._embed_class_page(page, results)
+                    page = []
+            if page:
+                self._embed_class_page(page, results)
+
+        return results
+
+    def _embed_class_page(self, page: List[tuple], results: Dict[str, any]):
+        results['total_classes_embedded'] += len(page)
+        results['pages'] += 1
+
+        existing = self.collection.get(ids=[f"doc_{class_name}" for class_name, _ in page], include=["metadatas"])
+        stored_hashes = {
+            record_id[len("doc_"):]: (metadata or {}).get("input_hash")
+            for record_id, metadata in zip(existing['ids'], existing['metadatas'])
+        }
+        changed = [(class_name, class_data) for class_name, class_data in page
+                   if stored_hashes.get(class_name) != class_data['input_hash']]
+        results['skipped_unchanged'] += len(page) - len(changed)
+        if not changed:
+            return
+
+        texts = []
+        for _, class_data in changed:
+            texts.extend([class_data['documentation'], class_data['pseudocode']])
+        embeddings = self._generate_embeddings(texts)
+
+        if embeddings and len(embeddings) == len(texts):
+            self._store_page_embeddings(changed, embeddings)
+            results['successful_embeddings'] += len(changed)
+        else:
+            results['failed_embeddings'].extend(class_name for class_name, _ in changed)
+
+    def _get_project_classes(self, project_namespace: str) -> List[str]:
+        with self.neo4j_driver.session() as session:
+            result = session.run("""
+                MATCH (c:Class)
+                WHERE c.FullyQualifiedName STARTS WITH $namespace
+                RETURN c.FullyQualifiedName AS class_name
+            """, namespace=project_namespace)
+            return [record["class_name"] for record in result]
@@ -0,0 +1,161 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from Tracer import get_tracer
+
+# Question words that would match almost every line of code
+_STOPWORDS = frozenset("""
+    about after also and any are can class code does done each for from function get has have how
+    into its method methods not set that the their them then there these this used uses using what
+    when where which while who why will with work works would you your
+""".split())
+_TERM = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+
+
+def estimate_tokens(text: str) -> int:
+    '''Rough token count, about four characters per token for code and English.'''
+    return len(text) // 4 + 1
+
+
+class ContextPacker:
+    '''
+    Builds the answer prompt's context from reranked search results within a token budget.
+    Results are taken in relevance order. Long results (usually whole files from code_db) are
+    cut down to the lines around the question's symbols. Results whose lines were already
+    packed, such as near-duplicate files or a class's code and documentation, are skipped. The
+    prompt therefore grows with what the question touches rather than with file sizes.
+    '''
+
+    def __init__(self, window_lines: int = 4, whole_result_tokens: int = 200, max_result_share: float = 0.5,
+                 duplicate_line_ratio: float = 0.8, min_snippet_tokens: int = 48):
+        """
+        Args:
+            window_lines (int): Lines kept before and after each line that mentions a question symbol
+            whole_result_tokens (int): Results up to this size are used whole
+            max_result_share (float): Largest share of the budget a single result may take
+            duplicate_line_ratio (float): A snippet is a duplicate when this share of its lines was already packed
+            min_snippet_tokens (int): Packing stops when less than this is left of the budget
+        """
+        self.window_lines = window_lines
+        self.whole_result_tokens = whole_result_tokens
+        self.max_result_share = max_result_share
+        self.duplicate_line_ratio = duplicate_line_ratio
+        self.min_snippet_tokens = min_snippet_tokens
+
+    def pack(self, question: str, search_results: List[Dict[str, Any]], budget_tokens: int) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Select and cut results until the budget is used up.
+
+        Args:
+            question (str): The user's question, whose identifiers and words select the lines kept
+            search_results (List[Dict[str, Any]]): Reranked search results, most relevant first
+            budget_tokens (int): Tokens available for the context
+
+        Returns:
+            Tuple[str, List[Dict[str, Any]]]: The context string and the results it contains, in order
+        """
+        pattern = self._term_pattern(question)
+        results = sorted(search_results, key=lambda result: result.get('relevance_score', 0), reverse=True)
+        packed_lines = set()
+        parts, used = [], []
+        remaining = budget_tokens
+        duplicates = truncated = 0
+
+        with get_tracer().span("context.pack", budget_tokens=budget_tokens, candidates=len(results)) as span:
+            for result in results:
+                if remaining < self.min_snippet_tokens:
+                    break
+                content = str(result.get('content', result.get('text', '')))
+                if not content.strip():
+                    continue
+                header = f"[Source {len(used) + 1}: {result.get('source_db', 'Unknown source')} | {result.get('title', 'Untitled')}]"
+                # The graph neighborhood is kept whole: it is short and is what the snippet alone lacks
+                graph = f"Related in the code graph:\n{result['graph_context']}" if result.get('graph_context') else ""
+                limit = min(remaining, int(budget_tokens * self.max_result_share)) - estimate_tokens(header + graph)
+                snippet, cut = self._snippet(content, pattern, limit)
+                if not snippet:
+                    continue
+
+                lines = {self._normalize(line) for line in snippet.splitlines() if len(self._normalize(line)) > 2}
+                if lines and len(lines & packed_lines) >= self.duplicate_line_ratio * len(lines):
+                    duplicates += 1
+                    continue
+                packed_lines |= lines
+
+                parts.append(f"{header}\n{snippet}\n" + (f"{graph}\n" if graph else ""))
+                used.append(result)
+                truncated += cut
+                remaining -= estimate_tokens(parts[-1])
+
+            span.set_attribute("results", len(used))
+            span.set_attribute("duplicates", duplicates)
+            span.set_attribute("truncated", truncated)
+            span.set_attribute("tokens", budget_tokens - remaining)
+
+        return "\n".join(parts), used
+
+    def _snippet(self, content: str, pattern: Optional[re.Pattern], max_tokens: int) -> Tuple[str, bool]:
+        '''The lines of `content` to pack, and whether anything was left out.'''
+        if max_tokens <= 0:
+            return "", True
+        if estimate_tokens(content) <= min(self.whole_result_tokens, max_tokens):
+            return content.strip(), False
+
+        lines = content.splitlines()
+        hits = [index for index, line in enumerate(lines) if pattern and pattern.search(line)]
+        if not hits:
+            # Nothing mentions the question's symbols: the head shows what the result is about
+            hits = [self.window_lines]
+
+        ranges: List[List[int]] = []
+        for index in hits:
+            start, end = max(0, index - self.window_lines), min(len(lines), index + self.window_lines + 1)
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], end)
+                ranges[-1][2] += 1
+            else:
+                ranges.append([start, end, 1])
+
+        # The windows with the most matches are kept first, then shown in file order
+        kept, tokens = [], 0
+        for start, end, _ in sorted(ranges, key=lambda window: window[2], reverse=True):
+            window_tokens = estimate_tokens("\n".join(lines[start:end]))
+            if tokens + window_tokens > max_tokens:
+                if kept:
+                    continue
+                # Even the best window is too long: keep as many of its lines as fit
+                while end > start + 1 and window_tokens > max_tokens:
+                    end -= 1
+                    window_tokens = estimate_tokens("\n".join(lines[start:end]))
+                if window_tokens > max_tokens:
+                    # A single line longer than the budget (minified or generated code) is cut too
+                    lines[start] = self._cut_line(lines[start], pattern, max_tokens)
+                    window_tokens = estimate_tokens(lines[start])
+            kept.append((start, end))
+            tokens += window_tokens
+
+        pieces = []
+        for start, end in sorted(kept):
+            pieces.append(("..." + "\n" if start > 0 else "") + "\n".join(lines[start:end]))
+        snippet = "\n".join(pieces)
+        if sorted(kept)[-1][1] < len(lines):
+            snippet += "\n..."
+        return snippet.strip(), True
+
+    def _cut_line(self, line: str, pattern: Optional[re.Pattern], max_tokens: int) -> str:
+        '''The part of `line` around its first match that fits `max_tokens`, marked with "..." where cut.'''
+        # Room is left for the "..." markers around the cut line and around the snippet
+        width = max(0, max_tokens * 4 - 16)
+        match = pattern.search(line) if pattern else None
+        start = max(0, min((match.start() if match else 0) - width // 2, len(line) - width))
+        return ("..." if start > 0 else "") + line[start:start + width] + ("..." if start + width < len(line) else "")
+
+    def _term_pattern(self, question: str) -> Optional[re.Pattern]:
+        terms = {term for term in _TERM.findall(question) if term.lower() not in _STOPWORDS}
+        if not terms:
+            return None
+        # Longest first, so "ReportBuilder" is tried before "Report"
+        return re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+
+    def _normalize(self, line: str) -> str:
+        return " ".join(line.split())
@@ -0,0 +1,263 @@
+import glob
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Present while a sink is writing to the directory; readers keep following until it is gone
+WRITING_MARKER = "_writing"
+MANIFEST_FILE = "_manifest.json"
+FORMATS = ("jsonl", "parquet")
+
+
+def shard_name(namespace: str) -> str:
+    '''File-system safe shard name for a namespace; methods without one go to "_global".'''
+    return re.sub(r"[^\w.-]", "_", namespace) or "_global"
+
+
+class DocRecordSink:
+    '''
+    Writes generated documentation records as they complete, one shard per namespace, so a run
+    never holds the whole codebase's docs in memory and readers can consume them while the
+    generator is still running.
+
+    jsonl: one append-only <shard>.jsonl file per namespace; each record is flushed to the OS as
+    soon as it is written, so a tailing reader sees it immediately.
+    parquet: records are buffered per namespace and written as complete part files
+    <shard>/part-NNNNN.parquet (renamed into place), because a Parquet file cannot be read
+    before its footer is written. Requires pyarrow.
+
+    Durability is batched: files are fsynced every `fsync_every` records or `fsync_interval`
+    seconds, and on close.
+    '''
+
+    def __init__(self, output_directory: str, output_format: str = "jsonl", fsync_every: int = 256,
+                 fsync_interval: float = 2.0, row_group_size: int = 512, max_open_files: int = 64):
+        """
+        Args:
+            output_directory (str): Directory the shards are written to; created if missing
+            output_format (str): "jsonl" or "parquet"
+            fsync_every (int): Records written between two fsyncs
+            fsync_interval (float): Longest time in seconds between two fsyncs
+            row_group_size (int): Records per Parquet part file
+            max_open_files (int): JSONL shards kept open at once; the least recently used is closed first
+        """
+        if output_format not in FORMATS:
+            raise ValueError(f"Unknown output format: [{output_format}]")
+        if output_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ImportError("The parquet output format needs pyarrow (pip install pyarrow)") from e
+
+        self.output_directory = output_directory
+        self.output_format = output_format
+        self._fsync_every = fsync_every
+        self._fsync_interval = fsync_interval
+        self._row_group_size = row_group_size
+        self._max_open_files = max_open_files
+        self._files: "OrderedDict[str, Any]" = OrderedDict()
+        self._dirty: Dict[str, Any] = {}
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._part_numbers: Dict[str, int] = {}
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.records_per_shard: Dict[str, int] = {}
+        self._closed = False
+
+        os.makedirs(output_directory, exist_ok=True)
+        # Output of an earlier run would be read as part of this one
+        for path in glob.glob(os.path.join(output_directory, "*.jsonl")) + \
+                glob.glob(os.path.join(output_directory, "*", "part-*.parquet")) + \
+                [os.path.join(output_directory, MANIFEST_FILE)]:
+            if os.path.isfile(path):
+                os.remove(path)
+        with open(os.path.join(output_directory, WRITING_MARKER), 'w', encoding='utf-8') as file:
+            file.write(str(os.getpid()))
+
+    def __enter__(self) -> "DocRecordSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, record: Dict[str, Any], namespace: str):
+        """
+        Append one record to its namespace's shard.
+
+        Args:
+            record (Dict[str, Any]): JSON-serializable record
+            namespace (str): Namespace the record is sharded by
+        """
+        shard = shard_name(namespace)
+        if self.output_format == "jsonl":
+            file = self._shard_file(shard)
+            file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            # Flushing per record hands the line to the OS, where tailing readers can see it
+            file.flush()
+            self._dirty[shard] = file
+        else:
+            buffer = self._buffers.setdefault(shard, [])
+            buffer.append(record)
+            if len(buffer) >= self._row_group_size:
+                self._write_part(shard)
+        self.records_per_shard[shard] = self.records_per_shard.get(shard, 0) + 1
+        self._unsynced += 1
+        if self._unsynced >= self._fsync_every or time.monotonic() - self._last_sync >= self._fsync_interval:
+            self._sync()
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Write out buffered records, fsync every shard and replace the writing marker with a manifest.
+
+        Returns:
+            Dict[str, Any]: The manifest: format, total records and records per shard
+        """
+        manifest_path = os.path.join(self.output_directory, MANIFEST_FILE)
+        manifest = {
+            "format": self.output_format,
+            "records": sum(self.records_per_shard.values()),
+            "shards": dict(sorted(self.records_per_shard.items()))
+        }
+        if self._closed:
+            return manifest
+        self._closed = True
+        for shard in list(self._buffers):
+            if self._buffers[shard]:
+                self._write_part(shard)
+        self._sync()
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
+
+        temporary_path = manifest_path + ".tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, manifest_path)
+        marker = os.path.join(self.output_directory, WRITING_MARKER)
+        if os.path.exists(marker):
+            os.remove(marker)
+        return manifest
+
+    def _shard_file(self, shard: str):
+        if shard in self._files:
+            self._files.move_to_end(shard)
+            return self._files[shard]
+        if len(self._files) >= self._max_open_files:
+            evicted, file = self._files.popitem(last=False)
+            if self._dirty.pop(evicted, None):
+                os.fsync(file.fileno())
+            file.close()
+        file = open(os.path.join(self.output_directory, f"{shard}.jsonl"), 'a', encoding='utf-8')
+        self._files[shard] = file
+        return file
+
+    def _write_part(self, shard: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        records = self._buffers.pop(shard)
+        part_number = self._part_numbers.get(shard, 0)
+        self._part_numbers[shard] = part_number + 1
+        shard_directory = os.path.join(self.output_directory, shard)
+        os.makedirs(shard_directory, exist_ok=True)
+        part_path = os.path.join(shard_directory, f"part-{part_number:05d}.parquet")
+        # Readers only list *.parquet, so they never see a half-written part
+        temporary_path = part_path + ".tmp"
+        pq.write_table(pa.Table.from_pylist(records), temporary_path)
+        with open(temporary_path, 'rb') as file:
+            # A part is already a batch of row_group_size records, so each one is synced
+            os.fsync(file.fileno())
+        os.replace(temporary_path, part_path)
+
+    def _sync(self):
+        for file in self._dirty.values():
+            if not file.closed:
+                os.fsync(file.fileno())
+        self._dirty.clear()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+
+class DocRecordTailer:
+    '''
+    Reads the records of a DocRecordSink directory, optionally while the sink is still writing.
+    Only complete JSONL lines and complete Parquet parts are returned, and each file is read
+    from where the previous poll stopped, so memory use does not grow with the output size.
+    '''
+
+    def __init__(self, directory: str, poll_interval: float = 0.5, idle_timeout: float = 300.0,
+                 shard_filter: Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            directory (str): Sink output directory
+            poll_interval (float): Seconds between polls while following a running sink
+            idle_timeout (float): Stop following when no new record arrived for this long, e.g. after the writer died
+            shard_filter (Optional[Callable[[str], bool]]): Only shards whose name it accepts are read
+        """
+        self.directory = directory
+        self._shard_filter = shard_filter
+        self._poll_interval = poll_interval
+        self._idle_timeout = idle_timeout
+        self._offsets: Dict[str, int] = {}
+        self._read_parts = set()
+
+    def writer_active(self) -> bool:
+        return os.path.exists(os.path.join(self.directory, WRITING_MARKER))
+
+    def read_available(self) -> List[Dict[str, Any]]:
+        '''Return records completed since the last call; at most 1024 per JSONL shard, so call until empty.'''
+        records = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.jsonl"))):
+            if self._accepts(os.path.basename(path)[:-len(".jsonl")]):
+                records.extend(self._read_jsonl(path))
+        for path in sorted(glob.glob(os.path.join(self.directory, "*", "part-*.parquet"))):
+            if path not in self._read_parts and self._accepts(os.path.basename(os.path.dirname(path))):
+                import pyarrow.parquet as pq
+                records.extend(pq.read_table(path).to_pylist())
+                self._read_parts.add(path)
+        return records
+
+    def _accepts(self, shard: str) -> bool:
+        return self._shard_filter is None or self._shard_filter(shard)
+
+    def iter_records(self, follow: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Yield records as they become available.
+
+        Args:
+            follow (bool): Keep polling while a sink is writing to the directory; otherwise read what is there and stop
+
+        Yields:
+            Dict[str, Any]: One record per generated method
+        """
+        last_record = time.monotonic()
+        while True:
+            # Checked before reading, so records written just before the sink closed are not missed
+            active = follow and self.writer_active()
+            records = self.read_available()
+            yield from records
+            if records:
+                last_record = time.monotonic()
+                continue
+            if not active or time.monotonic() - last_record > self._idle_timeout:
+                return
+            time.sleep(self._poll_interval)
+
+    def _read_jsonl(self, path: str, max_records: int = 1024) -> List[Dict[str, Any]]:
+        records = []
+        with open(path, 'rb') as file:
+            file.seek(self._offsets.get(path, 0))
+            while len(records) < max_records:
+                line = file.readline()
+                if not line.endswith(b"\n"):
+                    # End of file, or a line that is still being written; leave it for the next poll
+                    break
+                self._offsets[path] = file.tell()
+                if line.strip():
+                    records.append(json.loads(line))
+        return records
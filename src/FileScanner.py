@@ -0,0 +1,212 @@
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Iterator, Optional, Tuple
+
+# Build output, VCS metadata and tool folders of a C# solution that should never be embedded
+DEFAULT_EXCLUDES = [".git/", ".vs/", "bin/", "obj/", "packages/", "node_modules/", "TestResults/",
+                    "*.Designer.cs", "*.g.cs", "*.g.i.cs", "*.AssemblyInfo.cs"]
+DEFAULT_MAX_FILE_BYTES = 1024 * 1024
+BINARY_SNIFF_BYTES = 8192
+
+
+class IgnoreRules:
+    '''A list of gitignore-style patterns, relative to the directory that declared them'''
+
+    def __init__(self, base: str, patterns: List[str]):
+        self.base = base
+        self._rules: List[Tuple[re.Pattern, bool, bool]] = []  # (regex, negated, directory_only)
+        for pattern in patterns:
+            pattern = pattern.rstrip("\n").rstrip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            if negated:
+                pattern = pattern[1:]
+            directory_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            # A slash anywhere but the end anchors the pattern to the declaring directory
+            anchored = "/" in pattern
+            pattern = pattern.lstrip("/")
+            self._rules.append((self._compile(pattern, anchored), negated, directory_only))
+
+    @staticmethod
+    def from_file(base: str, path: str) -> "IgnoreRules":
+        with open(path, 'r', encoding='utf-8', errors='replace') as file:
+            return IgnoreRules(base, file.readlines())
+
+    def _compile(self, pattern: str, anchored: bool) -> re.Pattern:
+        regex = ""
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                regex += "(?:.*/)?"
+                i += 3
+            elif pattern.startswith("**", i):
+                regex += ".*"
+                i += 2
+            elif pattern[i] == "*":
+                regex += "[^/]*"
+                i += 1
+            elif pattern[i] == "?":
+                regex += "[^/]"
+                i += 1
+            else:
+                regex += re.escape(pattern[i])
+                i += 1
+        prefix = "" if anchored else "(?:.*/)?"
+        return re.compile(f"^{prefix}{regex}$")
+
+    def match(self, relative_path: str, is_directory: bool) -> Optional[bool]:
+        '''Return True (ignored), False (re-included by a negation) or None (no rule applies).'''
+        result = None
+        for regex, negated, directory_only in self._rules:
+            if directory_only and not is_directory:
+                continue
+            if regex.match(relative_path):
+                result = not negated
+        return result
+
+
+class FileScanner:
+    '''
+    Walks a codebase honouring .gitignore files and an exclude list, skips binary and oversized
+    files, and reads the remaining files on a thread pool. Results are handed over through a
+    bounded buffer so reading never runs far ahead of the consumer.
+    '''
+
+    def __init__(self, root: str, file_extensions: List[str], exclude_patterns: Optional[List[str]] = None,
+                 max_file_bytes: int = DEFAULT_MAX_FILE_BYTES, workers: int = 8, buffer_size: int = 64,
+                 path_filter: Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            root (str): Codebase directory
+            file_extensions (List[str]): Extensions to include, e.g. [".cs"]
+            exclude_patterns (Optional[List[str]]): gitignore-style patterns applied at the root;
+                defaults to DEFAULT_EXCLUDES
+            max_file_bytes (int): Files larger than this are skipped
+            workers (int): Reader threads
+            buffer_size (int): Maximum number of files read but not yet consumed
+            path_filter (Optional[Callable[[str], bool]]): Only files whose root-relative path
+                ("/"-separated) it accepts are read, e.g. the files of one embedding shard
+        """
+        self.root = os.path.abspath(root)
+        self.file_extensions = tuple(file_extensions)
+        self.exclude_rules = IgnoreRules(self.root, DEFAULT_EXCLUDES if exclude_patterns is None else exclude_patterns)
+        self.max_file_bytes = max_file_bytes
+        self.workers = workers
+        self.buffer_size = buffer_size
+        self.path_filter = path_filter
+        self.stats: Dict[str, int] = {"read": 0, "skipped_ignored": 0, "skipped_binary": 0,
+                                      "skipped_oversized": 0, "skipped_unreadable": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _is_ignored(self, path: str, is_directory: bool, rule_stack: List[IgnoreRules]) -> bool:
+        ignored = False
+        for rules in [self.exclude_rules] + rule_stack:
+            result = rules.match(os.path.relpath(path, rules.base).replace(os.sep, "/"), is_directory)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    def walk(self) -> Iterator[str]:
+        '''Yield candidate file paths, pruning ignored directories before descending into them.'''
+        pending = [(self.root, [])]
+        while pending:
+            directory, rule_stack = pending.pop()
+            gitignore = os.path.join(directory, ".gitignore")
+            if os.path.isfile(gitignore):
+                rule_stack = rule_stack + [IgnoreRules.from_file(directory, gitignore)]
+            try:
+                entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if self._is_ignored(entry.path, True, rule_stack):
+                        self._count("skipped_ignored")
+                    else:
+                        pending.append((entry.path, rule_stack))
+                elif entry.is_file() and entry.name.endswith(self.file_extensions):
+                    if self._is_ignored(entry.path, False, rule_stack):
+                        self._count("skipped_ignored")
+                    elif self.path_filter is None or self.path_filter(
+                            os.path.relpath(entry.path, self.root).replace(os.sep, "/")):
+                        yield entry.path
+
+    def read_file(self, file_path: str, count: bool = True) -> Optional[str]:
+        """
+        Return the decoded content, or None when the file is oversized, binary or unreadable.
+
+        Args:
+            file_path (str): File to read
+            count (bool): Add the outcome to stats; off when a scanned file is read a second time
+        """
+        content, outcome = self._read(file_path)
+        if count:
+            self._count(outcome)
+        return content
+
+    def _read(self, file_path: str) -> Tuple[Optional[str], str]:
+        try:
+            if os.path.getsize(file_path) > self.max_file_bytes:
+                return None, "skipped_oversized"
+            with open(file_path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None, "skipped_unreadable"
+        if b"\0" in data[:BINARY_SNIFF_BYTES]:
+            return None, "skipped_binary"
+        return data.decode('utf-8-sig', errors='replace'), "read"
+
+    def iter_files(self) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (file_path, content) for every included text file. Files are read concurrently, so
+        the order is not deterministic.
+        """
+        results = queue.Queue()
+        slots = threading.Semaphore(self.buffer_size)
+        stop = threading.Event()
+        done = object()
+
+        def read_into_queue(file_path: str):
+            try:
+                results.put((file_path, self.read_file(file_path)))
+            except BaseException as e:
+                results.put((file_path, e))
+
+        def produce():
+            try:
+                with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                    for file_path in self.walk():
+                        while not slots.acquire(timeout=0.1):
+                            if stop.is_set():
+                                return
+                        pool.submit(read_into_queue, file_path)
+            except BaseException as e:
+                results.put((None, e))
+            finally:
+                results.put(done)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = results.get()
+                if item is done:
+                    break
+                file_path, content = item
+                if file_path is not None:
+                    slots.release()
+                if isinstance(content, BaseException):
+                    raise content
+                if content is not None:
+                    yield file_path, content
+        finally:
+            stop.set()
@@ -0,0 +1,295 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from Tracer import get_tracer
+
+DEFAULT_NEIGHBORHOOD_CACHE_PATH = os.path.join(".", "cache", "graph_neighborhood.json")
+RELATIONSHIP_TYPES = ("INVOKES", "HAS_METHOD", "HAS_ABSTRACT_METHOD", "INHERITS")
+NODE_LABELS = ("Class", "Method")
+
+# How each relationship reads from the node being expanded, by direction
+_STEP_NAMES = {
+    ("INVOKES", "out"): "calls",
+    ("INVOKES", "in"): "called by",
+    ("HAS_METHOD", "out"): "declares",
+    ("HAS_METHOD", "in"): "declared in",
+    ("HAS_ABSTRACT_METHOD", "out"): "declares",
+    ("HAS_ABSTRACT_METHOD", "in"): "declared in",
+    ("INHERITS", "out"): "inherits",
+    ("INHERITS", "in"): "inherited by",
+}
+
+_EDGES_QUERY = (
+    "MATCH (a)-[r:" + "|".join(RELATIONSHIP_TYPES) + "]->(b) {where}"
+    "RETURN a.FullyQualifiedName AS source, type(r) AS type, b.FullyQualifiedName AS target, "
+    "id(a) AS source_id, id(b) AS target_id"
+)
+_NODES_QUERY = (
+    "MATCH (n) WHERE (" + " OR ".join(f"n:{label}" for label in NODE_LABELS) + ") {where}"
+    "RETURN n.FullyQualifiedName AS name, labels(n) AS labels, "
+    "coalesce(n.FileLocations, [n.FileLocation]) AS files, id(n) AS id"
+)
+# Sum of edge_fingerprint over the relationships, computed by the database in one aggregate row
+_FINGERPRINT_MODULUS = 2147483647
+_FINGERPRINT_QUERY = (
+    "MATCH (a)-[r:" + "|".join(RELATIONSHIP_TYPES) + "]->(b) "
+    "WHERE a.FullyQualifiedName IS NOT NULL AND b.FullyQualifiedName IS NOT NULL "
+    f"RETURN 'edges:fingerprint' AS key, sum((id(a) * 1000003 + id(b)) % {_FINGERPRINT_MODULUS} "
+    f"* ((id(b) * 998244353 + size(type(r))) % {_FINGERPRINT_MODULUS}) % {_FINGERPRINT_MODULUS}) AS count"
+)
+
+
+def edge_fingerprint(source_id: int, rel_type: str, target_id: int) -> int:
+    '''
+    Checksum term of one relationship, by its endpoints' internal ids; the same arithmetic as
+    _FINGERPRINT_QUERY. The terms are not linear in the ids, so moving relationships to other
+    nodes changes their sum even when every count stays the same.
+    '''
+    return ((source_id * 1000003 + target_id) % _FINGERPRINT_MODULUS
+            * ((target_id * 998244353 + len(rel_type)) % _FINGERPRINT_MODULUS) % _FINGERPRINT_MODULUS)
+
+
+def _normalize_path(path: str) -> str:
+    return path.replace("\\", "/").lower()
+
+
+class GraphNeighborhoodCache:
+    '''
+    In-memory adjacency of the Class and Method nodes and their INVOKES, HAS_METHOD and INHERITS
+    relationships, used to give vector search hits their structural context (owning class,
+    callers, callees, base classes) without querying Neo4j while answering a question.
+
+    The `embed` mode builds the adjacency from Neo4j and writes it to a JSON snapshot; later runs
+    refresh only the nodes whose documentation changed. The query service reads the snapshot,
+    reloads it when `embed` rewrote it, and expands hits with a breadth-first walk of up to `hops`
+    relationships.
+    '''
+
+    def __init__(self, driver=None, cache_path: Optional[str] = None, hops: int = 2,
+                 max_neighbors: int = 24, check_interval: float = 30.0):
+        """
+        Args:
+            driver: neo4j driver (or InMemoryGraphDriver); only needed to build or refresh the snapshot
+            cache_path (Optional[str]): Snapshot file; defaults to $GRAPH_NEIGHBORHOOD_CACHE or ./cache/graph_neighborhood.json
+            hops (int): Relationships walked from a hit
+            max_neighbors (int): Neighbors listed per hit, nearest first
+            check_interval (float): Seconds between checks whether the snapshot file was rewritten
+        """
+        self._driver = driver
+        self._cache_path = cache_path or os.getenv("GRAPH_NEIGHBORHOOD_CACHE", DEFAULT_NEIGHBORHOOD_CACHE_PATH)
+        self.hops = hops
+        self.max_neighbors = max_neighbors
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loaded_mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+        self._edges: set = set()
+        # Internal node ids, only used to compare the edge fingerprint with the database's
+        self._ids: Dict[str, int] = {}
+        self._adjacency: Dict[str, List[Tuple[str, str, str]]] = {}
+        self._files: Dict[str, List[Tuple[str, str]]] = {}
+
+    # -- building (embed time) -------------------------------------------------------------------
+
+    def refresh(self, changed_names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Bring the snapshot up to date with Neo4j. Without a snapshot the whole adjacency is read.
+        Otherwise only the relationships touching `changed_names` are read again; when the node
+        and relationship counts or the edge fingerprint still differ from the database afterwards
+        (e.g. nodes were deleted or a class's base class changed), the adjacency is rebuilt.
+
+        Args:
+            changed_names (Optional[Iterable[str]]): Fully qualified names of classes and methods that changed
+
+        Returns:
+            Dict[str, Any]: mode ("unchanged", "incremental" or "full"), nodes and relationships
+        """
+        if self._driver is None:
+            raise ValueError("Refreshing the graph neighborhood cache needs a Neo4j driver")
+        with self._lock, get_tracer().span("neo4j.neighborhood") as span:
+            self._load_snapshot()
+            counts = self._database_state()
+            changed_names = sorted(set(changed_names or ()))
+            if self._nodes and changed_names:
+                self._read_graph(changed_names)
+                mode = "incremental"
+            elif self._nodes and self._local_state() == counts:
+                mode = "unchanged"
+            else:
+                mode = "full"
+            if mode != "unchanged" and self._local_state() != counts:
+                mode = "full"
+            if mode == "full":
+                self._nodes, self._edges, self._ids = {}, set(), {}
+                self._read_graph(None)
+            if mode != "unchanged":
+                self._index()
+                self._write_snapshot()
+            span.set_attribute("mode", mode)
+            return {"mode": mode, "nodes": len(self._nodes), "relationships": len(self._edges)}
+
+    def _read_graph(self, names: Optional[List[str]]):
+        '''Read all nodes and relationships, or replace those touching `names`.'''
+        parameters = {"names": names} if names else {}
+        node_filter = "AND n.FullyQualifiedName IN $names " if names else ""
+        edge_filter = "WHERE a.FullyQualifiedName IN $names OR b.FullyQualifiedName IN $names " if names else ""
+        with self._driver.session() as session:
+            nodes = [record.data() for record in session.run(_NODES_QUERY.format(where=node_filter), parameters)]
+            edges = [record.data() for record in session.run(_EDGES_QUERY.format(where=edge_filter), parameters)]
+        if names:
+            touched = set(names)
+            self._edges = {edge for edge in self._edges if edge[0] not in touched and edge[2] not in touched}
+            for name in touched:
+                self._nodes.pop(name, None)
+        for node in nodes:
+            if node["name"]:
+                self._nodes[node["name"]] = {
+                    "label": next((label for label in NODE_LABELS if label in node["labels"]), "Node"),
+                    "files": [file for file in node["files"] or [] if file]
+                }
+                self._ids[node["name"]] = node["id"]
+        for edge in edges:
+            if edge["source"] and edge["target"]:
+                self._edges.add((edge["source"], edge["type"], edge["target"]))
+                self._ids[edge["source"]], self._ids[edge["target"]] = edge["source_id"], edge["target_id"]
+
+    def _database_state(self) -> Dict[str, int]:
+        # Single-label and single-type counts come from the count store, without a scan; the
+        # fingerprint scans the relationships but returns a single row
+        queries = [f"MATCH (n:`{label}`) RETURN 'label:' + \"{label}\" AS key, count(n) AS count" for label in NODE_LABELS]
+        queries += [f"MATCH ()-[r:`{rel_type}`]->() RETURN 'type:' + \"{rel_type}\" AS key, count(r) AS count"
+                    for rel_type in RELATIONSHIP_TYPES]
+        queries.append(_FINGERPRINT_QUERY)
+        with self._driver.session() as session:
+            return {record["key"]: record["count"] or 0 for record in session.run(" UNION ALL ".join(queries))}
+
+    def _local_state(self) -> Dict[str, int]:
+        counts = {f"label:{label}": 0 for label in NODE_LABELS}
+        counts.update({f"type:{rel_type}": 0 for rel_type in RELATIONSHIP_TYPES})
+        for node in self._nodes.values():
+            if node["label"] in NODE_LABELS:
+                counts[f"label:{node['label']}"] += 1
+        counts["edges:fingerprint"] = 0
+        for source, rel_type, target in self._edges:
+            counts[f"type:{rel_type}"] += 1
+            # A snapshot written before ids were kept has none, so it is rebuilt once
+            counts["edges:fingerprint"] += edge_fingerprint(self._ids.get(source, -1), rel_type, self._ids.get(target, -1))
+        return counts
+
+    # -- serving (query time) --------------------------------------------------------------------
+
+    def expand(self, result: Dict[str, Any]) -> Optional[str]:
+        """
+        Describe the graph neighborhood of a search hit.
+
+        Args:
+            result (Dict[str, Any]): A code_db hit (matched by file_path) or documentation_db hit
+                (matched by method_name, else class_name)
+
+        Returns:
+            Optional[str]: One line per relationship path, e.g. "Foo.Bar() called by: ...", or None when the hit is not in the graph
+        """
+        self._reload_if_changed()
+        with self._lock:
+            if result.get("method_name") or result.get("class_name"):
+                names = [result.get("method_name") or result.get("class_name")]
+            else:
+                names = self._names_for_file(result.get("file_path", ""))
+            lines = []
+            for name in names[:3]:
+                if name in self._adjacency:
+                    lines.extend(self._describe(name))
+            return "\n".join(lines) or None
+
+    def _describe(self, name: str) -> List[str]:
+        groups: Dict[Tuple[str, ...], List[str]] = {}
+        seen = {name}
+        queue = deque([(name, ())])
+        listed = 0
+        while queue and listed < self.max_neighbors:
+            node, path = queue.popleft()
+            if len(path) == self.hops:
+                continue
+            for rel_type, direction, neighbor in self._adjacency.get(node, ()):
+                if neighbor in seen:
+                    continue
+                seen.add(neighbor)
+                step_path = path + (_STEP_NAMES[(rel_type, direction)],)
+                groups.setdefault(step_path, []).append(neighbor)
+                queue.append((neighbor, step_path))
+                listed += 1
+                if listed >= self.max_neighbors:
+                    break
+        return [f"{name} {' > '.join(path)}: {', '.join(neighbors)}" for path, neighbors in groups.items()]
+
+    def _names_for_file(self, file_path: str) -> List[str]:
+        '''Classes declared in a file. Paths differ between the parser and embed machines, so the longer path must end with the shorter.'''
+        path = _normalize_path(file_path)
+        names = []
+        for location, name in self._files.get(path.rsplit("/", 1)[-1], ()):
+            if path.endswith(location) or location.endswith(path):
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def _reload_if_changed(self):
+        if time.monotonic() - self._checked_at < self._check_interval:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._load_snapshot()
+
+    # -- snapshot --------------------------------------------------------------------------------
+
+    def _load_snapshot(self):
+        '''Called with the lock held: (re)read the snapshot when the file changed since it was last read.'''
+        try:
+            mtime = os.stat(self._cache_path).st_mtime
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        try:
+            with open(self._cache_path, 'r', encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Could not read graph neighborhood snapshot {self._cache_path}: {e}")
+            return
+        self._nodes = snapshot.get("nodes", {})
+        self._edges = {tuple(edge) for edge in snapshot.get("edges", [])}
+        self._ids = snapshot.get("ids", {})
+        self._loaded_mtime = mtime
+        self._index()
+
+    def _index(self):
+        adjacency: Dict[str, List[Tuple[str, str, str]]] = {name: [] for name in self._nodes}
+        # Sorted so expansions, and the prompts built from them, do not depend on set order
+        for source, rel_type, target in sorted(self._edges):
+            adjacency.setdefault(source, []).append((rel_type, "out", target))
+            adjacency.setdefault(target, []).append((rel_type, "in", source))
+        files: Dict[str, List[Tuple[str, str]]] = {}
+        for name, node in self._nodes.items():
+            if node["label"] != "Class":
+                continue
+            for location in node["files"]:
+                location = _normalize_path(location)
+                files.setdefault(location.rsplit("/", 1)[-1], []).append((location, name))
+        self._adjacency = adjacency
+        self._files = files
+
+    def _write_snapshot(self):
+        snapshot = {"nodes": self._nodes, "edges": sorted(self._edges), "ids": self._ids}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self._cache_path)), exist_ok=True)
+            temporary_path = f"{self._cache_path}.tmp"
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                json.dump(snapshot, file)
+            os.replace(temporary_path, self._cache_path)
+            self._loaded_mtime = os.stat(self._cache_path).st_mtime
+        except OSError as e:
+            print(f"Could not write graph neighborhood snapshot to {self._cache_path}: {e}")
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from Tracer import get_tracer
+
+DEFAULT_SCHEMA_CACHE_PATH = os.path.join(".", "cache", "graph_schema.json")
+
+
+def _quote(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+class GraphSchemaCache:
+    '''
+    Formatted graph schema for the Cypher prompt, kept in a JSON snapshot on disk.
+
+    Schema introspection (db.schema.nodeTypeProperties / relTypeProperties) scans the graph and
+    takes seconds on a large database, so it only runs when the snapshot is missing or stale.
+    Staleness is decided by a fingerprint of the label, relationship type and property key names
+    and the per-label and per-type counts, which Neo4j answers from its count store. Nothing is
+    read until the schema is first needed, and the fingerprint is checked again at most every
+    `check_interval` seconds.
+    '''
+
+    def __init__(self, driver, cache_path: Optional[str] = None, check_interval: float = 300.0):
+        """
+        Args:
+            driver: neo4j driver (or InMemoryGraphDriver)
+            cache_path (Optional[str]): Snapshot file; defaults to $GRAPH_SCHEMA_CACHE or ./cache/graph_schema.json
+            check_interval (float): Seconds a verified schema is trusted before the fingerprint is checked again
+        """
+        self._driver = driver
+        self._cache_path = cache_path or os.getenv("GRAPH_SCHEMA_CACHE", DEFAULT_SCHEMA_CACHE_PATH)
+        self._check_interval = check_interval
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    def get(self) -> Dict[str, str]:
+        """
+        Return the schema, introspecting the database only when its fingerprint has changed.
+
+        Returns:
+            Dict[str, str]: property_schema and relationship_schema, formatted for the prompt
+        """
+        with self._lock:
+            if self._snapshot and time.monotonic() - self._checked_at < self._check_interval:
+                return self._snapshot["schema"]
+            with get_tracer().span("neo4j.schema") as span:
+                fingerprint = self._fingerprint()
+                if self._snapshot is None:
+                    self._snapshot = self._read_snapshot()
+                fresh = bool(self._snapshot) and self._snapshot.get("fingerprint") == fingerprint
+                span.mark_cache(fresh)
+                if not fresh:
+                    self._snapshot = {"fingerprint": fingerprint, "schema": self._introspect()}
+                    self._write_snapshot(self._snapshot)
+                    self.refreshes += 1
+            self._checked_at = time.monotonic()
+            return self._snapshot["schema"]
+
+    def invalidate(self):
+        '''Force a fingerprint check on the next get, e.g. after the graph was rebuilt.'''
+        with self._lock:
+            self._checked_at = 0.0
+
+    def _fingerprint(self) -> str:
+        with self._driver.session() as session:
+            names = [(record["kind"], record["name"]) for record in session.run(
+                "CALL db.labels() YIELD label RETURN 'label' AS kind, label AS name "
+                "UNION ALL CALL db.relationshipTypes() YIELD relationshipType "
+                "RETURN 'type' AS kind, relationshipType AS name "
+                "UNION ALL CALL db.propertyKeys() YIELD propertyKey RETURN 'property' AS kind, propertyKey AS name"
+            )]
+            # Single-label and single-type counts come from the count store, without a scan
+            counts = [
+                f"MATCH (n:{_quote(name)}) RETURN '{kind}:' + {json.dumps(name)} AS key, count(n) AS count"
+                if kind == "label" else
+                f"MATCH ()-[r:{_quote(name)}]->() RETURN '{kind}:' + {json.dumps(name)} AS key, count(r) AS count"
+                for kind, name in names if kind in ("label", "type")
+            ]
+            state = {f"{kind}:{name}": None for kind, name in names}
+            if counts:
+                for record in session.run(" UNION ALL ".join(counts)):
+                    state[record["key"]] = record["count"]
+        return hashlib.sha1(json.dumps(sorted(state.items())).encode("utf-8")).hexdigest()
+
+    def _introspect(self) -> Dict[str, str]:
+        with self._driver.session() as session:
+            node_result = session.run("""
+            CALL db.schema.nodeTypeProperties()
+            YIELD nodeLabels, propertyName, propertyTypes
+            RETURN nodeLabels, collect(propertyName + ': ' + propertyTypes[0]) as properties
+            """)
+            # A node can carry several labels; each label gets the union of its nodes' properties
+            node_schema: Dict[str, set] = {}
+            label_sets = set()
+            for record in node_result:
+                labels = sorted(label.strip(":`") for label in record["nodeLabels"])
+                if len(labels) > 1:
+                    label_sets.add(tuple(labels))
+                for label in labels:
+                    node_schema.setdefault(label, set()).update(record["properties"])
+
+            rel_result = session.run("""
+            CALL db.schema.relTypeProperties()
+            YIELD relType
+            RETURN collect(distinct relType) as relTypes
+            """)
+            # relType comes back as ":`NAME`"
+            rel_types = sorted({rel_type.strip(":`") for rel_type in rel_result.single()["relTypes"]})
+
+        property_lines: List[str] = [f"{label} {{{', '.join(sorted(props))}}}" for label, props in sorted(node_schema.items())]
+        if label_sets:
+            property_lines.append("Label combinations: " + ", ".join(
+                "(:" + ":".join(labels) + ")" for labels in sorted(label_sets)))
+        return {
+            "property_schema": "\n".join(property_lines),
+            "relationship_schema": ", ".join(f"()-[:{rel_type}]->()" for rel_type in rel_types)
+        }
+
+    def _read_snapshot(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._cache_path, 'r', encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return snapshot if isinstance(snapshot, dict) and "schema" in snapshot else None
+
+    def _write_snapshot(self, snapshot: Dict[str, Any]):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self._cache_path)), exist_ok=True)
+            temporary_path = f"{self._cache_path}.tmp"
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                json.dump(snapshot, file, indent=2)
+            os.replace(temporary_path, self._cache_path)
+        except OSError as e:
+            # The schema is still served from memory; only the next process pays introspection again
+            print(f"Could not write graph schema snapshot to {self._cache_path}: {e}")
@@ -0,0 +1,241 @@
+import atexit
+import glob
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from Tracer import get_tracer
+
+DEFAULT_SCHEDULER_POLICY_PATH = os.path.join(os.path.dirname(__file__), 'scheduler_policy.json')
+
+# Lower value is served first; interactive and rerank calls are the foreground of a user query
+PRIORITIES = {"interactive": 0, "rerank": 1, "batch": 2}
+FOREGROUND = ("interactive", "rerank")
+
+
+class TokenBucket:
+    '''Allows `rate` calls per second on average with bursts of up to `burst` calls.'''
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: float = 1.0) -> float:
+        '''Take `cost` tokens and return how many seconds the caller must wait before using them.'''
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= cost
+            return max(0.0, -self._tokens / self.rate)
+
+
+class InferenceScheduler:
+    '''
+    Admission control for model calls to a shared Ollama host. Every call takes a slot in one of
+    three priority classes: interactive (query analysis, Cypher generation, answers, question
+    embeddings), rerank, and batch (doc generation and embedding). A class can be rate limited
+    with a token bucket, and at most `max_concurrency` calls of this process run at once, with
+    waiting calls admitted in priority order.
+
+    Batch calls are preempted between calls: a batch call does not start while a foreground
+    (interactive or rerank) call is running or waiting, or finished less than `grace_seconds`
+    ago, so the next step of a query pipeline does not queue behind a batch call. Foreground
+    activity is also published as marker files in a directory shared per Ollama host, so a
+    `generate` or `embed` process yields to the `run` process serving questions.
+    '''
+
+    def __init__(self, max_concurrency: int = 4, buckets: Optional[Dict[str, TokenBucket]] = None,
+                 grace_seconds: float = 0.5, coordination_directory: Optional[str] = None,
+                 stale_seconds: float = 120.0, poll_interval: float = 0.05):
+        """
+        Args:
+            max_concurrency (int): Calls of this process in flight at once; match OLLAMA_NUM_PARALLEL
+            buckets (Optional[Dict[str, TokenBucket]]): Rate limit per priority class; classes without one are unlimited
+            grace_seconds (float): Batch calls wait this long after the last foreground call
+            coordination_directory (Optional[str]): Directory for the cross-process foreground markers;
+                None disables cross-process preemption
+            stale_seconds (float): Markers older than this are ignored, e.g. when their process died
+            poll_interval (float): Seconds between checks while a batch call waits for another process
+        """
+        self.max_concurrency = max_concurrency
+        self.buckets = buckets or {}
+        self.grace_seconds = grace_seconds
+        self.coordination_directory = coordination_directory
+        self.stale_seconds = stale_seconds
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._foreground = 0
+        self._last_foreground = 0.0
+        self._marker_path = None
+        if coordination_directory:
+            os.makedirs(coordination_directory, exist_ok=True)
+            self._marker_path = os.path.join(coordination_directory, f"{os.getpid()}.foreground")
+            atexit.register(self._remove_marker)
+        self._stats: Dict[str, Dict[str, float]] = {
+            priority: {"calls": 0, "queued": 0, "queue_seconds": 0.0, "preempted": 0} for priority in PRIORITIES
+        }
+
+    @contextmanager
+    def slot(self, priority: str, cost: float = 1.0) -> Iterator[None]:
+        """
+        Hold an inference slot for the duration of one model call.
+
+        Args:
+            priority (str): "interactive", "rerank" or "batch"
+            cost (float): Tokens taken from the class's bucket
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority class: [{priority}]")
+        waited = self._acquire(priority, cost)
+        span = get_tracer().current_span()
+        if span:
+            span.set_attribute("priority", priority)
+            span.set_attribute("queue_ms", round(waited * 1000, 3))
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def _acquire(self, priority: str, cost: float) -> float:
+        start = time.monotonic()
+        bucket = self.buckets.get(priority)
+        if bucket:
+            delay = bucket.reserve(cost)
+            if delay:
+                time.sleep(delay)
+
+        preempted = False
+        with self._condition:
+            entry = (PRIORITIES[priority], next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            while True:
+                blocked_by_foreground = priority == "batch" and self._foreground_active()
+                if (self._waiting[0] == entry and self._in_flight < self.max_concurrency
+                        and not blocked_by_foreground):
+                    break
+                preempted = preempted or blocked_by_foreground
+                # Other processes and the grace period do not notify, so batch waits poll
+                self._condition.wait(self.poll_interval if blocked_by_foreground else None)
+            heapq.heappop(self._waiting)
+            self._in_flight += 1
+            if priority in FOREGROUND:
+                self._foreground += 1
+                if self._foreground == 1:
+                    self._publish_foreground(True)
+            waited = time.monotonic() - start
+            stats = self._stats[priority]
+            stats["calls"] += 1
+            stats["queued"] += waited > 0.001
+            stats["queue_seconds"] += waited
+            stats["preempted"] += preempted
+            # The next waiter may be admissible too, e.g. when slots are free
+            self._condition.notify_all()
+        return waited
+
+    def _release(self, priority: str):
+        with self._condition:
+            self._in_flight -= 1
+            if priority in FOREGROUND:
+                self._foreground -= 1
+                self._last_foreground = time.monotonic()
+                if self._foreground == 0:
+                    self._publish_foreground(False)
+            self._condition.notify_all()
+
+    def _foreground_active(self) -> bool:
+        '''Called with the condition held: foreground work of this or another process is running or just ended.'''
+        if self._foreground or any(entry[0] < PRIORITIES["batch"] for entry in self._waiting):
+            return True
+        if time.monotonic() - self._last_foreground < self.grace_seconds:
+            return True
+        if not self.coordination_directory:
+            return False
+        now = time.time()
+        for marker in glob.glob(os.path.join(self.coordination_directory, "*.foreground")):
+            if marker == self._marker_path:
+                continue
+            try:
+                marker_stat = os.stat(marker)
+            except OSError:
+                continue
+            age = now - marker_stat.st_mtime
+            # An idle process leaves its marker empty, dated at its last foreground call
+            if age < self.grace_seconds or (marker_stat.st_size and age < self.stale_seconds):
+                return True
+        return False
+
+    def _publish_foreground(self, active: bool):
+        if not self._marker_path:
+            return
+        try:
+            # Non-empty while foreground calls run; the modification time is the last change
+            with open(self._marker_path, 'w', encoding='utf-8') as file:
+                file.write("active" if active else "")
+        except OSError:
+            pass
+
+    def _remove_marker(self):
+        try:
+            os.remove(self._marker_path)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        '''Calls, queued calls, total queueing time and batch preemptions per priority class.'''
+        with self._condition:
+            return {priority: dict(stats) for priority, stats in self._stats.items()}
+
+
+def load_inference_scheduler(policy_path: Optional[str] = None) -> InferenceScheduler:
+    '''
+    Build a scheduler from a JSON policy ($SCHEDULER_POLICY_FILE, default scheduler_policy.json):
+    {"max_concurrency": n, "grace_seconds": s, "classes": {"<priority>": {"rate": r, "burst": b}}}.
+    The coordination directory is shared by all processes using the same $OLLAMA_HOST.
+    '''
+    policy_path = policy_path or os.getenv('SCHEDULER_POLICY_FILE', DEFAULT_SCHEDULER_POLICY_PATH)
+    policy: Dict[str, Any] = {}
+    if os.path.isfile(policy_path):
+        with open(policy_path, 'r', encoding='utf-8') as file:
+            policy = json.load(file)
+    buckets = {
+        priority: TokenBucket(limits["rate"], limits.get("burst") or limits["rate"])
+        for priority, limits in policy.get("classes", {}).items()
+        if limits.get("rate")
+    }
+    host = os.getenv('OLLAMA_HOST', 'http://127.0.0.1:11434')
+    coordination_directory = os.path.join(
+        tempfile.gettempdir(), f"inference-scheduler-{hashlib.sha1(host.encode('utf-8')).hexdigest()[:12]}"
+    ) if policy.get("cross_process", True) else None
+    return InferenceScheduler(
+        max_concurrency=policy.get("max_concurrency", 4),
+        buckets=buckets,
+        grace_seconds=policy.get("grace_seconds", 0.5),
+        coordination_directory=coordination_directory
+    )
+
+
+_scheduler: Optional[InferenceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_inference_scheduler() -> InferenceScheduler:
+    '''Return the process-wide inference scheduler, created on first use.'''
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = load_inference_scheduler()
+        return _scheduler
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from Tracer import get_tracer
+
+DEFAULT_POLICY_PATH = os.path.join(os.path.dirname(__file__), 'model_policy.json')
+
+
+class ModelPolicy:
+    '''
+    Per-task model routing read from a JSON file ($MODEL_POLICY_FILE, default model_policy.json):
+    {"<task>": {"models": [small, ..., large], ...task options}}. Tasks that are not listed use
+    the model the agent was constructed with.
+    '''
+
+    def __init__(self, tasks: Dict[str, Dict[str, Any]]):
+        self.tasks = tasks
+
+    @staticmethod
+    def load(policy_path: Optional[str] = None) -> "ModelPolicy":
+        policy_path = policy_path or os.getenv('MODEL_POLICY_FILE', DEFAULT_POLICY_PATH)
+        if not os.path.isfile(policy_path):
+            return ModelPolicy({})
+        with open(policy_path, 'r', encoding='utf-8') as file:
+            return ModelPolicy(json.load(file))
+
+    def models_for(self, task: str, default_model: str) -> List[str]:
+        return list(self.tasks.get(task, {}).get("models") or [default_model])
+
+    def option(self, task: str, name: str, default: Any = None) -> Any:
+        return self.tasks.get(task, {}).get(name, default)
+
+
+_policy: Optional[ModelPolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_model_policy() -> ModelPolicy:
+    '''Return the process-wide model policy, loaded on first use.'''
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = ModelPolicy.load()
+        return _policy
+
+
+class ModelCascade:
+    '''
+    Runs a task on the cheapest configured model first and escalates to the next model only when
+    the output fails validation or reports low confidence. Escalation counts are kept per task
+    and every call is traced as a "cascade.<task>" span.
+    '''
+
+    _stats: Dict[str, Dict[str, Any]] = {}
+    _stats_lock = threading.Lock()
+
+    def __init__(self, task: str, default_model: str, policy: Optional[ModelPolicy] = None):
+        """
+        Args:
+            task (str): Task name in the policy, e.g. "query_analysis"
+            default_model (str): Model used when the policy does not list the task
+            policy (Optional[ModelPolicy]): Defaults to the process-wide policy
+        """
+        self.task = task
+        policy = policy or get_model_policy()
+        self.models = policy.models_for(task, default_model)
+        self.options = policy.tasks.get(task, {})
+
+    def option(self, name: str, default: Any = None) -> Any:
+        return self.options.get(name, default)
+
+    def run(self, attempt: Callable[[str], Any], validate: Callable[[Any], bool],
+            usable: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, str]:
+        """
+        Call `attempt` with each model in turn until `validate` accepts the result.
+
+        Args:
+            attempt (Callable[[str], Any]): Runs the task on the given model and returns its parsed output;
+                exceptions count as a failed validation
+            validate (Callable[[Any], bool]): True when the output is good enough to return
+            usable (Optional[Callable[[Any], bool]]): True when a rejected output is still worth
+                returning if no model is accepted, e.g. a parsed but low-confidence answer;
+                defaults to any output other than None
+
+        Returns:
+            Tuple[Any, str]: The accepted output, or else the last usable output (None when there
+                was none), and the model that produced it
+        """
+        usable = usable or (lambda output: output is not None)
+        result = None
+        accepted = False
+        level = 0
+        # A later model that fails or returns garbage must not discard an earlier usable answer
+        fallback: Tuple[Any, Optional[str]] = (None, None)
+        with get_tracer().span(f"cascade.{self.task}", models=len(self.models)) as span:
+            for level, model in enumerate(self.models):
+                try:
+                    result = attempt(model)
+                    accepted = validate(result)
+                except Exception as e:
+                    result = None
+                    accepted = False
+                    span.set_attribute("error", str(e))
+                if accepted:
+                    break
+                if result is not None and usable(result):
+                    fallback = (result, model)
+            if not accepted and fallback[1] is not None:
+                result, model = fallback
+            span.set_attribute("model", model)
+            span.set_attribute("escalated", level > 0)
+            span.set_attribute("accepted", accepted)
+        self._record(level, model, accepted)
+        return result, model
+
+    def _record(self, level: int, model: str, accepted: bool):
+        with self._stats_lock:
+            stats = self._stats.setdefault(self.task, {"requests": 0, "escalated": 0, "rejected": 0, "served_by": {}})
+            stats["requests"] += 1
+            stats["escalated"] += level > 0
+            stats["rejected"] += not accepted
+            stats["served_by"][model] = stats["served_by"].get(model, 0) + 1
+
+
+def get_cascade_stats() -> Dict[str, Dict[str, Any]]:
+    '''Per-task request, escalation and rejection counts of this process, with the escalation rate.'''
+    with ModelCascade._stats_lock:
+        return {
+            task: {**stats, "served_by": dict(stats["served_by"]),
+                   "escalation_rate": stats["escalated"] / stats["requests"] if stats["requests"] else 0.0}
+            for task, stats in ModelCascade._stats.items()
+        }
+
+
+def format_cascade_stats(stats: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{'task':<24}{'requests':>10}{'escalated':>11}{'rate':>8}{'rejected':>10}"]
+    for task in sorted(stats):
+        task_stats = stats[task]
+        lines.append(f"{task:<24}{task_stats['requests']:>10}{task_stats['escalated']:>11}"
+                     f"{task_stats['escalation_rate']:>8.1%}{task_stats['rejected']:>10}")
+    return "\n".join(lines)
@@ -0,0 +1,152 @@
+import hashlib
+import re
+import zlib
+from typing import List, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+class DuplicateClusters:
+    '''Result of a clustering pass: every key maps to the representative that stands in for it'''
+
+    def __init__(self):
+        self.representatives: Dict[str, str] = {}
+        self._members: Dict[str, List[str]] = {}
+
+    def add(self, key: str, representative: str):
+        self.representatives[key] = representative
+        self._members.setdefault(representative, []).append(key)
+
+    def representative_of(self, key: str) -> str:
+        return self.representatives[key]
+
+    def is_representative(self, key: str) -> bool:
+        return self.representatives[key] == key
+
+    def members(self, representative: str) -> List[str]:
+        '''All keys of the cluster, the representative first.'''
+        return self._members.get(representative, [])
+
+    def cluster_id(self, key: str) -> str:
+        '''Stable id of the key's cluster, derived from its representative.'''
+        return "dup-" + hashlib.sha1(self.representatives[key].encode('utf-8')).hexdigest()[:12]
+
+    def cluster_count(self) -> int:
+        return len(self._members)
+
+    def duplicate_count(self) -> int:
+        '''Keys that reuse another key's result.'''
+        return len(self.representatives) - len(self._members)
+
+
+class NearDuplicateDetector:
+    '''
+    MinHash/LSH clustering of code text. Texts are tokenised, split into overlapping token
+    shingles and summarised by a MinHash signature; LSH banding finds candidate pairs without
+    comparing every pair. A text joins the first earlier representative whose estimated Jaccard
+    similarity reaches the threshold, so every member is close to the representative whose
+    embedding or documentation it reuses, not just to some other member.
+    '''
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        """
+        Args:
+            threshold (float): Minimum estimated Jaccard similarity of shingle sets to count as a duplicate
+            num_perm (int): MinHash signature length
+            shingle_size (int): Tokens per shingle
+            seed (int): Seed of the permutation parameters; signatures are only comparable with the same seed
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = self._band_layout(threshold, num_perm)
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def _band_layout(threshold: float, num_perm: int) -> Tuple[int, int]:
+        # The LSH threshold (1/b)^(1/r) should sit just below the target so that candidates are
+        # over-generated and then filtered by the signature estimate, not missed
+        layouts = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+        below = [layout for layout in layouts if (1 / layout[0]) ** (1 / layout[1]) <= threshold]
+        return max(below, key=lambda layout: (1 / layout[0]) ** (1 / layout[1])) if below else layouts[-1]
+
+    def _shingles(self, text: str) -> List[str]:
+        tokens = _TOKEN.findall(text)
+        if len(tokens) <= self.shingle_size:
+            return [" ".join(tokens)] if tokens else []
+        return [" ".join(tokens[i:i + self.shingle_size]) for i in range(len(tokens) - self.shingle_size + 1)]
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        '''MinHash signature of a text, or None for text without tokens (never clustered).'''
+        shingles = self._shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in set(shingles)),
+                             dtype=np.uint64)
+        permuted = ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def similarity(self, first: np.ndarray, second: np.ndarray) -> float:
+        '''Estimated Jaccard similarity of two signatures.'''
+        return float(np.count_nonzero(first == second)) / self.num_perm
+
+    def cluster(self, items: Iterable[Tuple[str, str]]) -> DuplicateClusters:
+        """
+        Cluster texts by near-duplicate content.
+
+        Args:
+            items (Iterable[Tuple[str, str]]): (key, text) pairs; earlier items become representatives
+
+        Returns:
+            DuplicateClusters: The representative of every key
+        """
+        # Texts are only needed for their signature, so a lazy iterable is never held in memory
+        return self.cluster_signatures((key, self.signature(text)) for key, text in items)
+
+    def cluster_signatures(self, items: Iterable[Tuple[str, Optional[np.ndarray]]]) -> DuplicateClusters:
+        """
+        Cluster precomputed signatures, e.g. ones taken while the texts were streamed in another order.
+
+        Args:
+            items (Iterable[Tuple[str, Optional[np.ndarray]]]): (key, signature) pairs; earlier items
+                become representatives, and keys without a signature form their own cluster
+
+        Returns:
+            DuplicateClusters: The representative of every key
+        """
+        clusters = DuplicateClusters()
+        buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(self.bands)]
+        signatures: Dict[str, np.ndarray] = {}
+
+        for key, signature in items:
+            if key in clusters.representatives:
+                continue
+            if signature is None:
+                clusters.add(key, key)
+                continue
+
+            band_keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+            candidates = dict.fromkeys(
+                candidate for band, band_key in enumerate(band_keys) for candidate in buckets[band].get(band_key, ())
+            )
+            representative = next(
+                (candidate for candidate in candidates
+                 if self.similarity(signature, signatures[candidate]) >= self.threshold),
+                None
+            )
+            if representative is not None:
+                clusters.add(key, representative)
+                continue
+
+            # Only representatives are indexed, so members are always matched against them
+            clusters.add(key, key)
+            signatures[key] = signature
+            for band, band_key in enumerate(band_keys):
+                buckets[band].setdefault(band_key, []).append(key)
+        return clusters
@@ -0,0 +1,102 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+import ollama
+
+from InferenceScheduler import get_inference_scheduler
+
+# How long Ollama keeps the model, and with it the cached prefix, loaded between calls
+DEFAULT_KEEP_ALIVE = "30m"
+
+
+def split_prompt_template(template: str, marker: str) -> Tuple[str, str]:
+    '''Split a prompt template into its static prefix and the tail starting at `marker`.'''
+    index = template.find(marker)
+    if index == -1:
+        raise ValueError(f"Prompt template has no [{marker}] section")
+    return template[:index], template[index:]
+
+
+class PromptPrefixSession:
+    '''
+    Generation calls that share a long static instruction prefix. The prefix is sent as the
+    system prompt, ahead of the per-call text, and the model is kept loaded, so the Ollama runner
+    finds the prefix in its KV cache and only evaluates the new tail. A warm-up call fills the
+    cache and measures the prefix length in tokens, which is the basis of the prefill savings
+    reported per call.
+    '''
+
+    def __init__(self, model_name: str, prefix: str, options: Optional[Dict[str, Any]] = None,
+                 keep_alive: str = DEFAULT_KEEP_ALIVE, priority: str = "interactive"):
+        """
+        Args:
+            model_name (str): Ollama model
+            prefix (str): Static instructions shared by every call
+            options (Optional[Dict[str, Any]]): Model options; must be the same on every call or the cache is dropped
+            keep_alive (str): Ollama keep_alive for every call
+            priority (str): InferenceScheduler class of the calls
+        """
+        self.model_name = model_name
+        self.prefix = prefix
+        self.options = options or {}
+        self.keep_alive = keep_alive
+        self.priority = priority
+        self.prefix_tokens: Optional[int] = None
+        self.calls = 0
+        self.prefill_tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def _warm_up(self):
+        with self._lock:
+            if self.prefix_tokens is not None:
+                return
+            with get_inference_scheduler().slot(self.priority):
+                response = ollama.generate(model=self.model_name, system=self.prefix, prompt="OK",
+                                           options={**self.options, "num_predict": 1}, keep_alive=self.keep_alive)
+            self.prefix_tokens = response.get('prompt_eval_count') or max(1, len(self.prefix) // 4)
+
+    def generate(self, tail: str, **kwargs):
+        """
+        Generate a response for the prefix followed by `tail`.
+
+        Args:
+            tail (str): The per-call part of the prompt
+            **kwargs: Further ollama.generate arguments, e.g. format or stream
+
+        Returns:
+            The ollama.generate response, or the chunk iterator when streaming
+        """
+        if self.prefix_tokens is None:
+            self._warm_up()
+        if kwargs.get("stream"):
+            return self._stream(tail, **kwargs)
+        with get_inference_scheduler().slot(self.priority):
+            return ollama.generate(model=self.model_name, system=self.prefix, prompt=tail, options=self.options,
+                                   keep_alive=self.keep_alive, **kwargs)
+
+    def _stream(self, tail: str, **kwargs):
+        # The slot is held until the last chunk has been read
+        with get_inference_scheduler().slot(self.priority):
+            yield from ollama.generate(model=self.model_name, system=self.prefix, prompt=tail, options=self.options,
+                                       keep_alive=self.keep_alive, **kwargs)
+
+    def record(self, response: Any, tail: str) -> int:
+        """
+        Estimate the prompt tokens the call did not have to evaluate and add them to the totals.
+        The tail length in tokens is estimated with the characters-per-token ratio of the prefix.
+
+        Args:
+            response: The final (done) response of a generate call
+            tail (str): The tail that was sent
+
+        Returns:
+            int: Prefill tokens saved by this call, at most the prefix length
+        """
+        # Ollama leaves prompt_eval_count out when the whole prompt came from the cache
+        evaluated = response.get('prompt_eval_count') or 0
+        characters_per_token = max(1.0, len(self.prefix) / self.prefix_tokens)
+        expected = self.prefix_tokens + len(tail) / characters_per_token
+        saved = int(min(self.prefix_tokens, max(0.0, expected - evaluated)))
+        with self._lock:
+            self.calls += 1
+            self.prefill_tokens_saved += saved
+        return saved
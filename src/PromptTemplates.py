@@ -0,0 +1,14 @@
+import functools
+import os
+
+PROMPTS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'prompts')
+
+
+@functools.lru_cache(maxsize=None)
+def load_prompt_template(file_name: str) -> str:
+    '''
+    Read a prompt file from the prompts directory. Agents call this when they first build a
+    prompt rather than in their constructors, and each file is read once per process.
+    '''
+    with open(os.path.join(PROMPTS_DIRECTORY, file_name), 'r') as file:
+        return file.read()
@@ -1,85 +1,193 @@
-from typing import List, Dict, Any
-from query_analysis_service import QueryAnalysisService
-from search_engines.search_code_engine import SearchCodeEngine
-from search_engines.search_code_doc_engine import SearchCodeDocEngine
-from search_engines.search_graph_db_engine import SearchGraphDBEngine
-from reranking_engine import RerankingEngine
-
-class QueryService:
-    def __init__(self):
-        self.query_analysis_service = QueryAnalysisService()
-        self.code_search_engine = SearchCodeEngine()
-        self.doc_search_engine = SearchCodeDocEngine()
-        self.graph_db_search_engine = SearchGraphDBEngine()
-        self.reranking_engine = RerankingEngine()
-
-    def process_query(self, user_question: str) -> Dict[str, Any]:
-        """
-        Process a user query by analyzing it, searching relevant databases, and reranking results.
-
-        Args:
-            user_question (str): The user's input question
-
-        Returns:
-            Dict[str, Any]: A dictionary containing the query results and metadata
-        """
-        # Analyze the query
-        analysis_result = self.query_analysis_service.analyze_query(user_question)
-        
-        if not analysis_result["success"]:
-            return {"error": "Failed to analyze query", "details": analysis_result["error"]}
-
-        # Perform searches based on the analysis
-        search_results = self._perform_searches(user_question, analysis_result["databases_to_query"])
-
-        # Combine and rerank results
-        combined_results = self._combine_results(search_results)
-        reranked_results = self.reranking_engine.rerank(user_question, combined_results)
-
-        return {
-            "question": user_question,
-            "analyzed_databases": analysis_result["databases_to_query"],
-            "results": reranked_results,
-            "total_results": len(reranked_results)
-        }
-
-    def _perform_searches(self, question: str, databases: List[str]) -> Dict[str, List[Dict[str, Any]]]:
-        """
-        Perform searches across specified databases.
-
-        Args:
-            question (str): The user's question
-            databases (List[str]): List of databases to search
-
-        Returns:
-            Dict[str, List[Dict[str, Any]]]: Search results for each database
-        """
-        search_results = {}
-        
-        if "code_db" in databases:
-            search_results["code_db"] = self.code_search_engine.search(question)
-        
-        if "documentation_db" in databases:
-            search_results["documentation_db"] = self.doc_search_engine.search(question)
-        
-        if "neo4j" in databases:
-            search_results["neo4j"] = self.graph_db_search_engine.search(question)
-
-        return search_results
-
-    def _combine_results(self, search_results: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
-        """
-        Combine results from different databases into a single list.
-
-        Args:
-            search_results (Dict[str, List[Dict[str, Any]]]): Search results for each database
-
-        Returns:
-            List[Dict[str, Any]]: Combined list of results
-        """
-        combined = []
-        for db_name, results in search_results.items():
-            for result in results:
-                result["source_db"] = db_name
-                combined.append(result)
-        return combined
+import json
+import os
+import threading
+from typing import List, Dict, Any
+
+from agents.QueryAnalysisAgent import QueryAnalysisService
+from searchEngine.QueryEmbeddingCache import get_query_embedding_cache
+from GraphNeighborhoodCache import GraphNeighborhoodCache
+from Reranker import Reranker
+from GenerateAnswerService import GenerateAnswerService
+from Tracer import get_tracer
+
+class QueryService:
+    def __init__(self, code_persistence_directory: str = "./embeddings/code",
+                 doc_persistence_directory: str = "./embeddings/docs"):
+        self.query_analysis_service = QueryAnalysisService()
+        self.code_persistence_directory = code_persistence_directory
+        self.doc_persistence_directory = doc_persistence_directory
+        self._search_engines: Dict[str, Any] = {}
+        self._search_engines_lock = threading.Lock()
+        self.query_embedding_cache = get_query_embedding_cache()
+        self.graph_neighborhood = GraphNeighborhoodCache()
+        self.reranking_engine = Reranker()
+        self.answer_service = GenerateAnswerService()
+        self.tracer = get_tracer()
+
+    def _search_engine(self, database: str):
+        '''
+        Open the search engine of a database on the first question routed to it, so the service
+        starts without importing chromadb or connecting to Neo4j.
+        '''
+        with self._search_engines_lock:
+            if database not in self._search_engines:
+                if database == "code_db":
+                    from searchEngine.SearchCodeEngine import SearchCodeEngine
+                    engine = SearchCodeEngine(self.code_persistence_directory)
+                elif database == "documentation_db":
+                    from searchEngine.SearchCodeDocEngine import SearchCodeDocEngine
+                    engine = SearchCodeDocEngine(self.doc_persistence_directory)
+                else:
+                    from searchEngine.SearchGraphDBEngine import SearchGraphDBEngine
+                    engine = SearchGraphDBEngine(
+                        os.getenv('NEO4J_DATABASE_HOST'), os.getenv('NOE4J_DATABASE_USER'), os.getenv('NOE4J_DATABASE_PW')
+                    )
+                self._search_engines[database] = engine
+            return self._search_engines[database]
+
+    @property
+    def code_search_engine(self):
+        return self._search_engine("code_db")
+
+    @property
+    def doc_search_engine(self):
+        return self._search_engine("documentation_db")
+
+    @property
+    def graph_db_search_engine(self):
+        return self._search_engine("neo4j")
+
+    def process_query(self, user_question: str) -> Dict[str, Any]:
+        """
+        Process a user query by analyzing it, searching relevant databases, reranking results
+        and generating an answer. Every stage is recorded as a span on the process tracer.
+
+        Args:
+            user_question (str): The user's input question
+
+        Returns:
+            Dict[str, Any]: A dictionary containing the query results and metadata
+        """
+        with self.tracer.span("query", question_length=len(user_question)) as query_span:
+            # Analyze the query
+            with self.tracer.span("query.analysis"):
+                analysis_result = self.query_analysis_service.analyze_query(user_question)
+
+            if not analysis_result["success"]:
+                query_span.set_attribute("error", analysis_result["error"])
+                return {"error": "Failed to analyze query", "details": analysis_result["error"]}
+
+            # Perform searches based on the analysis
+            search_results = self._perform_searches(user_question, analysis_result["databases_to_query"])
+
+            # Combine and rerank results
+            combined_results = self._combine_results(search_results)
+            with self.tracer.span("graph.expand") as span:
+                span.set_attribute("expanded", self._expand_graph_neighborhood(combined_results))
+            with self.tracer.span("rerank", candidates=len(combined_results)):
+                reranked_results = self.reranking_engine.rerank(user_question, combined_results)
+
+            with self.tracer.span("answer.generation"):
+                answer_result = self.answer_service.generate_answer(user_question, reranked_results)
+
+            query_span.set_attribute("total_results", len(reranked_results))
+            return {
+                "question": user_question,
+                "analyzed_databases": analysis_result["databases_to_query"],
+                "results": reranked_results,
+                "total_results": len(reranked_results),
+                "answer": answer_result.get("answer", answer_result.get("error", "")),
+                "sources": answer_result.get("sources", [])
+            }
+
+    def _perform_searches(self, question: str, databases: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Perform searches across specified databases.
+
+        Args:
+            question (str): The user's question
+            databases (List[str]): List of databases to search
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Search results for each database
+        """
+        search_results = {}
+
+        if "code_db" in databases:
+            query_embedding = self._embed_question(self.code_search_engine.model_name, question)
+            with self.tracer.span("search.code_db") as span:
+                search_results["code_db"] = self.code_search_engine.query_similar_code(
+                    question, query_embedding=query_embedding
+                )
+                span.set_attribute("hits", len(search_results["code_db"]))
+
+        if "documentation_db" in databases:
+            query_embedding = self._embed_question(self.doc_search_engine.model_name, question)
+            with self.tracer.span("search.documentation_db") as span:
+                search_results["documentation_db"] = self.doc_search_engine.query_similar_docs(
+                    question, query_embedding=query_embedding
+                )
+                span.set_attribute("hits", len(search_results["documentation_db"]))
+
+        if "neo4j" in databases:
+            with self.tracer.span("search.neo4j") as span:
+                graph_result = self.graph_db_search_engine.search(question)
+                search_results["neo4j"] = self._graph_result_to_items(graph_result)
+                span.set_attribute("hits", len(search_results["neo4j"]))
+
+        return search_results
+
+    def _embed_question(self, model_name: str, question: str) -> List[float]:
+        """
+        Embed the question once per model per request; repeated and concurrent questions are
+        served from the shared query embedding cache.
+        """
+        with self.tracer.span("embed.question", model=model_name) as span:
+            span.mark_cache(self.query_embedding_cache.contains(model_name, question))
+            return self.query_embedding_cache.get_embedding(model_name, question)
+
+    def _graph_result_to_items(self, graph_result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if graph_result.get("status") != "success":
+            return []
+        return [
+            {"title": graph_result["cypher_query"], "content": json.dumps(record, default=str)}
+            for record in graph_result["results"]
+        ]
+
+    def _expand_graph_neighborhood(self, results: List[Dict[str, Any]]) -> int:
+        """
+        Attach the callers, callees, owning class and base classes of each vector hit, read from
+        the adjacency cache precomputed by the embed mode, so no Neo4j query is made.
+
+        Args:
+            results (List[Dict[str, Any]]): Combined search results, updated in place with "graph_context"
+
+        Returns:
+            int: Number of results that were found in the graph
+        """
+        expanded = 0
+        for result in results:
+            if result["source_db"] in ("code_db", "documentation_db"):
+                graph_context = self.graph_neighborhood.expand(result)
+                if graph_context:
+                    result["graph_context"] = graph_context
+                    expanded += 1
+        return expanded
+
+    def _combine_results(self, search_results: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Combine results from different databases into a single list.
+
+        Args:
+            search_results (Dict[str, List[Dict[str, Any]]]): Search results for each database
+
+        Returns:
+            List[Dict[str, Any]]: Combined list of results
+        """
+        combined = []
+        for db_name, results in search_results.items():
+            for result in results:
+                result["source_db"] = db_name
+                result.setdefault("title", result.get("file_name", result.get("class_name", "Untitled")))
+                combined.append(result)
+        return combined
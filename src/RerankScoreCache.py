@@ -0,0 +1,165 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_RERANK_CACHE_PATH = os.path.join(".", "cache", "rerank_scores.sqlite")
+
+
+def question_fingerprint(question: str) -> str:
+    '''Hash of the question with case, whitespace and trailing punctuation normalized away.'''
+    normalized = re.sub(r"\s+", " ", question).strip().lower().rstrip("?.! ")
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def document_fingerprint(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class RerankScoreCache:
+    '''
+    Relevance scores of (question, document) pairs in a SQLite file, so documents that come back
+    for a repeated question are not scored by the model again, also across restarts and between
+    processes sharing the file. A question only repeats when it differs in case, whitespace or
+    trailing punctuation; any other rewording is a new question.
+
+    Entries are keyed by the scorer (models and prompt), the normalized question hash and the
+    document content hash; a changed document or rerank policy therefore never hits. Entries
+    expire `ttl_seconds` after they were scored, and above `max_entries` the least recently used
+    ones are evicted.
+    '''
+
+    def __init__(self, cache_path: Optional[str] = None, ttl_seconds: float = 7 * 24 * 3600,
+                 max_entries: int = 100000):
+        """
+        Args:
+            cache_path (Optional[str]): SQLite file; defaults to $RERANK_CACHE or ./cache/rerank_scores.sqlite
+            ttl_seconds (float): Age after which a score is scored again
+            max_entries (int): Entries kept; the least recently used are evicted beyond this
+        """
+        self.cache_path = cache_path or os.getenv("RERANK_CACHE", DEFAULT_RERANK_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._writes_since_eviction = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        '''Called with the lock held; the file is opened on first use.'''
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+            connection = sqlite3.connect(self.cache_path, timeout=5.0, check_same_thread=False)
+            # WAL lets a batch embedder and the query service read while the other writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS scores (
+                    scorer TEXT NOT NULL,
+                    question_hash TEXT NOT NULL,
+                    document_hash TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    scored_at REAL NOT NULL,
+                    used_at REAL NOT NULL,
+                    PRIMARY KEY (scorer, question_hash, document_hash)
+                ) WITHOUT ROWID
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS scores_used_at ON scores (used_at)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def get_scores(self, scorer: str, question: str, contents: List[str]) -> Dict[str, float]:
+        """
+        Look up the cached scores of a question's candidate documents with one query.
+
+        Args:
+            scorer (str): Fingerprint of the models and prompt that produce the scores
+            question (str): The user's question
+            contents (List[str]): Candidate document contents
+
+        Returns:
+            Dict[str, float]: Score per document fingerprint, for the documents that were cached and fresh
+        """
+        document_hashes = list(dict.fromkeys(document_fingerprint(content) for content in contents))
+        if not document_hashes:
+            return {}
+        now = time.time()
+        question_hash = question_fingerprint(question)
+        with self._lock:
+            connection = self._connect()
+            placeholders = ",".join("?" * len(document_hashes))
+            rows = connection.execute(
+                f"SELECT document_hash, score FROM scores WHERE scorer = ? AND question_hash = ? "
+                f"AND document_hash IN ({placeholders}) AND scored_at >= ?",
+                [scorer, question_hash, *document_hashes, now - self.ttl_seconds]
+            ).fetchall()
+            scores = dict(rows)
+            if scores:
+                connection.execute(
+                    f"UPDATE scores SET used_at = ? WHERE scorer = ? AND question_hash = ? "
+                    f"AND document_hash IN ({','.join('?' * len(scores))})",
+                    [now, scorer, question_hash, *scores]
+                )
+                connection.commit()
+            self.hits += len(scores)
+            self.misses += len(document_hashes) - len(scores)
+        return scores
+
+    def put_scores(self, scorer: str, question: str, scores: Dict[str, float]):
+        """
+        Store freshly scored documents.
+
+        Args:
+            scorer (str): Fingerprint of the models and prompt that produced the scores
+            question (str): The user's question
+            scores (Dict[str, float]): Score per document content
+        """
+        if not scores:
+            return
+        now = time.time()
+        question_hash = question_fingerprint(question)
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)",
+                [(scorer, question_hash, document_fingerprint(content), score, now, now)
+                 for content, score in scores.items()]
+            )
+            self._writes_since_eviction += len(scores)
+            # Counting rows on every write would cost more than the lookups save
+            if self._writes_since_eviction >= max(1, self.max_entries // 100):
+                self._evict(connection, now)
+            connection.commit()
+
+    def _evict(self, connection: sqlite3.Connection, now: float):
+        self._writes_since_eviction = 0
+        connection.execute("DELETE FROM scores WHERE scored_at < ?", (now - self.ttl_seconds,))
+        (count,) = connection.execute("SELECT COUNT(*) FROM scores").fetchone()
+        if count > self.max_entries:
+            connection.execute(
+                "DELETE FROM scores WHERE (scorer, question_hash, document_hash) IN "
+                "(SELECT scorer, question_hash, document_hash FROM scores ORDER BY used_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+_shared_cache: Optional[RerankScoreCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_rerank_score_cache() -> RerankScoreCache:
+    '''Return the process-wide rerank score cache.'''
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = RerankScoreCache()
+        return _shared_cache
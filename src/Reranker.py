@@ -1,41 +1,73 @@
-from agents import RerankingAgent
-
-class Reranker:
-    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0"):
-        self._agent = RerankingAgent(model_name)
-
-    def rerank(self, question: str, data_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """
-        Rerank the given data items based on their relevance to the question.
-
-        Args:
-            question (str): The user's question
-            data_items (List[Dict[str, Any]]): List of data items to be reranked
-
-        Returns:
-            List[Dict[str, Any]]: Reranked list of data items with relevance scores
-        """
-        reranked_items = []
-        for item in data_items:
-            content = self._extract_content(item)
-            relevance_result = self._agent.evaluate_relevance(question, content)
-            
-            reranked_item = item.copy()
-            reranked_item['relevance_score'] = relevance_result['relevance_score']
-            reranked_items.append(reranked_item)
-
-        # Sort the items by relevance score in descending order
-        reranked_items.sort(key=lambda x: x['relevance_score'], reverse=True)
-        return reranked_items
-
-    def _extract_content(self, item: Dict[str, Any]) -> str:
-        """
-        Extract the main content from a data item.
-        Adjust this method based on the structure of your data items.
-        """
-        if 'content' in item:
-            return item['content']
-        elif 'text' in item:
-            return item['text']
-        else:
-            return str(item)  # fallback to string representation
+from typing import List, Dict, Any
+
+from agents.RerankingAgent import ReRankingAgent
+from RerankScoreCache import document_fingerprint, get_rerank_score_cache
+from Tracer import get_tracer
+
+class Reranker:
+    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0", score_cache=None):
+        self._agent = ReRankingAgent(model_name)
+        self._tracer = get_tracer()
+        self._score_cache = score_cache or get_rerank_score_cache()
+
+    def rerank(self, question: str, data_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Rerank the given data items based on their relevance to the question. Scores of pairs
+        seen before come from the rerank score cache; only the other documents, each distinct
+        content once, are scored by the model. The request's cache hits and hit rate are set on
+        the current span.
+
+        Args:
+            question (str): The user's question
+            data_items (List[Dict[str, Any]]): List of data items to be reranked
+
+        Returns:
+            List[Dict[str, Any]]: Reranked list of data items with relevance scores
+        """
+        scorer = self._agent.scorer_fingerprint
+        contents = [self._extract_content(item) for item in data_items]
+        cached = self._score_cache.get_scores(scorer, question, contents)
+
+        scores, scored = {}, {}
+        reranked_items = []
+        for item, content in zip(data_items, contents):
+            document_hash = document_fingerprint(content)
+            # The same content can be returned twice, e.g. by code_db and documentation_db
+            if document_hash not in scores:
+                with self._tracer.span("rerank.item", content_length=len(content)) as span:
+                    span.mark_cache(document_hash in cached)
+                    if document_hash in cached:
+                        scores[document_hash] = cached[document_hash]
+                    else:
+                        relevance_result = self._agent.evaluate_relevance(question, content)
+                        scores[document_hash] = relevance_result['relevance_score']
+                        # Unparseable model output falls back to 0 and is asked again next time
+                        if not relevance_result.get('fallback'):
+                            scored[content] = relevance_result['relevance_score']
+            score = scores[document_hash]
+            
+            reranked_item = item.copy()
+            reranked_item['relevance_score'] = score
+            reranked_items.append(reranked_item)
+        self._score_cache.put_scores(scorer, question, scored)
+
+        span = self._tracer.current_span()
+        if span and scores:
+            span.set_attribute("cache_hits", len(cached))
+            span.set_attribute("cache_hit_rate", round(len(cached) / len(scores), 3))
+
+        # Sort the items by relevance score in descending order
+        reranked_items.sort(key=lambda x: x['relevance_score'], reverse=True)
+        return reranked_items
+
+    def _extract_content(self, item: Dict[str, Any]) -> str:
+        """
+        Extract the main content from a data item.
+        Adjust this method based on the structure of your data items.
+        """
+        if 'content' in item:
+            return item['content']
+        elif 'text' in item:
+            return item['text']
+        else:
+            return str(item)  # fallback to string representation
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from DocRecordSink import shard_name
+
+SHARDS_DIRECTORY = "shards"
+MANIFEST_FILE = "manifest.json"
+
+
+def shard_of(key: str, shard_count: int) -> int:
+    '''Stable shard of a partition key; unlike hash() it is the same in every process and run.'''
+    return int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'big') % shard_count
+
+
+def collection_shards_directory(persistence_directory: str, collection_name: str) -> str:
+    return os.path.join(persistence_directory, SHARDS_DIRECTORY, collection_name)
+
+
+def read_shard_manifest(persistence_directory: str, collection_name: str) -> Optional[Dict[str, Any]]:
+    '''The manifest written by the last merge of a sharded collection, or None when it is not sharded.'''
+    try:
+        with open(os.path.join(collection_shards_directory(persistence_directory, collection_name), MANIFEST_FILE),
+                  'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def shard_directories(persistence_directory: str, collection_name: str, manifest: Dict[str, Any]) -> List[str]:
+    base = collection_shards_directory(persistence_directory, collection_name)
+    return [os.path.join(base, shard["directory"]) for shard in manifest["shards"]]
+
+
+def collection_is_sharded(persistence_directory: str, collection_name: str) -> bool:
+    return os.path.isdir(collection_shards_directory(persistence_directory, collection_name))
+
+
+def remove_collection_shards(persistence_directory: str, collection_name: str):
+    '''
+    Called when the whole single, unsharded collection is written again: its shards would
+    otherwise keep being searched instead of it, with stale data. They are removed rather than only unlisted,
+    because records of a later run with another shard count would land next to the stale ones.
+    '''
+    base = collection_shards_directory(persistence_directory, collection_name)
+    if os.path.isdir(base):
+        print(f"Removing the shards of {collection_name} in {base}; searches use the single collection again.")
+        shutil.rmtree(base)
+
+
+# -- worker processes ----------------------------------------------------------------------------
+# Each worker opens its own Chroma client on its own shard directory, so no two processes write
+# to the same database, and does its share of the reading, hashing and serialising.
+
+def _embed_code_shard(shard_directory: str, shard_index: int, shard_count: int, model_name: str,
+                      codebase_path: str, file_extensions: List[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    from CodebaseEmbedding import CodeFileEmbedding
+
+    embedder = CodeFileEmbedding(shard_directory, model_name)
+    summary = embedder.embed_codebase(
+        codebase_path, file_extensions,
+        path_filter=lambda relative_path: shard_of(relative_path, shard_count) == shard_index, **options
+    )
+    summary["shard_records"] = embedder.collection.count()
+    return summary
+
+
+def _embed_doc_records_shard(shard_directory: str, shard_index: int, shard_count: int, model_name: str,
+                             directory: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    from CodebaseEmbedding import CodeTextEmbedding
+
+    embedder = CodeTextEmbedding(shard_directory, model_name)
+    summary = embedder.embed_directory(
+        directory, shard_filter=lambda shard: shard_of(shard, shard_count) == shard_index, **options
+    )
+    summary["shard_records"] = embedder.collection.count()
+    return summary
+
+
+def _embed_class_docs_shard(shard_directory: str, shard_index: int, shard_count: int, model_name: str,
+                            neo4j_settings: List[str], project_namespace: str, class_names: List[str],
+                            options: Dict[str, Any]) -> Dict[str, Any]:
+    from CodebaseEmbedding import CodeDocEmbedding
+
+    embedder = CodeDocEmbedding(*neo4j_settings, shard_directory)
+    summary = embedder.embed_project_documentation(project_namespace, class_names=class_names, **options)
+    summary["shard_records"] = embedder.collection.count()
+    return summary
+
+
+class ShardedEmbedding:
+    '''
+    Runs the embedders on a pool of worker processes, one Chroma shard per worker, for codebases
+    where reading, hashing and serialising in a single process is the bottleneck.
+
+    Code files are partitioned by a hash of their relative path. Method and class documentation
+    is partitioned by a hash of its namespace, so every record of a namespace lands in the same
+    shard across runs and unchanged records are still skipped. After all workers finished, the
+    merge step writes a manifest listing the shards; create_vector_backend reads it and queries
+    every shard. Near-duplicate clustering runs per shard, so copies that fall into different
+    shards are embedded separately.
+
+    Shards live in <persistence_directory>/shards/<collection>/shard-NN. The shard count is kept
+    in the manifest; running with a different count removes the old shards and embeds again.
+    Writing the whole single collection again (an unsharded embed) removes its shards; partial
+    unsharded writes are refused while shards exist.
+    '''
+
+    def __init__(self, persistence_directory: str, shard_count: Optional[int] = None, workers: Optional[int] = None):
+        """
+        Args:
+            persistence_directory (str): Chroma persistence directory the shards are created in
+            shard_count (Optional[int]): Number of shards; defaults to the number of CPU cores
+            workers (Optional[int]): Worker processes; defaults to one per shard
+        """
+        self.persistence_directory = persistence_directory
+        self.shard_count = shard_count or os.cpu_count() or 1
+        self.workers = min(workers or self.shard_count, self.shard_count)
+
+    def embed_codebase(self, codebase_path: str, file_extensions: List[str],
+                       model_name: str = "jina-embeddings-v2-base-code", **options) -> Dict[str, Any]:
+        """
+        Sharded CodeFileEmbedding.embed_codebase into the code_embeddings collection.
+
+        Args:
+            codebase_path (str): Path to the codebase directory
+            file_extensions (List[str]): List of file extensions to include
+            model_name (str): Embedding model
+            **options: Further embed_codebase arguments, e.g. batch_size or deduplicate
+
+        Returns:
+            Dict[str, Any]: The workers' summaries added up, plus shards and seconds
+        """
+        return self._run("code_embeddings", model_name, "path", [
+            (_embed_code_shard, (model_name, os.path.abspath(codebase_path), list(file_extensions), options))
+        ])
+
+    def embed_directory(self, directory: str, model_name: str = "nomic-embed-text-v1.5", **options) -> Dict[str, Any]:
+        """
+        Sharded CodeTextEmbedding.embed_directory into the code_doc_embeddings collection. Each
+        worker tails the namespace shards of the record directory that hash to it.
+
+        Args:
+            directory (str): Output directory of CodeDocGenerator.generate_codebase_docs
+            model_name (str): Embedding model
+            **options: Further embed_directory arguments, e.g. follow or batch_size
+
+        Returns:
+            Dict[str, Any]: The workers' summaries added up, plus shards and seconds
+        """
+        return self._run("code_doc_embeddings", model_name, "namespace", [
+            (_embed_doc_records_shard, (model_name, os.path.abspath(directory), options))
+        ])
+
+    def embed_project_documentation(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str,
+                                    project_namespace: str, driver=None, **options) -> Dict[str, Any]:
+        """
+        Sharded CodeDocEmbedding.embed_project_documentation into the code_doc_embeddings
+        collection. The class names are listed once here and partitioned by namespace.
+
+        Args:
+            neo4j_uri (str): Neo4j URI, used by every worker
+            neo4j_user (str): Neo4j user
+            neo4j_password (str): Neo4j password
+            project_namespace (str): The namespace of the project
+            driver: Driver used to list the classes; defaults to one opened with the settings above
+            **options: Further embed_project_documentation arguments, e.g. page_size
+
+        Returns:
+            Dict[str, Any]: The workers' summaries added up, plus shards and seconds
+        """
+        from neo4j import GraphDatabase
+
+        neo4j_driver = driver or GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        try:
+            with neo4j_driver.session() as session:
+                class_names = [record["class_name"] for record in session.run("""
+                    MATCH (c:Class)
+                    WHERE c.FullyQualifiedName STARTS WITH $namespace
+                    RETURN c.FullyQualifiedName AS class_name
+                """, namespace=project_namespace)]
+        finally:
+            if driver is None:
+                neo4j_driver.close()
+
+        partitions = [[] for _ in range(self.shard_count)]
+        for class_name in class_names:
+            partitions[shard_of(shard_name(class_name.rpartition('.')[0]), self.shard_count)].append(class_name)
+        return self._run("code_doc_embeddings", "nomic-embed-text-v1.5", "namespace", [
+            (_embed_class_docs_shard, ("nomic-embed-text-v1.5", [neo4j_uri, neo4j_user, neo4j_password],
+                                       project_namespace, partition, options))
+            for partition in partitions
+        ])
+
+    def _run(self, collection_name: str, model_name: str, partition: str, tasks: List[tuple]) -> Dict[str, Any]:
+        '''
+        Run one task per shard; a single task is reused for every shard. The tasks receive
+        (shard_directory, shard_index, shard_count) before their own arguments.
+        '''
+        base = collection_shards_directory(self.persistence_directory, collection_name)
+        manifest = read_shard_manifest(self.persistence_directory, collection_name)
+        if manifest and manifest["shard_count"] != self.shard_count:
+            print(f"Re-sharding {collection_name} from {manifest['shard_count']} to {self.shard_count} shards; "
+                  f"the collection is embedded again.")
+            shutil.rmtree(base)
+        os.makedirs(base, exist_ok=True)
+
+        started = time.monotonic()
+        directories = [os.path.join(base, f"shard-{index:02d}") for index in range(self.shard_count)]
+        # Worker processes are spawned rather than forked: the parent may already run scheduler,
+        # tracer or Chroma threads, which a forked child would inherit in an unknown state
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = []
+            for index, directory in enumerate(directories):
+                function, arguments = tasks[index] if len(tasks) > 1 else tasks[0]
+                futures.append(pool.submit(function, directory, index, self.shard_count, *arguments))
+            summaries = [future.result() for future in futures]
+
+        return self._merge(collection_name, model_name, partition, directories, summaries, time.monotonic() - started)
+
+    def _merge(self, collection_name: str, model_name: str, partition: str, directories: List[str],
+               summaries: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+        '''Publish the shard manifest and add up the workers' summaries.'''
+        manifest = {
+            "collection": collection_name,
+            "model_name": model_name,
+            "partition": partition,
+            "shard_count": self.shard_count,
+            "shards": [{"directory": os.path.basename(directory), "records": summary.pop("shard_records")}
+                       for directory, summary in zip(directories, summaries)]
+        }
+        manifest_path = os.path.join(collection_shards_directory(self.persistence_directory, collection_name), MANIFEST_FILE)
+        # Readers see either the previous manifest or the complete new one
+        with open(manifest_path + ".tmp", 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        merged: Dict[str, Any] = {}
+        for summary in summaries:
+            self._add(merged, summary)
+        merged["persistence_path"] = self.persistence_directory
+        merged["shards"] = manifest["shards"]
+        merged["seconds"] = seconds
+        return merged
+
+    def _add(self, total: Dict[str, Any], summary: Dict[str, Any]):
+        for key, value in summary.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float, list, dict)):
+                total.setdefault(key, value)
+            elif isinstance(value, dict):
+                self._add(total.setdefault(key, {}), value)
+            else:
+                total[key] = total[key] + value if key in total else value
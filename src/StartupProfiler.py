@@ -0,0 +1,61 @@
+import builtins
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+class StartupProfiler:
+    '''
+    Measures how long each module takes to import, like `python -X importtime` but reported on
+    stdout after a mode has started. While installed it wraps `__import__` and times every
+    module imported for the first time; self time excludes the modules it imported in turn.
+    '''
+
+    def __init__(self):
+        self._original_import = None
+        self._stack: List[List[float]] = []
+        self.modules: Dict[str, Dict[str, float]] = {}
+        self._started = time.perf_counter()
+
+    def install(self):
+        self._started = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original_import:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        start = time.perf_counter()
+        self._stack.append([0.0])
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()[0]
+            if self._stack:
+                self._stack[-1][0] += elapsed
+            self.modules[name] = {"cumulative_ms": elapsed * 1000, "self_ms": (elapsed - children) * 1000}
+
+    def report(self, top: int = 15, label: Optional[str] = None) -> str:
+        """
+        Format the slowest imports.
+
+        Args:
+            top (int): Number of modules listed
+            label (Optional[str]): What was started, e.g. the mode
+
+        Returns:
+            str: Total startup time and the modules with the highest cumulative import time
+        """
+        total_ms = (time.perf_counter() - self._started) * 1000
+        lines = [f"Startup{f' ({label})' if label else ''}: {total_ms:.0f} ms, {len(self.modules)} modules imported",
+                 f"{'module':<48}{'cumulative ms':>15}{'self ms':>10}"]
+        slowest = sorted(self.modules.items(), key=lambda item: item[1]["cumulative_ms"], reverse=True)[:top]
+        for name, timing in slowest:
+            lines.append(f"{name:<48}{timing['cumulative_ms']:>15.1f}{timing['self_ms']:>10.1f}")
+        return "\n".join(lines)
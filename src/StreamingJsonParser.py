@@ -0,0 +1,147 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+
+class StreamingJsonParser:
+    '''
+    Incremental parser for a flat JSON object streamed by a model. Each top-level field is
+    decoded as soon as its value is complete, so a response that is cut off (token limit,
+    dropped connection) or goes wrong half way still yields every field finished before that
+    point. Text before the opening brace, such as a code fence, is ignored.
+    '''
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self._buffer = ""
+        self._position = 0
+        self._started = False
+        self._finished = False
+        self._key = None
+        self._value_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Consume the next piece of the response.
+
+        Args:
+            chunk (str): Newly streamed text
+
+        Returns:
+            List[Tuple[str, Any]]: Fields completed by this chunk, in order
+        """
+        self._buffer += chunk
+        completed = []
+        while self._position < len(self._buffer) and not self._finished:
+            char = self._buffer[self._position]
+            if not self._started:
+                if char == '{':
+                    self._started = True
+                self._position += 1
+                continue
+            if self._value_start is None:
+                if not self._read_key_or_end(char):
+                    break
+                continue
+            field = self._read_value(char)
+            if field:
+                completed.append(field)
+        return completed
+
+    def _read_key_or_end(self, char: str) -> bool:
+        '''Advance through "key": up to the value; returns False when more input is needed.'''
+        if char in " \t\r\n,":
+            self._position += 1
+            return True
+        if char == '}':
+            self._finished = True
+            self._position += 1
+            return True
+        if char == '"' and self._key is None:
+            end = self._string_end(self._position)
+            if end is None:
+                return False
+            self._key = json.loads(self._buffer[self._position:end + 1])
+            self._position = end + 1
+            return True
+        if char == ':' and self._key is not None:
+            self._position += 1
+            while self._position < len(self._buffer) and self._buffer[self._position] in " \t\r\n":
+                self._position += 1
+            if self._position == len(self._buffer):
+                # Keep the colon consumed; the value starts in a later chunk
+                self._value_start = -1
+                return False
+            self._value_start = self._position
+            return True
+        # Anything else is not JSON we can recover; stop and keep what was completed
+        self._finished = True
+        return False
+
+    def _read_value(self, char: str):
+        if self._value_start == -1:
+            if char in " \t\r\n":
+                self._position += 1
+                return None
+            self._value_start = self._position
+
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == '\\':
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    self._position += 1
+                    return self._complete(self._position)
+            self._position += 1
+            return None
+
+        if char == '"':
+            self._in_string = True
+        elif char in '{[':
+            self._depth += 1
+        elif char in '}]':
+            if self._depth == 0:
+                # End of the enclosing object terminates a scalar value
+                return self._complete(self._position)
+            self._depth -= 1
+            if self._depth == 0:
+                self._position += 1
+                return self._complete(self._position)
+        elif char == ',' and self._depth == 0:
+            return self._complete(self._position)
+        self._position += 1
+        return None
+
+    def _complete(self, end: int):
+        raw = self._buffer[self._value_start:end].strip()
+        key = self._key
+        self._key = None
+        self._value_start = None
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        self.fields[key] = value
+        return key, value
+
+    def _string_end(self, start: int):
+        escaped = False
+        for index in range(start + 1, len(self._buffer)):
+            char = self._buffer[index]
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                return index
+        return None
+
+    @property
+    def finished(self) -> bool:
+        '''True once the closing brace of the object has been read.'''
+        return self._finished
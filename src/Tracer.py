@@ -0,0 +1,232 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+
+class Span:
+    '''A single timed stage of a request, measured with a monotonic clock'''
+
+    # Timing and token fields reported by ollama on every generate/embed response
+    OLLAMA_FIELDS = ("prompt_eval_count", "prompt_eval_duration", "eval_count",
+                     "eval_duration", "load_duration", "total_duration")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = {}
+        self._start = time.monotonic()
+        self._end: Optional[float] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self._end if self._end is not None else time.monotonic()
+        return (end - self._start) * 1000.0
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def mark_cache(self, hit: bool):
+        self.attributes["cache_hit"] = bool(hit)
+
+    def record_llm_response(self, response: Any):
+        """
+        Copy the token counts and server-side durations of an ollama response onto the span.
+        Counts from several calls inside the same span are summed.
+
+        Args:
+            response (Any): The dict-like response returned by ollama.generate/embed
+        """
+        for field in self.OLLAMA_FIELDS:
+            try:
+                value = response.get(field)
+            except AttributeError:
+                value = None
+            if value is not None:
+                self.attributes[field] = self.attributes.get(field, 0) + value
+        self.attributes["llm_calls"] = self.attributes.get("llm_calls", 0) + 1
+
+    def finish(self):
+        if self._end is None:
+            self._end = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes
+        }
+
+
+class Tracer:
+    '''Lightweight span tracer that exports finished spans as JSON lines'''
+
+    def __init__(self, export_path: Optional[str] = None):
+        self._export_path = export_path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._listeners = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._export_path) or bool(self._listeners)
+
+    def add_listener(self, listener):
+        """Register a callable invoked with every finished span (used by the benchmark harness)."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current_span(self) -> Optional[Span]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Time a stage. Spans opened inside another span on the same thread become its children
+        and share its trace id.
+
+        Args:
+            name (str): Stage name, e.g. "search.code_db"
+            **attributes: Initial span attributes
+        """
+        parent = self.current_span()
+        trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        span = Span(name, trace_id, parent.span_id if parent else None)
+        span.attributes.update(attributes)
+
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set_attribute("error", str(e))
+            raise
+        finally:
+            span.finish()
+            stack.pop()
+            self._export(span)
+
+    def _export(self, span: Span):
+        if not self.enabled:
+            return
+        record = span.to_dict()
+        for listener in self._listeners:
+            listener(record)
+        if self._export_path:
+            line = json.dumps(record, default=str)
+            with self._lock:
+                with open(self._export_path, 'a', encoding='utf-8') as file:
+                    file.write(line + "\n")
+
+
+_default_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    '''Return the process-wide tracer. Spans are exported to $TRACE_FILE when it is set.'''
+    global _default_tracer
+    if _default_tracer is None:
+        _default_tracer = Tracer(os.getenv('TRACE_FILE'))
+    return _default_tracer
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(index)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (index - lower)
+
+
+def summarize_trace_file(trace_path: str) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregate a JSON lines trace file into latency percentiles per stage.
+
+    Args:
+        trace_path (str): Path to the trace file written by the tracer
+
+    Returns:
+        Dict[str, Dict[str, float]]: Stage name -> count, p50, p95, p99 and max in milliseconds,
+            plus the cache hit rate, model escalation rate, total eval tokens and prompt-prefix tokens saved when the stage reports them
+    """
+    durations: Dict[str, List[float]] = {}
+    cache_flags: Dict[str, List[bool]] = {}
+    eval_tokens: Dict[str, int] = {}
+    prefill_saved: Dict[str, int] = {}
+    escalations: Dict[str, List[bool]] = {}
+
+    with open(trace_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            name = record["name"]
+            attributes = record.get("attributes", {})
+            durations.setdefault(name, []).append(record["duration_ms"])
+            if "cache_hit" in attributes:
+                cache_flags.setdefault(name, []).append(attributes["cache_hit"])
+            if "escalated" in attributes:
+                escalations.setdefault(name, []).append(attributes["escalated"])
+            if "eval_count" in attributes:
+                eval_tokens[name] = eval_tokens.get(name, 0) + attributes["eval_count"]
+            if "prefill_tokens_saved" in attributes:
+                prefill_saved[name] = prefill_saved.get(name, 0) + attributes["prefill_tokens_saved"]
+
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        stage = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1]
+        }
+        if name in cache_flags:
+            flags = cache_flags[name]
+            stage["cache_hit_rate"] = sum(flags) / len(flags)
+        if name in escalations:
+            flags = escalations[name]
+            stage["escalation_rate"] = sum(flags) / len(flags)
+        if name in eval_tokens:
+            stage["eval_tokens"] = eval_tokens[name]
+        if name in prefill_saved:
+            stage["prefill_tokens_saved"] = prefill_saved[name]
+        summary[name] = stage
+    return summary
+
+
+def format_trace_summary(summary: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'stage':<32}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'cache hit':>11}"]
+    for name in sorted(summary):
+        stage = summary[name]
+        hit_rate = f"{stage['cache_hit_rate']:.1%}" if "cache_hit_rate" in stage else "-"
+        lines.append(f"{name:<32}{stage['count']:>8}{stage['p50']:>12.1f}{stage['p95']:>12.1f}"
+                     f"{stage['p99']:>12.1f}{hit_rate:>11}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python Tracer.py <trace_file.jsonl>")
+        sys.exit(1)
+    print(format_trace_summary(summarize_trace_file(sys.argv[1])))
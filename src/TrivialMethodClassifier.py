@@ -0,0 +1,213 @@
+import re
+from typing import List, Dict, Optional, Tuple
+
+from CodeEntity import MethodEntity
+
+# Statement shapes that carry no logic worth a model call
+_ASSIGNMENT = re.compile(r"^(?P<target>(?:this\.)?[\w.]+)\s*=\s*(?P<value>[^=;]+);$")
+# A field of the instance itself: this.X or a bare name, not a member of some other object
+_OWN_FIELD = re.compile(r"^(?:this\.)?(?P<name>\w+)$")
+# ": this(...)" or ": base(...)" between the parameter list and the body
+_CONSTRUCTOR_INITIALIZER = re.compile(r"\)\s*:\s*(?:this|base)\s*\(")
+_RETURN_MEMBER = re.compile(r"^return\s+(?P<this>this\.)?(?P<member>[\w.]+);$")
+_LITERAL = re.compile(r"^(?:-?\d[\d_]*(?:\.\d+)?[fFdDmMlLuU]*|\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)+'|true|false|null|default)$")
+_CALL = re.compile(r"^(?:return\s+)?(?:await\s+)?(?:this\.|base\.)?[\w.<>]+\((?P<args>[^;]*)\);$")
+_THROW_NOT_IMPLEMENTED = re.compile(r"^throw\s+new\s+(?:System\.)?Not(?:Implemented|Supported)Exception\([^;]*\);$")
+
+
+class TrivialMethodClassifier:
+    '''
+    Recognises methods whose documentation follows from the declaration alone: constructors that
+    only assign parameters or literals to fields, getters that return a field, setters that store
+    their parameter, one-call delegators, empty bodies and abstract methods. Those get deterministic template docs and pseudocode instead of model output.
+    '''
+
+    KINDS = ("abstract", "empty", "constructor", "getter", "setter", "delegator", "not_implemented")
+
+    def __init__(self, max_body_chars: int = 240, max_constructor_statements: int = 4):
+        """
+        Args:
+            max_body_chars (int): Bodies longer than this are never treated as trivial
+            max_constructor_statements (int): Most field assignments a trivial constructor may contain
+        """
+        self.max_body_chars = max_body_chars
+        self.max_constructor_statements = max_constructor_statements
+
+    def classify(self, method: MethodEntity) -> Optional[str]:
+        """
+        Decide whether a method can be documented from a template.
+
+        Args:
+            method (MethodEntity): The method node
+
+        Returns:
+            Optional[str]: One of KINDS, or None when the method needs the model
+        """
+        if method.is_abstract:
+            return "abstract"
+        body = self._body(method.code_snippet)
+        if body is None:
+            # No block and no expression body: interface, extern or partial declaration
+            return "abstract" if method.code_snippet.strip().endswith(";") or not method.code_snippet.strip() else None
+        if len(body) > self.max_body_chars:
+            return None
+
+        statements = self._statements(body)
+        if statements is None:
+            return None
+        if method.is_construct and _CONSTRUCTOR_INITIALIZER.search(method.code_snippet[:method.code_snippet.find('{')]):
+            # Chains to another constructor with its own arguments, which the template cannot describe
+            return None
+        if not statements:
+            return "constructor" if method.is_construct else "empty"
+        parameter_names = [name for _, name in self._parameters(method.raw_declaration)]
+        if method.is_construct:
+            # Only own fields set straight from a parameter or a literal; anything computed needs the model
+            if len(statements) <= self.max_constructor_statements and all(
+                    self._sets_own_field(s, parameter_names)
+                    and (self._assigned_value(s) in parameter_names or _LITERAL.match(self._assigned_value(s)))
+                    for s in statements):
+                return "constructor"
+            return None
+        if len(statements) != 1:
+            return None
+
+        statement = statements[0]
+        if _THROW_NOT_IMPLEMENTED.match(statement):
+            return "not_implemented"
+        returns_value = not self._is_void(method.return_type)
+        returned = _RETURN_MEMBER.match(statement)
+        # Returning a parameter (or one of its members) or a constant is not reading state
+        if returns_value and returned and not _LITERAL.match(returned.group("member")) and (
+                returned.group("this") or returned.group("member").split(".")[0] not in parameter_names):
+            return "getter"
+        # A setter stores its single parameter, or the implicit value of a property setter, in an own field
+        if not returns_value and len(parameter_names) <= 1 and self._sets_own_field(statement, parameter_names) \
+                and self._assigned_value(statement) in set(parameter_names) | {"value"}:
+            return "setter"
+        call = _CALL.match(statement)
+        if call and "=>" not in call.group("args") and "(" not in call.group("args"):
+            return "delegator"
+        return None
+
+    def render(self, method: MethodEntity, kind: str) -> Dict[str, str]:
+        """
+        Build the documentation, commented code and pseudocode of a trivial method.
+
+        Args:
+            method (MethodEntity): The method node
+            kind (str): Result of classify
+
+        Returns:
+            Dict[str, str]: documentation, code_with_comments and pseudocode
+        """
+        class_name = method.fully_qualified_name.split('(')[0].rsplit('.', 2)[-2] \
+            if method.fully_qualified_name.count('.') else method.name
+        parameters = self._parameters(method.raw_declaration)
+        returns_value = not self._is_void(method.return_type)
+        body = self._body(method.code_snippet) or ""
+        statements = self._statements(body) or []
+
+        summary, steps = {
+            "abstract": (f"Declares {method.name}; implementations provide the behaviour.",
+                         ["No implementation here; derived types implement it."]),
+            "empty": (f"{method.name} intentionally does nothing.",
+                      ["Do nothing."]),
+            "constructor": (f"Initializes a new instance of the <see cref=\"{class_name}\"/> class.",
+                            [f"Set {self._assigned_member(s)} from the given value." for s in statements]
+                            or ["Create the instance with default values."]),
+            "getter": (f"Gets the value of {self._returned_member(statements)}.",
+                       [f"Return {self._returned_member(statements)}."]),
+            "setter": (f"Sets {self._assigned_member(statements[0]) if statements else method.name}.",
+                       [f"Store the given value in {self._assigned_member(statements[0]) if statements else method.name}."]),
+            "delegator": (f"Forwards the call to <c>{self._called_member(statements)}</c>.",
+                          [f"Call {self._called_member(statements)} with the given arguments"
+                           + (" and return its result." if returns_value else ".")]),
+            "not_implemented": (f"{method.name} is not implemented.",
+                                ["Throw an exception stating that the operation is not implemented."]),
+        }[kind]
+
+        lines = ["/// <summary>", f"/// {summary}", "/// </summary>"]
+        lines += [f"/// <param name=\"{name}\">The {self._words(name)}.</param>" for _, name in parameters]
+        if returns_value and kind != "constructor":
+            lines.append(f"/// <returns>The {self._words(method.return_type)} result.</returns>")
+        documentation = "\n".join(lines)
+
+        inputs = ", ".join(f"{name} ({param_type})" for param_type, name in parameters) or "none"
+        outputs = method.return_type if returns_value and kind != "constructor" else "none"
+        overview = re.sub(r"</?c>", "", re.sub(r"<see cref=\"([^\"]+)\"/>", r"\1", summary))
+        pseudocode = "\n".join(
+            [f"Overview: {overview}", f"Inputs: {inputs}", f"Outputs: {outputs}", "Steps:"]
+            + [f"  {number}. {step}" for number, step in enumerate(steps, 1)]
+        )
+
+        return {
+            "documentation": documentation,
+            "code_with_comments": f"{documentation}\n{method.code_snippet}",
+            "pseudocode": pseudocode
+        }
+
+    def _body(self, code_snippet: str) -> Optional[str]:
+        start = code_snippet.find('{')
+        arrow = code_snippet.find('=>')
+        if arrow != -1 and (start == -1 or arrow < start):
+            # Expression-bodied member: "=> expression;" is one statement
+            expression = code_snippet[arrow + 2:].strip()
+            return expression if expression.endswith(";") else expression + ";"
+        end = code_snippet.rfind('}')
+        if start == -1 or end < start:
+            return None
+        return code_snippet[start + 1:end]
+
+    def _statements(self, body: str) -> Optional[List[str]]:
+        '''Split a body into normalised statements, or None when it contains nested blocks.'''
+        body = re.sub(r"//[^\n]*|/\*.*?\*/", "", body, flags=re.S)
+        if '{' in body or '}' in body:
+            # Nested blocks (if/for/using/lambdas) mean real logic
+            return None
+        return [" ".join(statement.split()) + ";" for statement in body.split(";") if statement.strip()]
+
+    def _parameters(self, raw_declaration: str) -> List[Tuple[str, str]]:
+        start, end = raw_declaration.find('('), raw_declaration.rfind(')')
+        if start == -1 or end <= start + 1:
+            return []
+        parameters, depth, current = [], 0, ""
+        for char in raw_declaration[start + 1:end] + ",":
+            if char in "<[(":
+                depth += 1
+            elif char in ">])":
+                depth -= 1
+            if char == "," and depth == 0:
+                tokens = current.split("=")[0].split()
+                if len(tokens) >= 2:
+                    parameters.append((" ".join(tokens[:-1]), tokens[-1]))
+                current = ""
+            else:
+                current += char
+        return parameters
+
+    def _is_void(self, return_type: str) -> bool:
+        return return_type.strip() in ("", "void", "Task", "System.Void")
+
+    def _assigned_value(self, statement: str) -> str:
+        assignment = _ASSIGNMENT.match(statement)
+        return assignment.group("value").strip() if assignment else ""
+
+    def _sets_own_field(self, statement: str, parameter_names: List[str]) -> bool:
+        assignment = _ASSIGNMENT.match(statement)
+        field = _OWN_FIELD.match(assignment.group("target")) if assignment else None
+        # A bare parameter name on the left only overwrites the argument
+        return bool(field) and (assignment.group("target").startswith("this.") or field.group("name") not in parameter_names)
+
+    def _assigned_member(self, statement: str) -> str:
+        return statement.split("=")[0].strip().removeprefix("this.")
+
+    def _returned_member(self, statements: List[str]) -> str:
+        return statements[0].removeprefix("return").strip(" ;").removeprefix("this.") if statements else "the value"
+
+    def _called_member(self, statements: List[str]) -> str:
+        call = statements[0].removeprefix("return ").removeprefix("await ").strip() if statements else ""
+        return call.split("(")[0].removeprefix("this.")
+
+    def _words(self, name: str) -> str:
+        return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", " ", name.strip("_")).lower()
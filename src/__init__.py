@@ -1,6 +1,6 @@
-import sys
-from pathlib import Path
-
-# Add the src directory to the Python path
-src_path = Path(__file__).parent
+import sys
+from pathlib import Path
+
+# Add the src directory to the Python path
+src_path = Path(__file__).parent
 sys.path.append(str(src_path))
\ No newline at end of file
@@ -1,83 +1,109 @@
-import os
-from typing import List, Dict, Any
-
-import ollama
-
-
-class AnswerGenerationAgent:
-    
-    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0"):
-        self.model_name = model_name
-        self.prompt_template = self._load_prompt_template()
-
-    def _load_prompt_template(self) -> str:
-        prompt_path = os.path.join(os.path.dirname(__file__), '..', 'prompts', 'answer_generation_prompt.txt')
-        with open(prompt_path, 'r') as file:
-            return file.read()
-
-    def generate_answer(self, question: str, context: str) -> str:
-        prompt = self.prompt_template.format(question=question, context=context)
-        response = ollama.generate(model=self.model_name, prompt=prompt)
-        return response['response']
-
-class AnswerGenerationService:
-    def __init__(self):
-        self.agent = AnswerGenerationAgent()
-
-    def generate_answer(self, question: str, search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """
-        Generate an answer based on the question and search results.
-
-        Args:
-            question (str): The user's question
-            search_results (List[Dict[str, Any]]): Reranked search results
-
-        Returns:
-            Dict[str, Any]: A dictionary containing the generated answer and metadata
-        """
-        context = self._format_context(search_results)
-        answer = self.agent.generate_answer(question, context)
-
-        return {
-            "question": question,
-            "answer": answer,
-            "sources": self._extract_sources(search_results)
-        }
-
-    def _format_context(self, search_results: List[Dict[str, Any]]) -> str:
-        """
-        Format the search results into a context string for the AI model.
-
-        Args:
-            search_results (List[Dict[str, Any]]): Reranked search results
-
-        Returns:
-            str: Formatted context string
-        """
-        context_parts = []
-        for result in search_results[:5]:  # Use top 5 results
-            content = result.get('content', result.get('text', 'No content available'))
-            source = result.get('source_db', 'Unknown source')
-            context_parts.append(f"Source: {source}\nContent: {content}\n")
-        
-        return "\n".join(context_parts)
-
-    def _extract_sources(self, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """
-        Extract source information from search results.
-
-        Args:
-            search_results (List[Dict[str, Any]]): Reranked search results
-
-        Returns:
-            List[Dict[str, Any]]: List of source information
-        """
-        sources = []
-        for result in search_results[:5]:  # Use top 5 results
-            source = {
-                "db": result.get('source_db', 'Unknown'),
-                "title": result.get('title', 'Untitled'),
-                "relevance_score": result.get('relevance_score', 0)
-            }
-            sources.append(source)
-        return sources
+from typing import List, Dict, Any, Tuple
+
+import ollama
+
+from ContextPacker import ContextPacker, estimate_tokens
+from InferenceScheduler import get_inference_scheduler
+from ModelCascade import ModelCascade
+from PromptTemplates import load_prompt_template
+from Tracer import get_tracer
+
+
+class AnswerGenerationAgent:
+    
+    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0", num_ctx: int = 10000, answer_tokens: int = 1024):
+        """
+        Args:
+            model_name (str): Ollama model used for answers when the model policy lists none
+            num_ctx (int): Context length the model is run with
+            answer_tokens (int): Part of the context length kept free for the answer
+        """
+        self.model_name = model_name
+        self.num_ctx = num_ctx
+        self.answer_tokens = answer_tokens
+        self.cascade = ModelCascade("answer", model_name)
+
+    @property
+    def prompt_template(self) -> str:
+        return load_prompt_template('answer_generation_prompt.txt')
+
+    def context_budget(self, question: str) -> int:
+        '''Tokens left for the context once the prompt, the question and the answer are accounted for.'''
+        fixed = estimate_tokens(self.prompt_template.format(question=question, context=""))
+        return max(0, self.num_ctx - self.answer_tokens - fixed)
+
+    def generate_answer(self, question: str, context: str) -> str:
+        prompt = self.prompt_template.format(question=question, context=context)
+        # An empty answer or a failed call is escalated to the next model of the "answer" policy
+        answer, _ = self.cascade.run(lambda model: self._generate_with(model, prompt), self._is_answer)
+        if answer is None:
+            raise RuntimeError(f"No answer from any of the models {self.cascade.models}")
+        return answer
+
+    def _generate_with(self, model_name: str, prompt: str) -> str:
+        with get_tracer().span("llm.answer", model=model_name) as span:
+            with get_inference_scheduler().slot("interactive"):
+                response = ollama.generate(model=model_name, prompt=prompt, options={"num_ctx": self.num_ctx})
+            span.record_llm_response(response)
+        return response['response']
+
+    def _is_answer(self, answer: str) -> bool:
+        return bool(answer.strip())
+
+class AnswerGenerationService:
+    def __init__(self):
+        self.agent = AnswerGenerationAgent()
+        self.packer = ContextPacker()
+
+    def generate_answer(self, question: str, search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Generate an answer based on the question and search results.
+
+        Args:
+            question (str): The user's question
+            search_results (List[Dict[str, Any]]): Reranked search results
+
+        Returns:
+            Dict[str, Any]: A dictionary containing the generated answer and metadata
+        """
+        context, used_results = self._format_context(question, search_results)
+        answer = self.agent.generate_answer(question, context)
+
+        return {
+            "question": question,
+            "answer": answer,
+            "sources": self._extract_sources(used_results)
+        }
+
+    def _format_context(self, question: str, search_results: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Pack the search results into a context string that fits the model's context length.
+
+        Args:
+            question (str): The user's question
+            search_results (List[Dict[str, Any]]): Reranked search results
+
+        Returns:
+            Tuple[str, List[Dict[str, Any]]]: Formatted context string and the results it contains
+        """
+        return self.packer.pack(question, search_results, self.agent.context_budget(question))
+
+    def _extract_sources(self, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Extract source information from search results.
+
+        Args:
+            search_results (List[Dict[str, Any]]): Reranked search results
+
+        Returns:
+            List[Dict[str, Any]]: List of source information
+        """
+        sources = []
+        for result in search_results:
+            source = {
+                "db": result.get('source_db', 'Unknown'),
+                "title": result.get('title', 'Untitled'),
+                "relevance_score": result.get('relevance_score', 0)
+            }
+            sources.append(source)
+        return sources
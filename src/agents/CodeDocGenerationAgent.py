@@ -1,32 +1,108 @@
-import os
-import ollama
-
-class CodeDocGenerationAgent:
-    def __init__(self):
-        self._model_name = "codeqwen:7b-chat-v1.5-q8_0"
-        self._model_options = {
-            "temperature": 0.1,
-            "num_ctx": 10000,
-            "stop": ["<|im_start|>", "<|im_end|>"]
-        }
-        self._prompt_template = self._load_prompt_template()
-        
-    def _load_prompt_template(self):
-        prompt_path = os.path.join(os.path.dirname(__file__), '..', 'prompts', 'code_explanation_prompt.txt')
-        with open(prompt_path, 'r') as file:
-            return file.read()
-        
-    def generate_docs(self, code_context, code_snippet, language_name="C#", doc_formatting_name="XML"):
-        prompt = self._prompt_template.format(
-            language_name=language_name,
-            doc_formatting_name=doc_formatting_name,
-            code_context=code_context,
-            code_snippet=code_snippet
-        )
-        
-        # Initialize the model (this step might be optimized to avoid repeated initialization)
-        ollama.generate(model=self._model_name, prompt=prompt, options=self._model_options, keep_alive=0)
-        
-        # Generate the actual response
-        response = ollama.generate(model=self._model_name, prompt=prompt, options=self._model_options, keep_alive=0)
-        return response['response']  # Assuming the response is in the correct format
\ No newline at end of file
+import threading
+from typing import Dict
+
+from ModelCascade import ModelCascade
+from PromptPrefixSession import PromptPrefixSession, split_prompt_template
+from PromptTemplates import load_prompt_template
+from StreamingJsonParser import StreamingJsonParser
+from Tracer import get_tracer
+
+class CodeDocGenerationAgent:
+    # Both documentation prompts end with the per-method section that starts here
+    CONTEXT_MARKER = "The context of the code is as follows:"
+    COMBINED_FIELDS = ("documentation", "code_with_comments", "pseudocode")
+    # Ollama structured output schema for generate_combined; properties are in prompt order
+    COMBINED_SCHEMA = {
+        "type": "object",
+        "properties": {field: {"type": "string"} for field in COMBINED_FIELDS},
+        "required": list(COMBINED_FIELDS)
+    }
+
+    def __init__(self):
+        self._model_name = "codeqwen:7b-chat-v1.5-q8_0"
+        self._model_options = {
+            "temperature": 0.1,
+            "num_ctx": 10000,
+            "stop": ["<|im_start|>", "<|im_end|>"]
+        }
+        # One session per (prompt, language, doc style): the instructions before the code context are static
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self._cascade = ModelCascade("docs", self._model_name)
+        
+    @property
+    def _prompt_template(self) -> str:
+        return load_prompt_template('code_explanation_prompt.txt')
+
+    @property
+    def _combined_prompt_template(self) -> str:
+        return load_prompt_template('combined_documentation_prompt.txt')
+        
+    def _session(self, template, language_name, doc_formatting_name, model_name=None):
+        model_name = model_name or self._model_name
+        key = (template, language_name, doc_formatting_name, model_name)
+        with self._sessions_lock:
+            if key not in self._sessions:
+                prefix, tail = split_prompt_template(template, self.CONTEXT_MARKER)
+                prefix = prefix.format(language_name=language_name, doc_formatting_name=doc_formatting_name)
+                self._sessions[key] = (PromptPrefixSession(model_name, prefix, self._model_options, priority="batch"), tail)
+            return self._sessions[key]
+
+    def generate_docs(self, code_context, code_snippet, language_name="C#", doc_formatting_name="XML"):
+        session, tail_template = self._session(self._prompt_template, language_name, doc_formatting_name)
+        tail = tail_template.format(code_context=code_context, code_snippet=code_snippet)
+
+        # The model stays loaded between calls so the cached instruction prefix is reused
+        with get_tracer().span("llm.docs", model=self._model_name) as span:
+            response = session.generate(tail)
+            span.record_llm_response(response)
+            span.set_attribute("prefix_tokens", session.prefix_tokens)
+            span.set_attribute("prefill_tokens_saved", session.record(response, tail))
+        return response['response']  # Assuming the response is in the correct format
+
+    def generate_combined(self, code_context, code_snippet, language_name="C#", doc_formatting_name="XML") -> Dict[str, str]:
+        """
+        Generate documentation, commented code and pseudocode with one schema-constrained call.
+        The response is parsed while it streams, so fields completed before a truncated or
+        malformed tail are still returned. The call goes through the "docs" model cascade: an
+        answer with missing fields or a too-short documentation is escalated to the next model.
+
+        Args:
+            code_context (str): Where the code lives, e.g. its class
+            code_snippet (str): The code to document
+            language_name (str): Language of the snippet
+            doc_formatting_name (str): Documentation comment style
+
+        Returns:
+            Dict[str, str]: The non-empty fields among COMBINED_FIELDS; missing fields need a fallback
+        """
+        outputs, _ = self._cascade.run(
+            lambda model: self._generate_combined_with(model, code_context, code_snippet, language_name, doc_formatting_name),
+            self._is_complete
+        )
+        return outputs or {}
+
+    def _is_complete(self, outputs: Dict[str, str]) -> bool:
+        return (all(field in outputs for field in self.COMBINED_FIELDS)
+                and len(outputs["documentation"].strip()) >= self._cascade.option("min_documentation_chars", 1))
+
+    def _generate_combined_with(self, model_name, code_context, code_snippet, language_name, doc_formatting_name) -> Dict[str, str]:
+        session, tail_template = self._session(self._combined_prompt_template, language_name, doc_formatting_name, model_name)
+        tail = tail_template.format(code_context=code_context, code_snippet=code_snippet)
+
+        parser = StreamingJsonParser()
+        with get_tracer().span("llm.docs_combined", model=model_name) as span:
+            try:
+                for chunk in session.generate(tail, format=self.COMBINED_SCHEMA, stream=True):
+                    parser.feed(chunk['response'])
+                    if chunk.get('done'):
+                        span.record_llm_response(chunk)
+                        span.set_attribute("prefix_tokens", session.prefix_tokens)
+                        span.set_attribute("prefill_tokens_saved", session.record(chunk, tail))
+            except Exception as e:
+                # Keep whatever was completed before the stream broke
+                span.set_attribute("error", str(e))
+            span.set_attribute("fields", len(parser.fields))
+
+        return {field: parser.fields[field] for field in self.COMBINED_FIELDS
+                if isinstance(parser.fields.get(field), str) and parser.fields[field].strip()}
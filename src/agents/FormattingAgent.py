@@ -1,9 +1,46 @@
-class FormattingAgent:
-    def __init__(self):
-        def __init__(self):
-        self.model_name = "model_name"
-        self.system_prompt = system_prompt
-        self.model_cfg = "model_cfg"
-    
-    def formatting(self, data):
-        pass
\ No newline at end of file
+import json
+from typing import Dict
+import ollama
+
+from InferenceScheduler import get_inference_scheduler
+from PromptTemplates import load_prompt_template
+from Tracer import get_tracer
+
+class FormattingAgent:
+    '''Recovers the documentation fields from a model response that is not valid JSON'''
+
+    def __init__(self):
+        self._model_name = "codeqwen:7b-chat-v1.5-q8_0"
+        self._model_options = {
+            "temperature": 0.0,
+            "num_ctx": 10000,
+            "stop": ["<|im_start|>", "<|im_end|>"]
+        }
+
+    @property
+    def _prompt_template(self) -> str:
+        return load_prompt_template('formatting_prompt.txt')
+
+    def format_code(self, raw_response: str) -> Dict[str, str]:
+        """
+        Ask the model to extract the documentation and commented code from a malformed response.
+
+        Args:
+            raw_response (str): The unparseable output of the documentation prompt
+
+        Returns:
+            Dict[str, str]: The recovered fields; empty when nothing could be recovered
+        """
+        # The template contains literal JSON braces, so it is filled with replace rather than format
+        prompt = self._prompt_template.replace("{inputting}", raw_response)
+
+        with get_tracer().span("llm.formatting", model=self._model_name) as span:
+            with get_inference_scheduler().slot("batch"):
+                response = ollama.generate(model=self._model_name, prompt=prompt, options=self._model_options, format="json")
+            span.record_llm_response(response)
+
+        try:
+            result = json.loads(response['response'])
+        except json.JSONDecodeError:
+            return {}
+        return result if isinstance(result, dict) else {}
@@ -1,87 +1,279 @@
-import os
-from typing import Dict, Any
-from neo4j import GraphDatabase
-import ollama
-
-
-class Neo4jQueryAgent:
-    
-    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str):
-        self._neo4j_driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
-        self._model_name = "codeqwen:7b-chat-v1.5-q8_0"
-        self._prompt_template = self._load_prompt_template()
-        self._schema = self._load_schema()
-
-    def __del__(self):
-        if self._neo4j_driver:
-            self._neo4j_driver.close()
-
-    def _load_prompt_template(self) -> str:
-        prompt_path = os.path.join(os.path.dirname(__file__), '..', 'prompts', 'cypher_generation_prompt.txt')
-        with open(prompt_path, 'r') as file:
-            return file.read()
-
-    def _load_schema(self) -> Dict[str, str]:
-        with self._neo4j_driver.session() as session:
-            # Get node labels and their properties
-            node_schema_query = """
-            CALL db.schema.nodeTypeProperties()
-            YIELD nodeLabels, propertyName, propertyTypes
-            RETURN nodeLabels, collect(propertyName + ': ' + propertyTypes[0]) as properties
-            """
-            node_result = session.run(node_schema_query)
-            node_schema = {}
-            for record in node_result:
-                label = record["nodeLabels"][0]  # Assuming single label per node
-                properties = record["properties"]
-                node_schema[label] = properties
-
-            # Get relationship types
-            rel_schema_query = """
-            CALL db.schema.relTypeProperties()
-            YIELD relType
-            RETURN collect(distinct relType) as relTypes
-            """
-            rel_result = session.run(rel_schema_query)
-            rel_types = rel_result.single()["relTypes"]
-
-        # Format node schema
-        property_schema = "\n".join([f"{label} {{{', '.join(props)}}}" for label, props in node_schema.items()])
-
-        # Format relationship schema
-        relationship_schema = ", ".join([f"()-[:{rel_type}]->()" for rel_type in rel_types])
-
-        return {
-            "property_schema": property_schema,
-            "relationship_schema": relationship_schema
-        }
-
-    def generate_cypher_query(self, user_question: str) -> str:
-        prompt = self._prompt_template.format(
-            property_schema=self._schema["property_schema"],
-            relationship_schema=self._schema["relationship_schema"],
-            graph_question=user_question
-        )
-
-        response = ollama.generate(model=self._model_name, prompt=prompt)
-        return response['response'].strip()
-
-    def execute_query(self, cypher_query: str) -> List[Dict[str, Any]]:
-        with self._neo4j_driver.session() as session:
-            result = session.run(cypher_query)
-            return [record.data() for record in result]
-
-    def query(self, user_question: str) -> Dict[str, Any]:
-        try:
-            cypher_query = self.generate_cypher_query(user_question)
-            results = self.execute_query(cypher_query)
-            return {
-                "query": cypher_query,
-                "results": results,
-                "success": True
-            }
-        except Exception as e:
-            return {
-                "error": str(e),
-                "success": False
-            }
+import json
+import re
+from typing import List, Dict, Any, Optional, Tuple
+from neo4j import GraphDatabase, unit_of_work
+import ollama
+
+from GraphSchemaCache import GraphSchemaCache
+from InferenceScheduler import get_inference_scheduler
+from ModelCascade import ModelCascade
+from PromptTemplates import load_prompt_template
+from Tracer import get_tracer
+
+# Literals are blanked before the guards inspect a query, so 'Set' in a string is not a SET clause.
+# The blanks keep the literal's length, so offsets found in the blanked query apply to the original.
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+_WRITE_CLAUSE = re.compile(r"\b(?:CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|LOAD\s+CSV|FOREACH)\b", re.IGNORECASE)
+# Relationship patterns with a variable length, e.g. -[*]-, -[:INVOKES*1..3]->, <-[*2..]-; the
+# dashes around the brackets tell them apart from list expressions such as [x IN xs | x * 10]
+_VARIABLE_LENGTH = re.compile(r"-\s*\[[^\]]*\*\s*(\d*)\s*(\.\.)?\s*(\d*)\s*\]\s*-")
+# Neo4j 5 quantifiers: +, * or {n}, {n,m}, {n,}, {,m} after a relationship, e.g. -[:INVOKES]->+,
+# or after a parenthesised path pattern, e.g. ((a)-[:INVOKES]->(b)){1,3}
+_QUANTIFIER = r"(\+|\*|\{\s*(\d*)\s*(,)?\s*(\d*)\s*\})"
+_QUANTIFIED_RELATIONSHIP = re.compile(r"\]\s*-\s*>?\s*" + _QUANTIFIER)
+_QUANTIFIED_GROUP = re.compile(r"\)\s*" + _QUANTIFIER)
+# A relationship inside a group: a node pattern followed by the start of a relationship
+_GROUP_RELATIONSHIP = re.compile(r"\)\s*<?-")
+_UNION = re.compile(r"\bUNION\b", re.IGNORECASE)
+# A parameter limit is bounded by whoever supplies the parameter
+_TRAILING_LIMIT = re.compile(r"\bLIMIT\s+(\d+|\$\w+)\s*$", re.IGNORECASE)
+
+
+class CypherGuardError(Exception):
+    '''A generated query was rejected before it reached the database'''
+
+
+class Neo4jQueryAgent:
+    
+    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str, driver=None,
+                 max_rows: int = 200, max_result_bytes: int = 1_000_000, timeout_seconds: float = 10.0,
+                 max_estimated_rows: float = 1_000_000, max_path_length: int = 6,
+                 schema_cache_path: Optional[str] = None):
+        """
+        Args:
+            neo4j_uri (str): URI for the Neo4j database
+            neo4j_user (str): Username for Neo4j authentication
+            neo4j_password (str): Password for Neo4j authentication
+            driver: Optional already-open driver, used instead of connecting to neo4j_uri
+            max_rows (int): Rows returned per query; a LIMIT is injected or lowered to enforce it
+            max_result_bytes (int): Rows stop being read once their JSON size passes this
+            timeout_seconds (float): Server-side transaction timeout
+            max_estimated_rows (float): Queries whose EXPLAIN plan estimates more rows in any operator are rejected
+            max_path_length (int): Longest variable-length relationship pattern allowed
+            schema_cache_path (Optional[str]): Graph schema snapshot file, see GraphSchemaCache
+        """
+        self._neo4j_driver = driver or GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self._model_name = "codeqwen:7b-chat-v1.5-q8_0"
+        self._max_rows = max_rows
+        self._max_result_bytes = max_result_bytes
+        self._timeout_seconds = timeout_seconds
+        self._max_estimated_rows = max_estimated_rows
+        self._max_path_length = max_path_length
+        self._last_preflight: Optional[Tuple[str, Tuple[str, float]]] = None
+        # The schema is loaded on the first generated query, not at construction
+        self._schema_cache = GraphSchemaCache(self._neo4j_driver, schema_cache_path)
+        self._cascade = ModelCascade("cypher_generation", self._model_name)
+
+    def __del__(self):
+        if self._neo4j_driver:
+            self._neo4j_driver.close()
+
+    @property
+    def _prompt_template(self) -> str:
+        return load_prompt_template('cypher_generation_prompt.txt')
+
+    @property
+    def schema(self) -> Dict[str, str]:
+        '''The formatted graph schema, read from the on-disk snapshot unless the graph has changed.'''
+        return self._schema_cache.get()
+
+    def generate_cypher_query(self, user_question: str) -> str:
+        schema = self.schema
+        prompt = self._prompt_template.format(
+            property_schema=schema["property_schema"],
+            relationship_schema=schema["relationship_schema"],
+            graph_question=user_question
+        )
+
+        cypher_query, _ = self._cascade.run(lambda model: self._generate_with(model, prompt), self._is_valid_cypher)
+        return cypher_query
+
+    def _generate_with(self, model_name: str, prompt: str) -> str:
+        with get_tracer().span("llm.cypher_generation", model=model_name) as span:
+            with get_inference_scheduler().slot("interactive"):
+                response = ollama.generate(model=model_name, prompt=prompt)
+            span.record_llm_response(response)
+        # Small models like to wrap the query in a fenced block
+        query = re.sub(r"^```(?:cypher)?\s*|\s*```$", "", response['response'].strip(), flags=re.IGNORECASE)
+        return query.strip()
+
+    def _is_valid_cypher(self, cypher_query: str) -> bool:
+        '''A query is valid when it passes the pre-flight checks, including planning by the database.'''
+        if not cypher_query:
+            return False
+        try:
+            self._preflight(cypher_query)
+            return True
+        except Exception:
+            return False
+
+    def _preflight(self, cypher_query: str) -> Tuple[str, float]:
+        """
+        Check a generated query before running it and bound its result size.
+
+        Args:
+            cypher_query (str): Query produced by the model
+
+        Returns:
+            Tuple[str, float]: The query with a LIMIT of at most max_rows + 1, and the largest
+                row estimate in its EXPLAIN plan
+
+        Raises:
+            CypherGuardError: The query writes, has an unbounded or too long variable-length
+                or quantified pattern, or is estimated to touch too many rows
+        """
+        last = self._last_preflight
+        if last and last[0] == cypher_query:
+            return last[1]
+
+        query, inspected = self._strip_comments(cypher_query)
+        if _WRITE_CLAUSE.search(inspected):
+            raise CypherGuardError("Generated query writes to the graph")
+        for lower, dots, upper in _VARIABLE_LENGTH.findall(inspected):
+            bound = upper if dots else lower
+            if not bound:
+                raise CypherGuardError("Generated query has an unbounded variable-length pattern")
+            if int(bound) > self._max_path_length:
+                raise CypherGuardError(f"Generated query follows paths longer than {self._max_path_length} hops")
+        for hops, bound in self._quantified_patterns(inspected):
+            if bound is None:
+                raise CypherGuardError("Generated query has a quantified pattern without an upper bound")
+            if hops * bound > self._max_path_length:
+                raise CypherGuardError(f"Generated query follows paths longer than {self._max_path_length} hops")
+
+        # One row more than the cap tells execution that the result was cut off
+        row_limit = self._max_rows + 1
+        limit = _TRAILING_LIMIT.search(inspected)
+        if _UNION.search(inspected):
+            # A trailing LIMIT would only bound the last branch, so the union is limited as a whole
+            query = f"CALL {{\n{query}\n}}\nRETURN *\nLIMIT {row_limit}"
+        elif limit is None:
+            query = f"{query}\nLIMIT {row_limit}"
+        elif limit.group(1).isdigit() and int(limit.group(1)) > row_limit:
+            query = f"{query[:limit.start()]}LIMIT {row_limit}"
+
+        with self._neo4j_driver.session() as session:
+            summary = session.run(f"EXPLAIN {query}").consume()
+        estimated_rows = self._max_estimated_rows_in(getattr(summary, 'plan', None))
+        if estimated_rows > self._max_estimated_rows:
+            raise CypherGuardError(f"Generated query is estimated to touch {estimated_rows:.0f} rows")
+
+        self._last_preflight = (cypher_query, (query, estimated_rows))
+        return query, estimated_rows
+
+    def _quantified_patterns(self, inspected: str) -> List[Tuple[int, Optional[int]]]:
+        '''(relationships, upper bound or None when unbounded) of each quantifier in a blanked query.'''
+        patterns = []
+        for quantifier in _QUANTIFIED_RELATIONSHIP.finditer(inspected):
+            patterns.append((1, self._quantifier_bound(quantifier)))
+        for quantifier in _QUANTIFIED_GROUP.finditer(inspected):
+            group = self._parenthesised_before(inspected, quantifier.start())
+            # Only a group of path patterns is quantified; f(x) * 2 and (a + b) * 2 are arithmetic
+            if group is None or not group.startswith("(") or not _GROUP_RELATIONSHIP.search(group):
+                continue
+            patterns.append((len(_GROUP_RELATIONSHIP.findall(group)), self._quantifier_bound(quantifier)))
+        return patterns
+
+    def _quantifier_bound(self, quantifier) -> Optional[int]:
+        symbol, lower, comma, upper = quantifier.groups()
+        if symbol in ("+", "*"):
+            return None
+        bound = upper if comma else lower
+        return int(bound) if bound else None
+
+    def _parenthesised_before(self, inspected: str, close: int) -> Optional[str]:
+        '''The text inside the parentheses closed at offset close, or None for a function call's arguments.'''
+        depth = 0
+        for position in range(close, -1, -1):
+            if inspected[position] == ")":
+                depth += 1
+            elif inspected[position] == "(":
+                depth -= 1
+                if depth == 0:
+                    preceding = inspected[position - 1:position]
+                    if preceding.isalnum() or preceding == "_":
+                        return None
+                    return inspected[position + 1:close].strip()
+        return None
+
+    def _strip_comments(self, cypher_query: str) -> Tuple[str, str]:
+        '''The query without comments and trailing semicolon, and the same query with its literals blanked.'''
+        query = cypher_query
+        inspected = _STRING_LITERAL.sub(lambda literal: literal.group(0)[0] + "x" * (len(literal.group(0)) - 2)
+                                        + literal.group(0)[0], query)
+        # Comments are found in the blanked query, so a // inside a string literal is kept
+        for comment in reversed(list(_COMMENT.finditer(inspected))):
+            query = query[:comment.start()] + query[comment.end():]
+            inspected = inspected[:comment.start()] + inspected[comment.end():]
+        # Both strings only differ inside literals, so stripping them alike keeps the offsets aligned
+        query, inspected = query.strip(), inspected.strip()
+        if query.endswith(';'):
+            query, inspected = query[:-1].rstrip(), inspected[:-1].rstrip()
+        return query, inspected
+
+    def _max_estimated_rows_in(self, plan: Optional[Dict[str, Any]]) -> float:
+        if not plan:
+            return 0.0
+        own = float(plan.get('args', {}).get('EstimatedRows', 0.0))
+        return max([own] + [self._max_estimated_rows_in(child) for child in plan.get('children', [])])
+
+    def _read_rows(self, tx, cypher_query: str) -> Tuple[List[Dict[str, Any]], int, bool]:
+        # Rows are pulled lazily, so stopping early leaves the rest of the result on the server
+        result = tx.run(cypher_query)
+        rows, size, truncated = [], 0, False
+        for record in result:
+            row = record.data()
+            size += len(json.dumps(row, default=str))
+            if len(rows) == self._max_rows or size > self._max_result_bytes:
+                truncated = True
+                break
+            rows.append(row)
+        return rows, size, truncated
+
+    def _execute_guarded(self, cypher_query: str) -> Tuple[List[Dict[str, Any]], bool]:
+        with get_tracer().span("neo4j.execute") as span:
+            query, estimated_rows = self._preflight(cypher_query)
+
+            @unit_of_work(timeout=self._timeout_seconds)
+            def read_rows(tx):
+                return self._read_rows(tx, query)
+
+            # A read transaction makes the server refuse any write the guards missed
+            with self._neo4j_driver.session(fetch_size=min(self._max_rows + 1, 1000)) as session:
+                records, size, truncated = session.execute_read(read_rows)
+            span.set_attribute("estimated_rows", estimated_rows)
+            span.set_attribute("rows", len(records))
+            span.set_attribute("bytes", size)
+            span.set_attribute("truncated", truncated)
+            return records, truncated
+
+    def execute_query(self, cypher_query: str) -> List[Dict[str, Any]]:
+        """
+        Run a generated query with the guards: pre-flight checks, a row limit, a read-only
+        transaction with a timeout, and row and byte caps while streaming the result.
+
+        Args:
+            cypher_query (str): Query produced by the model
+
+        Returns:
+            List[Dict[str, Any]]: At most max_rows records
+        """
+        records, _ = self._execute_guarded(cypher_query)
+        return records
+
+    def query(self, user_question: str) -> Dict[str, Any]:
+        try:
+            cypher_query = self.generate_cypher_query(user_question)
+            results, truncated = self._execute_guarded(cypher_query)
+            return {
+                "query": cypher_query,
+                "results": results,
+                "truncated": truncated,
+                "success": True
+            }
+        except Exception as e:
+            return {
+                "error": str(e),
+                "success": False
+            }
@@ -1,16 +1,28 @@
-import ollama
-
-class PseudocodeGenerationAgent:
-    def __init__(self):
-        self.model_name = "model_name"
-        self.system_prompt = system_prompt
-        self.model_cfg = "model_cfg"
-    
-    def generate_pseudocode(self, code):
-        messages = [
-            ollama.Message(self.system_prompt, "system"),
-            ollama.Message(user_input, "user")
-        ]
-
-        response = ollama.create_chat(self.model_name, self.model_cfg, messages)
-        return response.text
\ No newline at end of file
+import ollama
+
+from InferenceScheduler import get_inference_scheduler
+from PromptTemplates import load_prompt_template
+
+class PseudocodeGenerationAgent:
+    def __init__(self):
+        self._model_name = "codeqwen:7b-chat-v1.5-q8_0"
+        self._model_options = {
+            "temperature": 0.1,
+            "num_ctx": 10000,
+            "stop": ["<|im_start|>", "<|im_end|>"]
+        }
+
+    @property
+    def _prompt_template(self) -> str:
+        return load_prompt_template('pseudo_code_prompt.txt')
+
+    def generate_pseudocode(self, code_context, code_snippet, language_name="C#"):
+        prompt = self._prompt_template.format(
+            language_name=language_name,
+            code_context=code_context,
+            code_snippet=code_snippet
+        )
+
+        with get_inference_scheduler().slot("batch"):
+            response = ollama.generate(model=self._model_name, prompt=prompt, options=self._model_options)
+        return response['response']
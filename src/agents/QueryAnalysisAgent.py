@@ -1,68 +1,82 @@
-import json
-from typing import List
-import ollama
-
-class QueryAnalysisAgent:
-    
-    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0"):
-        self.model_name = model_name
-        self.prompt_template = self._load_prompt_template()
-
-    def _load_prompt_template(self) -> str:
-        with open('prompts/query_analysis_prompt.txt', 'r') as file:
-            return file.read()
-
-    def analyze_query(self, user_question: str) -> List[str]:
-        prompt = f"{self.prompt_template}\n\nUser Question: \"{user_question}\"\nResponse:"
-        
-        response = ollama.generate(model=self.model_name, prompt=prompt)
-        
-        try:
-            result = json.loads(response['response'])
-            if isinstance(result, list):
-                return result
-            elif result == "all":
-                return ["documentation_db", "code_db", "neo4j"]
-            else:
-                raise ValueError("Unexpected response format")
-        except json.JSONDecodeError:
-            # If the response is not valid JSON, return all databases
-            return ["documentation_db", "code_db", "neo4j"]
-
-class QueryAnalysisService:
-    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0"):
-        self.agent = QueryAnalysisAgent(model_name)
-
-    def analyze_query(self, user_question: str) -> dict:
-        """
-        Analyze the user's question and determine which databases should be queried.
-
-        Args:
-            user_question (str): The user's input question
-
-        Returns:
-            dict: A dictionary containing the analysis result
-        """
-        try:
-            databases_to_query = self.agent.analyze_query(user_question)
-            return {
-                "question": user_question,
-                "databases_to_query": databases_to_query,
-                "success": True
-            }
-        except Exception as e:
-            return {
-                "question": user_question,
-                "error": str(e),
-                "success": False,
-                "databases_to_query": ["documentation_db", "code_db", "neo4j"]  # Default to all if there's an error
-            }
-
-    def get_available_databases(self) -> List[str]:
-        """
-        Return a list of available databases that can be queried.
-
-        Returns:
-            List[str]: List of available database names
-        """
-        return ["documentation_db", "code_db", "neo4j"]
+import json
+from typing import List, Optional
+import ollama
+
+from InferenceScheduler import get_inference_scheduler
+from ModelCascade import ModelCascade
+from PromptTemplates import load_prompt_template
+from Tracer import get_tracer
+
+ALL_DATABASES = ["documentation_db", "code_db", "neo4j"]
+
+class QueryAnalysisAgent:
+    
+    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0"):
+        self.model_name = model_name
+        self.cascade = ModelCascade("query_analysis", model_name)
+
+    @property
+    def prompt_template(self) -> str:
+        return load_prompt_template('querying_analysis_prompt.txt')
+
+    def analyze_query(self, user_question: str) -> List[str]:
+        prompt = f"{self.prompt_template}\n\nUser Question: \"{user_question}\"\nResponse:"
+        
+        databases, _ = self.cascade.run(lambda model: self._analyze_with(model, prompt), self._is_valid)
+        # If no model gave a usable answer, query all databases
+        return databases if self._is_valid(databases) else list(ALL_DATABASES)
+
+    def _analyze_with(self, model_name: str, prompt: str) -> Optional[List[str]]:
+        with get_tracer().span("llm.query_analysis", model=model_name) as span:
+            with get_inference_scheduler().slot("interactive"):
+                response = ollama.generate(model=model_name, prompt=prompt)
+            span.record_llm_response(response)
+        
+        try:
+            result = json.loads(response['response'])
+        except json.JSONDecodeError:
+            return None
+        if result == "all":
+            return list(ALL_DATABASES)
+        return result if isinstance(result, list) else None
+
+    def _is_valid(self, databases: Optional[List[str]]) -> bool:
+        return bool(databases) and all(database in ALL_DATABASES for database in databases)
+
+class QueryAnalysisService:
+    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0"):
+        self.agent = QueryAnalysisAgent(model_name)
+
+    def analyze_query(self, user_question: str) -> dict:
+        """
+        Analyze the user's question and determine which databases should be queried.
+
+        Args:
+            user_question (str): The user's input question
+
+        Returns:
+            dict: A dictionary containing the analysis result
+        """
+        try:
+            databases_to_query = self.agent.analyze_query(user_question)
+            return {
+                "question": user_question,
+                "databases_to_query": databases_to_query,
+                "success": True
+            }
+        except Exception as e:
+            return {
+                "question": user_question,
+                "error": str(e),
+                "success": False,
+                "databases_to_query": ["documentation_db", "code_db", "neo4j"]  # Default to all if there's an error
+            }
+
+    def get_available_databases(self) -> List[str]:
+        """
+        Return a list of available databases that can be queried.
+
+        Returns:
+            List[str]: List of available database names
+        """
+        return ["documentation_db", "code_db", "neo4j"]
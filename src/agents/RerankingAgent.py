@@ -1,28 +1,87 @@
-import json
-from typing import List, Dict, Any
-import ollama
-
-class ReRankingAgent:
-    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0"):
-        self.model_name = model_name
-        self.prompt_template = self._load_prompt_template()
-
-    def _load_prompt_template(self) -> str:
-        with open('prompts/reranking_prompt.txt', 'r') as file:
-            return file.read()
-
-    def evaluate_relevance(self, question: str, data_item: str) -> Dict[str, Any]:
-        prompt = self.prompt_template.replace("(question)", question).replace("(searched_context)", data_item)
-        
-        response = ollama.generate(model=self.model_name, prompt=prompt)
-        
-        try:
-            result = json.loads(response['response'])
-            return result
-        except json.JSONDecodeError:
-            # If the response is not valid JSON, return a default low score
-            return {
-                "question": question,
-                "data_item": data_item,
-                "relevance_score": 0
-            }
+import hashlib
+import json
+import threading
+from typing import List, Dict, Any, Optional
+
+from ModelCascade import ModelCascade
+from PromptPrefixSession import PromptPrefixSession, split_prompt_template
+from PromptTemplates import load_prompt_template
+from Tracer import get_tracer
+
+class ReRankingAgent:
+    def __init__(self, model_name: str = "codeqwen:7b-chat-v1.5-q8_0"):
+        self.model_name = model_name
+        self.cascade = ModelCascade("rerank", model_name)
+        # Scores in this band are treated as low confidence and re-scored by the next model
+        self.uncertain_scores = self.cascade.option("uncertain_scores")
+        # Created on first use, so constructing the agent reads no prompt file
+        self.sessions: Dict[str, PromptPrefixSession] = {}
+        self._sessions_lock = threading.Lock()
+
+    @property
+    def prompt_template(self) -> str:
+        return load_prompt_template('reranking_prompt.txt')
+
+    @property
+    def prompt_prefix(self) -> str:
+        # The instructions are identical for every item; only the question and item change
+        return split_prompt_template(self.prompt_template, "###Input")[0]
+
+    @property
+    def prompt_tail(self) -> str:
+        return split_prompt_template(self.prompt_template, "###Input")[1]
+
+    @property
+    def scorer_fingerprint(self) -> str:
+        '''Identifies what the scores depend on besides question and document: models, escalation band and prompt.'''
+        return hashlib.sha1(json.dumps(
+            [self.cascade.models, self.uncertain_scores, self.prompt_template]
+        ).encode('utf-8')).hexdigest()
+
+    def _session(self, model_name: str) -> PromptPrefixSession:
+        with self._sessions_lock:
+            if model_name not in self.sessions:
+                self.sessions[model_name] = PromptPrefixSession(model_name, self.prompt_prefix, priority="rerank")
+            return self.sessions[model_name]
+
+    def evaluate_relevance(self, question: str, data_item: str) -> Dict[str, Any]:
+        tail = self.prompt_tail.replace("(question)", question).replace("(searched_context)", data_item)
+
+        result, _ = self.cascade.run(lambda model: self._evaluate_with(model, tail), self._is_confident,
+                                     usable=self._is_valid_score)
+        if not self._is_valid_score(result):
+            # If no model returned a valid score, return a default low score
+            return {
+                "question": question,
+                "data_item": data_item,
+                "relevance_score": 0,
+                "fallback": True
+            }
+        return result
+
+    def _evaluate_with(self, model_name: str, tail: str) -> Optional[Dict[str, Any]]:
+        session = self._session(model_name)
+        with get_tracer().span("llm.rerank", model=model_name) as span:
+            response = session.generate(tail)
+            span.record_llm_response(response)
+            span.set_attribute("prefix_tokens", session.prefix_tokens)
+            span.set_attribute("prefill_tokens_saved", session.record(response, tail))
+        
+        try:
+            result = json.loads(response['response'])
+            # The prompt describes the score as a string, so models return both "7" and 7
+            result["relevance_score"] = float(result["relevance_score"])
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return None
+        return result
+
+    def _is_valid_score(self, result: Optional[Dict[str, Any]]) -> bool:
+        return result is not None and 0 <= result["relevance_score"] <= 10
+
+    def _is_confident(self, result: Optional[Dict[str, Any]]) -> bool:
+        if not self._is_valid_score(result):
+            return False
+        if self.uncertain_scores:
+            low, high = self.uncertain_scores
+            return not low <= result["relevance_score"] <= high
+        return True
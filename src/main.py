@@ -1,75 +1,202 @@
-import argparse
-import sys
-from dotenv import load_dotenv
-import os
-
-# Import necessary components
-from CodeDocGenerator import CodeDocGenerator
-from CodebaseEmbedding import CodeFileEmbedding, CodeTextEmbedding
-from QueryService import QueryService
-from agents.QueryAnalysisAgent import QueryAnalysisAgent
-from searchEngine.SearchCodeEngine import SearchCodeEngine
-from searchEngine.SearchCodeDocEngine import SearchCodeDocEngine
-from searchEngine.SearchGraphDBEngine import SearchGraphDBEngine
-from Reranker import RerankingEngine
-from agents.BusinessDeterminerAgent import BusinessDeterminerAgent
-
-def generate_knowledge(codebase_path):
-    print("Generating knowledge from codebase...")
-    doc_generator = CodeDocGenerator()
-    doc_generator.generate_codebase_docs(codebase_path)
-    print("Knowledge generation complete.")
-
-def embed_knowledge(codebase_path):
-    print("Embedding knowledge...")
-    code_embedder = CodeFileEmbedding("./embeddings/code")
-    doc_embedder = CodeTextEmbedding("./embeddings/docs")
-    
-    code_embedder.embed_directory(codebase_path)
-    # Assuming doc_embedder needs to embed from a specific location
-    doc_embedder.embed_directory("./generated_docs")
-    
-    print("Knowledge embedding complete.")
-
-def run_query_service():
-    print("Starting query service...")
-    query_service = QueryService()
-    
-    while True:
-        user_input = input("Enter your question (or 'exit' to quit): ")
-        if user_input.lower() == 'exit':
-            break
-        
-        result = query_service.process_query(user_input)
-        print(f"\nAnswer: {result['answer']}")
-        print("\nSources:")
-        for source in result['sources']:
-            print(f"- [{source['db']}] {source['title']} (Relevance: {source['relevance_score']})")
-        print("\n")
-
-    print("Query service stopped.")
-
-def main():
-    load_dotenv()  # Load environment variables from .env file
-    
-    parser = argparse.ArgumentParser(description="Codebase Knowledge System")
-    parser.add_argument("mode", choices=['generate', 'embed', 'run'], 
-                        help="Mode of operation: generate knowledge, embed knowledge, or run query service")
-    parser.add_argument("--path", help="Path to the codebase (required for generate and embed modes)")
-    
-    args = parser.parse_args()
-
-    if args.mode in ['generate', 'embed'] and not args.path:
-        print("Error: --path argument is required for generate and embed modes")
-        sys.exit(1)
-
-    if args.mode == 'generate':
-        generate_knowledge(args.path)
-    elif args.mode == 'embed':
-        embed_knowledge(args.path)
-    else:  # run mode
-        run_query_service()
-
-
-if __name__ == "__main__":
+import argparse
+import json
+import sys
+from dotenv import load_dotenv
+import os
+
+from StartupProfiler import StartupProfiler
+
+# Each mode imports its own subsystem when it runs, so a mode never pays for chromadb, neo4j
+# or the agents of another mode
+_startup_profiler = None
+
+def startup_complete(mode):
+    '''Called by each mode once its subsystem is constructed; prints the import profile if requested.'''
+    global _startup_profiler
+    if _startup_profiler:
+        _startup_profiler.uninstall()
+        print(_startup_profiler.report(label=mode))
+        _startup_profiler = None
+
+def generate_knowledge(codebase_path):
+    print("Generating knowledge from codebase...")
+    from CodeDocGenerator import CodeDocGenerator
+
+    # The parser has already loaded the codebase at codebase_path into Neo4j; docs are generated from the graph
+    doc_generator = CodeDocGenerator()
+    startup_complete('generate')
+    summary = doc_generator.generate_codebase_docs()
+    print(f"Documented {summary['documented_methods']} methods: {summary['generated_methods']} by the model, "
+          f"{summary['template_methods']} from templates {summary['template_kinds']}, "
+          f"{summary['duplicate_methods']} reused from near-duplicates.")
+    print(f"Records written to {summary['output_directory']} in {len(summary['shards'])} namespace shards.")
+    print("Knowledge generation complete.")
+
+def embed_knowledge(codebase_path, shards=1):
+    print("Embedding knowledge...")
+    if shards > 1:
+        # Worker processes embed one shard each; the search engines query all shards
+        from ShardedEmbedding import ShardedEmbedding
+
+        code_embedder = ShardedEmbedding("./embeddings/code", shard_count=shards)
+        doc_embedder = ShardedEmbedding("./embeddings/docs", shard_count=shards)
+    else:
+        from CodebaseEmbedding import CodeFileEmbedding, CodeTextEmbedding
+
+        code_embedder = CodeFileEmbedding("./embeddings/code")
+        doc_embedder = CodeTextEmbedding("./embeddings/docs")
+    startup_complete('embed')
+    
+    code_embedder.embed_codebase(codebase_path, [".cs"])
+    # Follows the records while a concurrent generate run is still writing them
+    doc_summary = doc_embedder.embed_directory("./generated_docs")
+    print(f"Embedded docs of {doc_summary['successful_embeddings']} methods, "
+          f"{doc_summary['skipped_unchanged']} unchanged, {len(doc_summary['failed_embeddings'])} failed.")
+
+    # Precompute the graph neighborhoods the query service adds to search hits
+    if os.getenv('NEO4J_DATABASE_HOST'):
+        refresh_graph_neighborhood(doc_summary['changed_methods'])
+    else:
+        print("NEO4J_DATABASE_HOST is not set; skipping the graph neighborhood cache refresh.")
+    
+    print("Knowledge embedding complete.")
+
+def refresh_graph_neighborhood(changed_methods):
+    from neo4j import GraphDatabase
+    from GraphNeighborhoodCache import GraphNeighborhoodCache
+
+    driver = None
+    try:
+        driver = GraphDatabase.driver(os.getenv('NEO4J_DATABASE_HOST'), auth=(os.getenv('NOE4J_DATABASE_USER'), os.getenv('NOE4J_DATABASE_PW')))
+        neighborhood = GraphNeighborhoodCache(driver).refresh(changed_methods)
+        print(f"Graph neighborhood cache ({neighborhood['mode']} refresh): {neighborhood['nodes']} nodes, "
+              f"{neighborhood['relationships']} relationships.")
+    except Exception as e:
+        print(f"Error refreshing the graph neighborhood cache: {str(e)}")
+    finally:
+        if driver:
+            driver.close()
+
+def run_query_service(stats_interval=20):
+    print("Starting query service...")
+    from ModelCascade import format_cascade_stats, get_cascade_stats
+    from QueryService import QueryService
+
+    query_service = QueryService()
+    startup_complete('run')
+    
+    answered = 0
+    try:
+        while True:
+            user_input = input("Enter your question (or 'exit' to quit): ")
+            if user_input.lower() == 'exit':
+                break
+            
+            result = query_service.process_query(user_input)
+            print(f"\nAnswer: {result['answer']}")
+            print("\nSources:")
+            for source in result['sources']:
+                print(f"- [{source['db']}] {source['title']} (Relevance: {source['relevance_score']})")
+            print("\n")
+            answered += 1
+            if answered % stats_interval == 0:
+                print(f"Model escalation after {answered} questions:\n{format_cascade_stats(get_cascade_stats())}\n")
+    finally:
+        # Also reached on end of input or Ctrl-C
+        if answered:
+            print(f"Model escalation over {answered} questions:\n{format_cascade_stats(get_cascade_stats())}")
+
+    print("Query service stopped.")
+
+def summarize_trace(trace_path):
+    from Tracer import summarize_trace_file, format_trace_summary
+
+    startup_complete('trace')
+    summary = summarize_trace_file(trace_path)
+    print(format_trace_summary(summary))
+
+def run_benchmark(args):
+    print("Running benchmark...")
+    from Benchmark import BenchmarkRunner, DEFAULT_DATASET_PATH, format_benchmark_report
+
+    runner = BenchmarkRunner(
+        dataset_path=args.dataset or DEFAULT_DATASET_PATH,
+        ollama_host=args.ollama_host,
+        max_methods=args.max_methods,
+        max_queries=args.max_queries
+    )
+    startup_complete('bench')
+    results = runner.run()
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(format_benchmark_report(results))
+    print(f"Results written to {args.output}")
+
+def run_batch_search(args):
+    print("Running batch search...")
+    from BatchSearchService import BatchSearchService, read_questions
+
+    batch_service = BatchSearchService(batch_size=args.batch_size)
+    startup_complete('batch')
+    summary = batch_service.run(read_questions(args.questions), args.output)
+    print(f"Searched {summary['questions']} questions in {summary['batches']} batches; results written to {args.output}")
+
+def main():
+    load_dotenv()  # Load environment variables from .env file
+    
+    parser = argparse.ArgumentParser(description="Codebase Knowledge System")
+    parser.add_argument("mode", choices=['generate', 'embed', 'run', 'trace', 'bench', 'batch'], 
+                        help="Mode of operation: generate knowledge, embed knowledge, run query service, summarize a trace file, run the offline benchmark, or batch search a question file")
+    parser.add_argument("--path", help="Path to the codebase (required for generate and embed modes)")
+    parser.add_argument("--trace-file", help="JSON lines file that spans are written to (run) or read from (trace)")
+    parser.add_argument("--dataset", help="Benchmark dataset of ranked method docs (bench mode, default: the RapidSCADA feedback dataset)")
+    parser.add_argument("--ollama-host", help="Benchmark against this ollama host instead of the deterministic stub (bench mode)")
+    parser.add_argument("--max-methods", type=int, help="Limit the number of methods replayed (bench mode)")
+    parser.add_argument("--max-queries", type=int, help="Limit the number of questions replayed (bench mode)")
+    parser.add_argument("--questions", help="Question file, plain text or JSON lines (batch mode)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Questions embedded and searched per call (batch mode)")
+    parser.add_argument("--output", help="Results file (bench mode: JSON, default bench_results.json; batch mode: JSON lines, default batch_results.jsonl)")
+    parser.add_argument("--shards", type=int, default=1, help="Embed with this many worker processes, one vector store shard each (embed mode)")
+    parser.add_argument("--profile-startup", action="store_true", help="Report the import time per module once the mode has started")
+    
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        global _startup_profiler
+        _startup_profiler = StartupProfiler()
+        _startup_profiler.install()
+
+    if args.mode in ['generate', 'embed'] and not args.path:
+        print("Error: --path argument is required for generate and embed modes")
+        sys.exit(1)
+
+    if args.mode == 'trace' and not args.trace_file:
+        print("Error: --trace-file argument is required for trace mode")
+        sys.exit(1)
+
+    if args.mode == 'batch' and not args.questions:
+        print("Error: --questions argument is required for batch mode")
+        sys.exit(1)
+
+    if args.trace_file and args.mode != 'trace':
+        # The tracer is created lazily, so the environment decides where spans are exported
+        os.environ['TRACE_FILE'] = args.trace_file
+
+    if args.mode == 'generate':
+        generate_knowledge(args.path)
+    elif args.mode == 'embed':
+        embed_knowledge(args.path, args.shards)
+    elif args.mode == 'trace':
+        summarize_trace(args.trace_file)
+    elif args.mode == 'bench':
+        args.output = args.output or "bench_results.json"
+        run_benchmark(args)
+    elif args.mode == 'batch':
+        args.output = args.output or "batch_results.jsonl"
+        run_batch_search(args)
+    else:  # run mode
+        run_query_service()
+
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,491 @@
+import json
+import re
+import threading
+from typing import List, Dict, Any, Optional, Iterable
+
+from GraphNeighborhoodCache import edge_fingerprint
+
+
+class InMemoryNode:
+    '''Mimics the parts of neo4j.graph.Node used by this project'''
+
+    def __init__(self, node_id: int, labels: Iterable[str], properties: Dict[str, Any]):
+        self.id = node_id
+        self.element_id = str(node_id)
+        self.labels = frozenset(labels)
+        self._properties = dict(properties)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._properties.get(key, default)
+
+    def items(self):
+        return self._properties.items()
+
+    def keys(self):
+        return self._properties.keys()
+
+    def set(self, key: str, value: Any):
+        # Used by SET queries; neo4j's own Node objects are read-only snapshots
+        self._properties[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        return self._properties[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._properties
+
+    def __repr__(self):
+        return f"<InMemoryNode id={self.id} labels={set(self.labels)} properties={self._properties}>"
+
+
+class InMemoryRecord:
+    '''Mimics neo4j.Record'''
+
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    def keys(self) -> List[str]:
+        return list(self._data.keys())
+
+    def values(self) -> List[Any]:
+        return list(self._data.values())
+
+    def data(self) -> Dict[str, Any]:
+        return {key: dict(value.items()) if isinstance(value, InMemoryNode) else value
+                for key, value in self._data.items()}
+
+
+class InMemoryResult:
+    '''Mimics neo4j.Result: iterable records plus single() and consume()'''
+
+    def __init__(self, records: List[Dict[str, Any]], plan: Optional[Dict[str, Any]] = None):
+        self._records = [InMemoryRecord(record) for record in records]
+        self._plan = plan
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self) -> Optional[InMemoryRecord]:
+        return self._records[0] if self._records else None
+
+    def data(self) -> List[Dict[str, Any]]:
+        return [record.data() for record in self._records]
+
+    def keys(self) -> List[str]:
+        return self._records[0].keys() if self._records else []
+
+    def consume(self) -> "InMemoryResultSummary":
+        return InMemoryResultSummary(self._plan)
+
+
+class InMemoryResultSummary:
+    '''Mimics neo4j.ResultSummary; only EXPLAIN results carry a plan'''
+
+    def __init__(self, plan: Optional[Dict[str, Any]] = None):
+        self.plan = plan
+
+
+class UnsupportedQueryError(Exception):
+    pass
+
+
+class ReadOnlyAccessError(Exception):
+    '''Raised for writes inside a read transaction, like Neo4j's "Writing in read access mode not allowed"'''
+
+
+class InMemoryGraph:
+    '''
+    A tiny property graph that answers the Cypher shapes issued by MethodGraphAnalyzer,
+    CodeDocEmbedding and Neo4jQueryAgent, plus simple single-hop MATCH/RETURN queries like the
+    ones the stub LLM generates. Anything else raises UnsupportedQueryError.
+    '''
+
+    def __init__(self):
+        self._nodes: Dict[int, InMemoryNode] = {}
+        self._by_fqn: Dict[str, int] = {}
+        self._relationships: List[tuple] = []  # (start_id, type, end_id)
+        self._lock = threading.RLock()
+        self._handlers = [
+            (r"CALL gds\.graph\.project\.cypher", self._project_graph),
+            (r"CALL gds\.dag\.topologicalSort\.stream", self._topological_sort),
+            (r"CALL db\.schema\.nodeTypeProperties", self._node_type_properties),
+            (r"CALL db\.schema\.relTypeProperties", self._rel_type_properties),
+            (r"^CALL db\.labels\(\)", self._schema_names),
+            (r"^MATCH (?:\(n:`|\(\)-\[r:`)[^`]+`[\])-]+ RETURN '", self._schema_counts),
+            (r"^MATCH \(a\)-\[r:([\w|]+)\]->\(b\)", self._neighborhood_edges),
+            (r"^MATCH \(n\) WHERE \(n:\w+(?: OR n:\w+)*\)", self._neighborhood_nodes),
+            (r"MATCH \(c:Class \{FullyQualifiedName: \$class_name\}\)\s+OPTIONAL MATCH \(c\)-\[:HAS_METHOD\]->\(m:Method\)",
+             self._class_with_method_docs),
+            (r"MATCH \(c:Class\) WHERE c\.FullyQualifiedName STARTS WITH \$namespace(?: AND c\.FullyQualifiedName IN \$class_names)? OPTIONAL MATCH \(c\)-\[:HAS_METHOD\]->\(m:Method\)",
+             self._project_classes_with_method_docs),
+            (r"MATCH \(c:Class\)\s+WHERE c\.FullyQualifiedName STARTS WITH \$namespace", self._project_classes),
+            (r"MATCH \((\w+):(\w+) \{FullyQualifiedName: \$(\w+)\}\) RETURN \1$", self._node_by_fqn),
+            (r"MATCH \((\w+):(\w+) \{FullyQualifiedName: \$(\w+)\}\) RETURN \1\[\$(\w+)\] AS (\w+)$",
+             self._property_by_fqn),
+            (r"MATCH \((\w+):(\w+)\) RETURN \1 \{([^}]*)\} AS (\w+)$", self._map_projection),
+            (r"MATCH \((\w+):(\w+) \{FullyQualifiedName: \$(\w+)\}\) SET (.+)$", self._set_by_fqn),
+            (r"MATCH \(", self._simple_match),
+        ]
+
+    # -- loading --------------------------------------------------------------------------------
+
+    def add_node(self, labels: Iterable[str], **properties) -> InMemoryNode:
+        with self._lock:
+            node = InMemoryNode(len(self._nodes), labels, properties)
+            self._nodes[node.id] = node
+            if "FullyQualifiedName" in properties:
+                self._by_fqn[properties["FullyQualifiedName"]] = node.id
+            return node
+
+    def add_relationship(self, start_fqn: str, rel_type: str, end_fqn: str):
+        with self._lock:
+            self._relationships.append((self._by_fqn[start_fqn], rel_type, self._by_fqn[end_fqn]))
+
+    def load_from_feedback_dataset(self, dataset_path: str, max_classes: Optional[int] = None,
+                                   max_methods: Optional[int] = None) -> "InMemoryGraph":
+        """
+        Populate the graph from the RapidSCADA doc-quality dataset: one Class node per key, one
+        Method node per entry, HAS_METHOD edges, and each method INVOKES the next one in its class
+        so the method graph has a non-trivial topological order. The dataset has signatures only;
+        a method's body logs and calls the next method, and the last method of a class is empty.
+
+        Args:
+            dataset_path (str): Path to valid_feedback_with_context.json
+            max_classes (Optional[int]): Only load the first N classes
+            max_methods (Optional[int]): Stop after N methods
+
+        Returns:
+            InMemoryGraph: self, for chaining
+        """
+        with open(dataset_path, 'r', encoding='utf-8') as file:
+            dataset = json.load(file)
+
+        methods = 0
+        for class_name, entries in list(dataset.items())[:max_classes]:
+            if max_methods is not None and methods >= max_methods:
+                break
+            namespace, _, short_name = class_name.rpartition('.')
+            file_location = f"{namespace.replace('.', '/')}/{short_name}.cs"
+            self.add_node(["Class"], Name=short_name, FullyQualifiedName=class_name, Namespace=namespace,
+                          Label="Class", Accessibility="public", documentation=f"Class {class_name}",
+                          FileLocations=[file_location])
+            signatures = list(dict.fromkeys(entry["function_name"] for entry in entries
+                                            if f"{class_name}.{entry['function_name']}" not in self._by_fqn))
+            if max_methods is not None:
+                signatures = signatures[:max_methods - methods]
+            reasonings = {entry["function_name"]: entry.get("Reasoning", entry.get("reasoning", ""))
+                          for entry in reversed(entries)}
+            for index, signature in enumerate(signatures):
+                fqn = f"{class_name}.{signature}"
+                name = signature.split('(')[0]
+                following = signatures[index + 1].split('(')[0] if index + 1 < len(signatures) else None
+                body = f"    Log.WriteAction(\"{name}\");\n    {following}();\n" if following else ""
+                self.add_node(["Method"], Name=name, FullyQualifiedName=fqn,
+                              Namespace=namespace, Label="Method", Accessibility="public", FileLocation=file_location,
+                              RawDeclaration=f"public void {signature}", ReturnType="void",
+                              CodeSnippet=f"public void {signature}\n{{\n{body}}}", IsConstruct=False,
+                              IsDestructor=False, IsAbstract=False, documentation=reasonings[signature], pseudo_code="")
+                self.add_relationship(class_name, "HAS_METHOD", fqn)
+                if index:
+                    self.add_relationship(f"{class_name}.{signatures[index - 1]}", "INVOKES", fqn)
+            methods += len(signatures)
+        return self
+
+    # -- querying -------------------------------------------------------------------------------
+
+    def run(self, query: str, parameters: Optional[Dict[str, Any]] = None, read_only: bool = False) -> InMemoryResult:
+        normalized = " ".join(query.split())
+        parameters = parameters or {}
+        # EXPLAIN only plans the query: unsupported shapes fail, nothing is returned or written
+        explain = normalized.upper().startswith("EXPLAIN ")
+        if explain:
+            normalized = normalized[len("EXPLAIN "):]
+        with self._lock:
+            for pattern, handler in self._handlers:
+                match = re.search(pattern, normalized)
+                if match:
+                    writes = handler == self._set_by_fqn
+                    if explain:
+                        # The plan's only argument is the row estimate, which here is exact
+                        rows = 0 if writes else len(handler(normalized, parameters, match))
+                        return InMemoryResult([], plan={"operatorType": "ProduceResults@inmemory",
+                                                        "args": {"EstimatedRows": float(rows)}, "children": []})
+                    if writes and read_only:
+                        raise ReadOnlyAccessError("Writing in read access mode not allowed")
+                    return InMemoryResult(handler(normalized, parameters, match))
+        raise UnsupportedQueryError(f"Unsupported query shape: {normalized[:120]}")
+
+    def _nodes_with_label(self, label: str) -> List[InMemoryNode]:
+        return [node for node in self._nodes.values() if label in node.labels]
+
+    def _targets(self, node_id: int, rel_type: str) -> List[InMemoryNode]:
+        return [self._nodes[end] for start, kind, end in self._relationships if start == node_id and kind == rel_type]
+
+    def _project_graph(self, query, parameters, match):
+        return [{"graphName": "methodGraph", "nodeCount": len(self._nodes_with_label("Method"))}]
+
+    def _topological_sort(self, query, parameters, match):
+        methods = {node.id for node in self._nodes_with_label("Method")}
+        incoming = {node_id: 0 for node_id in methods}
+        for start, kind, end in self._relationships:
+            if kind == "INVOKES" and start in methods and end in methods:
+                incoming[end] += 1
+        ready = sorted(node_id for node_id, count in incoming.items() if count == 0)
+        ordered = []
+        while ready:
+            node_id = ready.pop(0)
+            ordered.append(node_id)
+            for target in self._targets(node_id, "INVOKES"):
+                incoming[target.id] -= 1
+                if incoming[target.id] == 0:
+                    ready.append(target.id)
+        # Nodes on cycles are never emitted, matching gds.dag.topologicalSort
+        if "ORDER BY nodeId" in query:
+            ordered.sort()
+        return [{"methodName": self._nodes[node_id].get("FullyQualifiedName")} for node_id in ordered]
+
+    def _node_type_properties(self, query, parameters, match):
+        properties: Dict[tuple, set] = {}
+        for node in self._nodes.values():
+            key = tuple(sorted(node.labels))
+            for name, value in node.items():
+                properties.setdefault(key, set()).add(f"{name}: {self._type_name(value)}")
+        return [{"nodeLabels": list(labels), "properties": sorted(props)} for labels, props in properties.items()]
+
+    def _rel_type_properties(self, query, parameters, match):
+        return [{"relTypes": sorted({f":`{kind}`" for _, kind, _ in self._relationships})}]
+
+    def _schema_names(self, query, parameters, match):
+        labels = sorted({label for node in self._nodes.values() for label in node.labels})
+        types = sorted({kind for _, kind, _ in self._relationships})
+        keys = sorted({name for node in self._nodes.values() for name, _ in node.items()})
+        return ([{"kind": "label", "name": name} for name in labels]
+                + [{"kind": "type", "name": name} for name in types]
+                + [{"kind": "property", "name": name} for name in keys])
+
+    def _schema_counts(self, query, parameters, match):
+        '''
+        Handles the UNION ALL of per-label and per-type count queries used as a schema fingerprint,
+        and GraphNeighborhoodCache's edge fingerprint among them.
+        '''
+        rows = []
+        for part in query.split(" UNION ALL "):
+            fingerprint = re.match(r"MATCH \(a\)-\[r:([\w|]+)\]->\(b\) .* RETURN '([\w:]+)' AS key, sum\(", part)
+            if fingerprint:
+                rel_types = set(fingerprint.group(1).split("|"))
+                rows.append({"key": fingerprint.group(2), "count": sum(
+                    edge_fingerprint(start, kind, end) for start, kind, end in self._relationships
+                    if kind in rel_types and self._nodes[start].get("FullyQualifiedName")
+                    and self._nodes[end].get("FullyQualifiedName")
+                )})
+                continue
+            shape = re.fullmatch(r"MATCH (?:\(n:`([^`]+)`\)|\(\)-\[r:`([^`]+)`\]->\(\)) "
+                                 r"RETURN '(\w+):' \+ \"([^\"]*)\" AS key, count\(\w\) AS count", part)
+            if not shape:
+                raise UnsupportedQueryError(f"Unsupported count query: {part[:120]}")
+            label, rel_type, kind, name = shape.groups()
+            count = len(self._nodes_with_label(label)) if label else \
+                sum(1 for _, kind_, _ in self._relationships if kind_ == rel_type)
+            rows.append({"key": f"{kind}:{name}", "count": count})
+        return rows
+
+    def _neighborhood_edges(self, query, parameters, match):
+        '''Handles GraphNeighborhoodCache's relationship read, optionally limited to relationships touching $names.'''
+        rel_types = set(match.group(1).split("|"))
+        names = set(parameters["names"]) if "IN $names" in query else None
+        rows = []
+        for start, kind, end in self._relationships:
+            source, target = self._nodes[start].get("FullyQualifiedName"), self._nodes[end].get("FullyQualifiedName")
+            if kind in rel_types and (names is None or source in names or target in names):
+                rows.append({"source": source, "type": kind, "target": target, "source_id": start, "target_id": end})
+        return rows
+
+    def _neighborhood_nodes(self, query, parameters, match):
+        '''Handles GraphNeighborhoodCache's node read, optionally limited to $names.'''
+        labels = set(re.findall(r"n:(\w+)", match.group(0)))
+        names = set(parameters["names"]) if "IN $names" in query else None
+        return [
+            {"name": node.get("FullyQualifiedName"), "labels": sorted(node.labels),
+             "files": node.get("FileLocations") or [node.get("FileLocation")], "id": node.id}
+            for node in self._nodes.values()
+            if node.labels & labels and (names is None or node.get("FullyQualifiedName") in names)
+        ]
+
+    def _type_name(self, value: Any) -> str:
+        if isinstance(value, bool):
+            return "Boolean"
+        if isinstance(value, int):
+            return "Long"
+        if isinstance(value, float):
+            return "Double"
+        if isinstance(value, list):
+            return "StringArray"
+        return "String"
+
+    def _class_with_method_docs(self, query, parameters, match):
+        node_id = self._by_fqn.get(parameters.get("class_name"))
+        if node_id is None or "Class" not in self._nodes[node_id].labels:
+            return []
+        methods = self._targets(node_id, "HAS_METHOD")
+        return [{
+            "class_doc": self._nodes[node_id].get("documentation"),
+            "method_docs": [m.get("documentation") for m in methods if m.get("documentation") is not None],
+            "method_pseudocodes": [m.get("pseudo_code") for m in methods if m.get("pseudo_code") is not None]
+        }]
+
+    def _project_classes_with_method_docs(self, query, parameters, match):
+        rows = []
+        for class_row in self._project_classes(query, parameters, match):
+            class_name = class_row["class_name"]
+            if "IN $class_names" in query and class_name not in parameters["class_names"]:
+                continue
+            class_data = self._class_with_method_docs(query, {"class_name": class_name}, match)[0]
+            rows.append({"class_name": class_name, **class_data})
+        return rows
+
+    def _project_classes(self, query, parameters, match):
+        namespace = parameters.get("namespace", "")
+        return [{"class_name": node.get("FullyQualifiedName")} for node in self._nodes_with_label("Class")
+                if node.get("FullyQualifiedName", "").startswith(namespace)]
+
+    def _node_by_fqn(self, query, parameters, match):
+        variable, label, parameter = match.groups()
+        node_id = self._by_fqn.get(parameters.get(parameter))
+        if node_id is None or label not in self._nodes[node_id].labels:
+            return []
+        return [{variable: self._nodes[node_id]}]
+
+    def _property_by_fqn(self, query, parameters, match):
+        variable, label, name_parameter, property_parameter, alias = match.groups()
+        node_id = self._by_fqn.get(parameters.get(name_parameter))
+        if node_id is None or label not in self._nodes[node_id].labels:
+            return []
+        return [{alias: self._nodes[node_id].get(parameters.get(property_parameter))}]
+
+    def _map_projection(self, query, parameters, match):
+        variable, label, projection, alias = match.groups()
+        keys = [item.strip()[1:] for item in projection.split(",") if item.strip()]
+        return [{alias: {key: node.get(key) for key in keys}} for node in self._nodes_with_label(label)]
+
+    def _set_by_fqn(self, query, parameters, match):
+        variable, label, parameter, assignments = match.groups()
+        node_id = self._by_fqn.get(parameters.get(parameter))
+        if node_id is None or label not in self._nodes[node_id].labels:
+            return []
+        for assignment in assignments.split(","):
+            assignment_match = re.fullmatch(rf"\s*{variable}\.(\w+) = \$(\w+)\s*", assignment)
+            if not assignment_match:
+                raise UnsupportedQueryError(f"Unsupported SET item: {assignment.strip()}")
+            prop, value_parameter = assignment_match.groups()
+            self._nodes[node_id].set(prop, parameters.get(value_parameter))
+        return []
+
+    def _simple_match(self, query, parameters, match):
+        '''
+        Handles "MATCH (a:Label)[-[:REL]->(b:Label)] [WHERE a.Prop <op> <value>] RETURN a.Prop [AS x], ... [LIMIT n]"
+        where <op> is =, CONTAINS, STARTS WITH or IN and <value> is a string literal or a $parameter.
+        '''
+        shape = re.fullmatch(
+            r"MATCH \((\w+)(?::(\w+))?\)(?:-\[:(\w+)\]->\((\w+)(?::(\w+))?\))?"
+            r"(?: WHERE (\w+)\.(\w+) (=|CONTAINS|STARTS WITH|IN) ('[^']*'|\"[^\"]*\"|\$\w+))?"
+            r" RETURN (.+?)(?: LIMIT (\d+))?;?",
+            query
+        )
+        if not shape:
+            raise UnsupportedQueryError(f"Unsupported query shape: {query[:120]}")
+        (first_var, first_label, rel_type, second_var, second_label,
+         where_var, where_prop, where_op, where_value, returns, limit) = shape.groups()
+
+        bindings = []
+        for node in self._nodes.values():
+            if first_label and first_label not in node.labels:
+                continue
+            if not rel_type:
+                bindings.append({first_var: node})
+                continue
+            for target in self._targets(node.id, rel_type):
+                if not second_label or second_label in target.labels:
+                    bindings.append({first_var: node, second_var: target})
+
+        if where_var:
+            expected = parameters.get(where_value[1:]) if where_value.startswith("$") else where_value[1:-1]
+            bindings = [b for b in bindings if self._compare(b[where_var].get(where_prop), where_op, expected)]
+
+        projections = []
+        for item in returns.split(","):
+            item_match = re.fullmatch(r"\s*(\w+)(?:\.(\w+))?(?: AS (\w+))?\s*", item)
+            if not item_match:
+                raise UnsupportedQueryError(f"Unsupported RETURN item: {item.strip()}")
+            variable, prop, alias = item_match.groups()
+            projections.append((variable, prop, alias or (f"{variable}.{prop}" if prop else variable)))
+
+        rows = []
+        for binding in bindings[:int(limit) if limit else None]:
+            rows.append({alias: binding[variable].get(prop) if prop else binding[variable]
+                         for variable, prop, alias in projections})
+        return rows
+
+    def _compare(self, actual: Any, op: str, expected: Any) -> bool:
+        if actual is None:
+            return False
+        if op == "=":
+            return actual == expected
+        if op == "IN":
+            return actual in expected
+        if op == "CONTAINS":
+            return str(expected) in str(actual)
+        return str(actual).startswith(str(expected))
+
+
+class InMemorySession:
+    def __init__(self, graph: InMemoryGraph):
+        self._graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self, query, parameters: Optional[Dict[str, Any]] = None, **kwargs) -> InMemoryResult:
+        return self._graph.run(str(query), {**(parameters or {}), **kwargs})
+
+    def execute_read(self, work, *args, **kwargs):
+        return work(InMemoryTransaction(self._graph, read_only=True), *args, **kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        return work(self, *args, **kwargs)
+
+    def close(self):
+        pass
+
+
+class InMemoryTransaction:
+    def __init__(self, graph: InMemoryGraph, read_only: bool = False):
+        self._graph = graph
+        self._read_only = read_only
+
+    def run(self, query, parameters: Optional[Dict[str, Any]] = None, **kwargs) -> InMemoryResult:
+        return self._graph.run(str(query), {**(parameters or {}), **kwargs}, read_only=self._read_only)
+
+
+class InMemoryGraphDriver:
+    '''Drop-in replacement for a neo4j Driver, to be passed as the `driver` argument of the graph clients'''
+
+    def __init__(self, graph: Optional[InMemoryGraph] = None):
+        self.graph = graph or InMemoryGraph()
+
+    def session(self, **kwargs) -> InMemorySession:
+        return InMemorySession(self.graph)
+
+    def verify_connectivity(self):
+        pass
+
+    def close(self):
+        pass
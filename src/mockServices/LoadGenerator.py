@@ -0,0 +1,115 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+
+from agents.QueryAnalysisAgent import QueryAnalysisService
+from searchEngine.SearchGraphDBEngine import SearchGraphDBEngine
+from Reranker import Reranker
+from RerankScoreCache import RerankScoreCache
+from GenerateAnswerService import GenerateAnswerService
+from mockServices.InMemoryGraph import InMemoryGraph, InMemoryGraphDriver
+from mockServices.MockOllamaServer import MockOllamaServer, LatencyModel, use_ollama_host
+from Tracer import get_tracer, percentile
+
+
+class LoadGenerator:
+    '''
+    Drives concurrent question traffic through query analysis, graph search, reranking and answer
+    generation, against the mock ollama server and the in-memory graph.
+    Run from the src directory: python -m mockServices.LoadGenerator --concurrency 8 --requests 200
+    '''
+
+    def __init__(self, graph_driver, questions: List[str], concurrency: int = 4):
+        self._questions = questions
+        self._concurrency = concurrency
+        self._analysis_service = QueryAnalysisService()
+        self._graph_engine = SearchGraphDBEngine(None, None, None, driver=graph_driver)
+        # Scores are cached within a run only, so repeated runs measure the same workload
+        self._score_cache_directory = tempfile.TemporaryDirectory()
+        self._reranker = Reranker(score_cache=RerankScoreCache(
+            os.path.join(self._score_cache_directory.name, "rerank_scores.sqlite")))
+        self._answer_service = GenerateAnswerService()
+        self._tracer = get_tracer()
+        self._errors = 0
+        self._errors_lock = threading.Lock()
+
+    def _issue(self, question: str) -> float:
+        started = time.monotonic()
+        try:
+            with self._tracer.span("load.request"):
+                self._analysis_service.analyze_query(question)
+                graph_result = self._graph_engine.search(question)
+                candidates = [{"content": json.dumps(record, default=str), "source_db": "neo4j"}
+                              for record in graph_result.get("results", [])]
+                reranked = self._reranker.rerank(question, candidates)
+                answer = self._answer_service.generate_answer(question, reranked)
+                if graph_result["status"] != "success" or not answer["success"]:
+                    raise RuntimeError(graph_result.get("message") or answer.get("error"))
+        except Exception:
+            with self._errors_lock:
+                self._errors += 1
+        return (time.monotonic() - started) * 1000.0
+
+    def run(self, total_requests: int) -> Dict[str, Any]:
+        """
+        Issue total_requests questions using `concurrency` worker threads.
+
+        Args:
+            total_requests (int): Number of questions to send, cycling through the question list
+
+        Returns:
+            Dict[str, Any]: Request count, error count, throughput and latency percentiles in milliseconds
+        """
+        questions = [self._questions[i % len(self._questions)] for i in range(total_requests)]
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            latencies = sorted(executor.map(self._issue, questions))
+        elapsed = time.monotonic() - started
+
+        return {
+            "requests": total_requests,
+            "concurrency": self._concurrency,
+            "errors": self._errors,
+            "seconds": elapsed,
+            "requests_per_second": total_requests / elapsed if elapsed else 0.0,
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else 0.0
+            }
+        }
+
+
+def build_questions(graph: InMemoryGraph, limit: int = 50) -> List[str]:
+    result = graph.run(f"MATCH (c:Class) RETURN c.FullyQualifiedName AS name LIMIT {limit}")
+    return [f"Which methods does {record['name']} call?" for record in result]
+
+
+if __name__ == "__main__":
+    import argparse
+    from Benchmark import DEFAULT_DATASET_PATH
+
+    parser = argparse.ArgumentParser(description="Concurrent load test against the mock ollama server and in-memory graph")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET_PATH)
+    parser.add_argument("--max-classes", type=int)
+    parser.add_argument("--latency", choices=LatencyModel.DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--mean-ms", type=float, default=50.0)
+    parser.add_argument("--stddev-ms", type=float, default=20.0)
+    parser.add_argument("--per-token-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    in_memory_graph = InMemoryGraph().load_from_feedback_dataset(args.dataset, args.max_classes)
+    latency = LatencyModel(args.latency, args.mean_ms, args.stddev_ms, args.per_token_ms, args.seed)
+    with MockOllamaServer(generate_latency=latency, embed_latency=latency) as mock_server:
+        use_ollama_host(mock_server.url)
+        generator = LoadGenerator(InMemoryGraphDriver(in_memory_graph), build_questions(in_memory_graph),
+                                  concurrency=args.concurrency)
+        print(json.dumps(generator.run(args.requests), indent=2))
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional
+
+
+class DeterministicResponder:
+    '''Produces stable, parseable answers for each prompt used by the agents'''
+
+    EMBEDDING_DIMENSION = 768
+
+    def __init__(self, embedding_dimension: int = EMBEDDING_DIMENSION):
+        self.embedding_dimension = embedding_dimension
+
+    def _digest(self, text: str) -> int:
+        return int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'big')
+
+    def generate(self, prompt: str) -> str:
+        """
+        Pick a canned answer by recognising the prompt template, so the callers' parsers succeed.
+
+        Args:
+            prompt (str): The full prompt sent to /api/generate or the last chat message
+
+        Returns:
+            str: The deterministic model output for this prompt
+        """
+        digest = self._digest(prompt)
+        if '"documentation"' in prompt and "code_with_comments" in prompt:
+            return json.dumps({
+                "documentation": f"/// <summary>Generated documentation {digest % 10000}.</summary>",
+                "code_with_comments": "// generated comment\n" + prompt[-200:],
+                "pseudocode": f"Overview: step {digest % 7}\nInputs: none\nOutputs: none"
+            })
+        if "pseudocode" in prompt.lower() and "high-quality pseudocode" in prompt:
+            return f"Overview: process the input\nInputs: see signature\nSteps:\n  1. step {digest % 7}"
+        if "relevance_score" in prompt:
+            return json.dumps({"relevance_score": digest % 11})
+        if "documentation_db" in prompt and "code_db" in prompt:
+            choices = [["documentation_db", "code_db"], ["neo4j"], ["documentation_db"], "all"]
+            return json.dumps(choices[digest % len(choices)])
+        if "Cypher" in prompt:
+            return "MATCH (m:Method) RETURN m.FullyQualifiedName AS name LIMIT 10"
+        return f"Deterministic answer {digest % 100000} based on the provided context."
+
+    def embed(self, text: str) -> List[float]:
+        """
+        Hash each token into a fixed-size vector and L2-normalise it. Texts that share tokens get
+        similar vectors, so nearest-neighbour results are stable and meaningful.
+
+        Args:
+            text (str): The text to embed
+
+        Returns:
+            List[float]: The embedding vector
+        """
+        vector = [0.0] * self.embedding_dimension
+        for token in re.findall(r"[A-Za-z_][A-Za-z0-9_]*|\d+", text.lower()):
+            bucket = self._digest(token)
+            sign = 1.0 if bucket & 1 else -1.0
+            vector[(bucket >> 1) % self.embedding_dimension] += sign
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+
+class LatencyModel:
+    '''Configurable service time for simulated model calls'''
+
+    DISTRIBUTIONS = ("none", "constant", "uniform", "normal", "lognormal")
+
+    def __init__(self, distribution: str = "none", mean_ms: float = 0.0, stddev_ms: float = 0.0,
+                 per_token_ms: float = 0.0, seed: int = 0):
+        """
+        Args:
+            distribution (str): One of none, constant, uniform, normal or lognormal
+            mean_ms (float): Mean fixed latency per call in milliseconds
+            stddev_ms (float): Spread of the fixed latency (half-width for uniform)
+            per_token_ms (float): Additional latency per prompt and generated token
+            seed (int): Seed for the random generator so runs are reproducible
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: [{distribution}]")
+        self.distribution = distribution
+        self.mean_ms = mean_ms
+        self.stddev_ms = stddev_ms
+        self.per_token_ms = per_token_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_seconds(self, token_count: int = 0) -> float:
+        with self._lock:
+            if self.distribution == "constant":
+                fixed = self.mean_ms
+            elif self.distribution == "uniform":
+                fixed = self._random.uniform(self.mean_ms - self.stddev_ms, self.mean_ms + self.stddev_ms)
+            elif self.distribution == "normal":
+                fixed = self._random.gauss(self.mean_ms, self.stddev_ms)
+            elif self.distribution == "lognormal" and self.mean_ms > 0:
+                # Parameterise the underlying normal so the samples have the requested mean and stddev
+                variance = math.log(1 + (self.stddev_ms / self.mean_ms) ** 2)
+                fixed = self._random.lognormvariate(math.log(self.mean_ms) - variance / 2, math.sqrt(variance))
+            else:
+                fixed = 0.0
+        return max(0.0, fixed + self.per_token_ms * token_count) / 1000.0
+
+
+class MockOllamaServer:
+    '''In-process HTTP server that speaks the subset of the ollama REST API used by this project'''
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, responder: Optional[DeterministicResponder] = None,
+                 generate_latency: Optional[LatencyModel] = None, embed_latency: Optional[LatencyModel] = None):
+        self.responder = responder or DeterministicResponder()
+        self.generate_latency = generate_latency or LatencyModel()
+        self.embed_latency = embed_latency or LatencyModel()
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        # Last prompt per loaded model, standing in for the runner's KV cache
+        self._prompt_cache: Dict[str, str] = {}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def _uncached_prompt(self, model: str, prompt: str, keep_alive: Any) -> str:
+        '''Like the Ollama runner, only the part after the prefix shared with the previous prompt is evaluated.'''
+        with self._count_lock:
+            previous = self._prompt_cache.get(model, "")
+            if keep_alive in (0, "0", "0s"):
+                self._prompt_cache.pop(model, None)
+            else:
+                self._prompt_cache[model] = prompt
+        return prompt[len(os.path.commonprefix([previous, prompt])):]
+
+    def _timings(self, prompt_tokens: int, eval_tokens: int, elapsed_ns: int) -> Dict[str, int]:
+        return {
+            "total_duration": elapsed_ns,
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": elapsed_ns // 2,
+            "eval_count": eval_tokens,
+            "eval_duration": elapsed_ns - elapsed_ns // 2
+        }
+
+    def handle(self, path: str, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Build the response objects for one API call. Streaming calls return one object per chunk.
+
+        Args:
+            path (str): Request path, e.g. "/api/generate"
+            body (Dict[str, Any]): Decoded JSON request body
+
+        Returns:
+            List[Dict[str, Any]]: Response objects in the order they should be sent
+        """
+        self._count_request()
+        started = time.monotonic_ns()
+        model = body.get("model", "")
+        created_at = datetime.now(timezone.utc).isoformat()
+
+        if path == "/api/generate":
+            prompt = (body.get("system") or "") + body.get("prompt", "")
+            text = self.responder.generate(prompt)
+            evaluated = self._uncached_prompt(model, prompt, body.get("keep_alive"))
+            time.sleep(self.generate_latency.sample_seconds((len(evaluated) + len(text)) // 4))
+            response = {"model": model, "created_at": created_at, "response": text, "done": True,
+                        "context": [len(prompt) % 32000]}
+            response.update(self._timings(len(evaluated) // 4, max(1, len(text) // 4), time.monotonic_ns() - started))
+            return self._maybe_stream(body, response, "response")
+
+        if path == "/api/chat":
+            messages = body.get("messages", [])
+            prompt = "\n".join(message.get("content", "") for message in messages)
+            text = self.responder.generate(prompt)
+            time.sleep(self.generate_latency.sample_seconds((len(prompt) + len(text)) // 4))
+            response = {"model": model, "created_at": created_at, "done": True,
+                        "message": {"role": "assistant", "content": text}}
+            response.update(self._timings(len(prompt) // 4, max(1, len(text) // 4), time.monotonic_ns() - started))
+            return self._maybe_stream(body, response, "message")
+
+        if path == "/api/embed":
+            inputs = body.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+            embeddings = [self.responder.embed(text) for text in inputs]
+            time.sleep(self.embed_latency.sample_seconds(sum(len(text) // 4 for text in inputs)))
+            response = {"model": model, "embeddings": embeddings}
+            response.update(self._timings(sum(len(text) // 4 for text in inputs), 0, time.monotonic_ns() - started))
+            return [response]
+
+        if path == "/api/embeddings":
+            prompt = body.get("prompt", "")
+            time.sleep(self.embed_latency.sample_seconds(len(prompt) // 4))
+            return [{"embedding": self.responder.embed(prompt)}]
+
+        raise KeyError(path)
+
+    def _maybe_stream(self, body: Dict[str, Any], response: Dict[str, Any], field: str) -> List[Dict[str, Any]]:
+        if not body.get("stream", False):
+            return [response]
+        text = response[field]["content"] if field == "message" else response[field]
+        chunks = [text[i:i + 16] for i in range(0, len(text), 16)] or [""]
+        parts = []
+        for chunk in chunks:
+            part = {"model": response["model"], "created_at": response["created_at"], "done": False}
+            part[field] = {"role": "assistant", "content": chunk} if field == "message" else chunk
+            parts.append(part)
+        final = dict(response)
+        final[field] = {"role": "assistant", "content": ""} if field == "message" else ""
+        parts.append(final)
+        return parts
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                try:
+                    parts = server.handle(self.path, body)
+                except KeyError:
+                    self.send_error(404, f"Unknown endpoint {self.path}")
+                    return
+                streaming = len(parts) > 1
+                payload = b"".join(json.dumps(part).encode('utf-8') + (b"\n" if streaming else b"") for part in parts)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson" if streaming else "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                payload = json.dumps({"models": []}).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def use_ollama_host(host: str):
+    '''
+    Point the module-level ollama helpers (ollama.generate, ollama.embed, ...) at another server.
+    The agents call these helpers, which are bound to a client created when ollama is imported.
+    '''
+    import ollama
+
+    client = ollama.Client(host=host)
+    for name in ("generate", "chat", "embed", "embeddings"):
+        setattr(ollama, name, getattr(client, name))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Run from the src directory: python -m mockServices.MockOllamaServer --latency lognormal --mean-ms 200
+    parser = argparse.ArgumentParser(description="Deterministic stand-in for an ollama server")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", choices=LatencyModel.DISTRIBUTIONS, default="none")
+    parser.add_argument("--mean-ms", type=float, default=0.0)
+    parser.add_argument("--stddev-ms", type=float, default=0.0)
+    parser.add_argument("--per-token-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    latency = LatencyModel(args.latency, args.mean_ms, args.stddev_ms, args.per_token_ms, args.seed)
+    with MockOllamaServer(port=args.port, generate_latency=latency) as mock_server:
+        print(f"Mock ollama server listening on {mock_server.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
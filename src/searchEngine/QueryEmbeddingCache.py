@@ -0,0 +1,112 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Dict, Callable, Optional
+
+from searchEngine.VectorBackend import EmbedFunction, ollama_embed_function
+
+
+class QueryEmbeddingCache:
+    '''
+    Per-model LRU cache of question embeddings shared by the search engines.
+    Concurrent requests for the same question wait for the first request's embedding call
+    instead of issuing their own.
+    '''
+
+    def __init__(self, max_entries_per_model: int = 2048,
+                 embed_function_factory: Callable[[str], EmbedFunction] = ollama_embed_function):
+        self._max_entries = max_entries_per_model
+        self._embed_function_factory = embed_function_factory
+        self._embed_functions: Dict[str, EmbedFunction] = {}
+        self._entries: Dict[str, OrderedDict] = {}
+        self._in_flight: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return text.strip()
+
+    def get_embedding(self, model_name: str, text: str) -> List[float]:
+        return self.get_embeddings(model_name, [text])[0]
+
+    def get_embeddings(self, model_name: str, texts: List[str]) -> List[List[float]]:
+        """
+        Return one embedding per text, embedding all uncached texts in a single call.
+
+        Args:
+            model_name (str): Embedding model; each model has its own cache
+            texts (List[str]): Questions to embed
+
+        Returns:
+            List[List[float]]: Embeddings in the order of `texts`
+        """
+        keys = [self._key(text) for text in texts]
+        results: Dict[str, List[float]] = {}
+        waiting: Dict[str, Future] = {}
+        owned: Dict[str, Future] = {}
+
+        with self._lock:
+            entries = self._entries.setdefault(model_name, OrderedDict())
+            for key in dict.fromkeys(keys):
+                if key in entries:
+                    entries.move_to_end(key)
+                    results[key] = entries[key]
+                    self.hits += 1
+                elif (model_name, key) in self._in_flight:
+                    waiting[key] = self._in_flight[(model_name, key)]
+                    self.hits += 1
+                else:
+                    future = Future()
+                    self._in_flight[(model_name, key)] = future
+                    owned[key] = future
+                    self.misses += 1
+
+        if owned:
+            try:
+                embeddings = self._embed_function(model_name)(list(owned.keys()))
+            except Exception as e:
+                with self._lock:
+                    for key, future in owned.items():
+                        del self._in_flight[(model_name, key)]
+                        future.set_exception(e)
+                raise
+            with self._lock:
+                for (key, future), embedding in zip(owned.items(), embeddings):
+                    entries[key] = embedding
+                    del self._in_flight[(model_name, key)]
+                    future.set_result(embedding)
+                    results[key] = embedding
+                while len(entries) > self._max_entries:
+                    entries.popitem(last=False)
+
+        for key, future in waiting.items():
+            results[key] = future.result()
+
+        return [results[key] for key in keys]
+
+    def contains(self, model_name: str, text: str) -> bool:
+        with self._lock:
+            return self._key(text) in self._entries.get(model_name, {})
+
+    def _embed_function(self, model_name: str) -> EmbedFunction:
+        if model_name not in self._embed_functions:
+            self._embed_functions[model_name] = self._embed_function_factory(model_name)
+        return self._embed_functions[model_name]
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+_shared_cache: Optional[QueryEmbeddingCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    '''Return the process-wide query embedding cache.'''
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = QueryEmbeddingCache()
+        return _shared_cache
@@ -1,28 +1,49 @@
-from typing import List, Dict
-from chromadb import Client, Settings
-
-class SearchCodeDocEngine:
-    def __init__(self, persistence_directory: str):
-        self.chroma_client = Client(Settings(
-            persist_directory=persistence_directory,
-            anonymized_telemetry=False
-        ))
-        self.collection = self.chroma_client.get_collection("code_doc_embeddings")
-
-    def query_similar_docs(self, query: str, n_results: int = 5) -> List[Dict]:
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            include=["metadatas", "documents", "distances"]
-        )
-
-        similar_docs = []
-        for i in range(len(results['ids'][0])):
-            similar_docs.append({
-                "class_name": results['metadatas'][0][i]['class_name'],
-                "type": results['metadatas'][0][i]['type'],
-                "content": results['documents'][0][i],
-                "similarity_score": 1 - results['distances'][0][i]
-            })
-
-        return similar_docs
+from typing import List, Dict, Any, Optional
+from searchEngine.VectorBackend import create_vector_backend
+
+class SearchCodeDocEngine:
+    def __init__(self, persistence_directory: str, backend=None, model_name: str = "nomic-embed-text-v1.5"):
+        self.model_name = model_name
+        self.backend = backend or create_vector_backend(persistence_directory, "code_doc_embeddings", model_name)
+
+    def query_similar_docs(self, query: str, n_results: int = 5, query_embedding: Optional[List[float]] = None) -> List[Dict]:
+        # A precomputed embedding (from self.model_name) skips the embedding round trip
+        if query_embedding is not None:
+            results = self.backend.query(query_embeddings=[query_embedding], n_results=n_results)
+        else:
+            results = self.backend.query(
+                query_texts=[query],
+                n_results=n_results
+            )
+
+        return self._parse_results(results, 0)
+
+    def query_similar_docs_batch(self, query_embeddings: List[List[float]], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Look up many questions with a single backend call.
+
+        Args:
+            query_embeddings (List[List[float]]): Question embeddings from self.model_name
+            n_results (int): Results per question
+
+        Returns:
+            List[List[Dict]]: Similar docs per question, in input order
+        """
+        results = self.backend.query(query_embeddings=query_embeddings, n_results=n_results)
+        return [self._parse_results(results, q) for q in range(len(results['ids']))]
+
+    def _parse_results(self, results: Dict[str, List[List[Any]]], q: int) -> List[Dict]:
+        similar_docs = []
+        for i in range(len(results['ids'][q])):
+            similar_doc = {
+                "class_name": results['metadatas'][q][i]['class_name'],
+                "type": results['metadatas'][q][i]['type'],
+                "content": results['documents'][q][i],
+                "similarity_score": 1 - results['distances'][q][i]
+            }
+            # Method records (CodeTextEmbedding) also name their method; class records do not
+            if results['metadatas'][q][i].get('method_name'):
+                similar_doc["method_name"] = results['metadatas'][q][i]['method_name']
+            similar_docs.append(similar_doc)
+
+        return similar_docs
@@ -1,28 +1,45 @@
-from typing import List, Dict
-from chromadb import Client, Settings
-
-class SearchCodeEngine:
-    def __init__(self, persistence_directory: str):
-        self.chroma_client = Client(Settings(
-            persist_directory=persistence_directory,
-            anonymized_telemetry=False
-        ))
-        self.collection = self.chroma_client.get_collection("code_embeddings")
-
-    def query_similar_code(self, query: str, n_results: int = 5) -> List[Dict]:
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            include=["metadatas", "documents", "distances"]
-        )
-
-        similar_code = []
-        for i in range(len(results['ids'][0])):
-            similar_code.append({
-                "file_name": results['metadatas'][0][i]['file_name'],
-                "file_path": results['metadatas'][0][i]['file_path'],
-                "content": results['documents'][0][i],
-                "similarity_score": 1 - results['distances'][0][i]
-            })
-
-        return similar_code
+from typing import List, Dict, Any, Optional
+from searchEngine.VectorBackend import create_vector_backend
+
+class SearchCodeEngine:
+    def __init__(self, persistence_directory: str, backend=None, model_name: str = "jina-embeddings-v2-base-code"):
+        self.model_name = model_name
+        self.backend = backend or create_vector_backend(persistence_directory, "code_embeddings", model_name)
+
+    def query_similar_code(self, query: str, n_results: int = 5, query_embedding: Optional[List[float]] = None) -> List[Dict]:
+        # A precomputed embedding (from self.model_name) skips the embedding round trip
+        if query_embedding is not None:
+            results = self.backend.query(query_embeddings=[query_embedding], n_results=n_results)
+        else:
+            results = self.backend.query(
+                query_texts=[query],
+                n_results=n_results
+            )
+
+        return self._parse_results(results, 0)
+
+    def query_similar_code_batch(self, query_embeddings: List[List[float]], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Look up many questions with a single backend call.
+
+        Args:
+            query_embeddings (List[List[float]]): Question embeddings from self.model_name
+            n_results (int): Results per question
+
+        Returns:
+            List[List[Dict]]: Similar code per question, in input order
+        """
+        results = self.backend.query(query_embeddings=query_embeddings, n_results=n_results)
+        return [self._parse_results(results, q) for q in range(len(results['ids']))]
+
+    def _parse_results(self, results: Dict[str, List[List[Any]]], q: int) -> List[Dict]:
+        similar_code = []
+        for i in range(len(results['ids'][q])):
+            similar_code.append({
+                "file_name": results['metadatas'][q][i]['file_name'],
+                "file_path": results['metadatas'][q][i]['file_path'],
+                "content": results['documents'][q][i],
+                "similarity_score": 1 - results['distances'][q][i]
+            })
+
+        return similar_code
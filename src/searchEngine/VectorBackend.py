@@ -0,0 +1,376 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional
+
+import numpy as np
+
+from InferenceScheduler import get_inference_scheduler
+from ShardedEmbedding import read_shard_manifest, shard_directories
+
+# Maps a batch of texts to their embedding vectors
+EmbedFunction = Callable[[List[str]], List[List[float]]]
+
+
+def ollama_embed_function(model_name: str, priority: str = "interactive") -> EmbedFunction:
+    def embed(texts: List[str]) -> List[List[float]]:
+        import ollama
+        with get_inference_scheduler().slot(priority):
+            return ollama.embed(model=model_name, input=texts)['embeddings']
+    return embed
+
+
+class ChromaVectorBackend:
+    '''The original backend: a persistent Chroma collection with its HNSW index'''
+
+    def __init__(self, persistence_directory: str, collection_name: str):
+        # chromadb takes most of a second to import; the quantized backend does not need it
+        from chromadb import Client, Settings
+
+        self.chroma_client = Client(Settings(
+            persist_directory=persistence_directory,
+            is_persistent=True,
+            anonymized_telemetry=False
+        ))
+        self.collection = self.chroma_client.get_collection(collection_name)
+
+    @property
+    def space(self) -> str:
+        '''Distance function of the collection: "l2" (Chroma's default, squared), "cosine" or "ip".'''
+        space = (self.collection.metadata or {}).get("hnsw:space")
+        configuration = getattr(self.collection, "configuration", None)
+        if not space and isinstance(configuration, dict):
+            space = (configuration.get("hnsw") or {}).get("space")
+        return space or "l2"
+
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Optional[List[List[float]]] = None,
+              n_results: int = 5) -> Dict[str, List[List[Any]]]:
+        if query_embeddings is not None:
+            return self.collection.query(query_embeddings=query_embeddings, n_results=n_results,
+                                         include=["metadatas", "documents", "distances"])
+        return self.collection.query(query_texts=query_texts, n_results=n_results,
+                                     include=["metadatas", "documents", "distances"])
+
+    def export(self) -> Dict[str, List[Any]]:
+        return self.collection.get(include=["embeddings", "metadatas", "documents"])
+
+
+class ShardedVectorBackend:
+    '''
+    Queries every shard of a collection written by ShardedEmbedding, concurrently, and keeps the
+    n nearest results over all shards. Query texts are embedded once, not once per shard.
+    '''
+
+    def __init__(self, backends: List[Any], embed_function: EmbedFunction):
+        self.backends = backends
+        self._embed_function = embed_function
+        self._pool = ThreadPoolExecutor(max_workers=len(backends)) if len(backends) > 1 else None
+
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Optional[List[List[float]]] = None,
+              n_results: int = 5) -> Dict[str, List[List[Any]]]:
+        if query_embeddings is None:
+            query_embeddings = self._embed_function(query_texts)
+
+        def query_shard(backend):
+            return backend.query(query_embeddings=query_embeddings, n_results=n_results)
+        shard_results = list(self._pool.map(query_shard, self.backends)) if self._pool else \
+            [query_shard(backend) for backend in self.backends]
+
+        results = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+        for q in range(len(query_embeddings)):
+            nearest = sorted(
+                ((distance, shard, i) for shard, shard_result in enumerate(shard_results)
+                 for i, distance in enumerate(shard_result["distances"][q])),
+                key=lambda match: match[0]
+            )[:n_results]
+            for key in results:
+                results[key].append([shard_results[shard][key][q][i] for _, shard, i in nearest])
+        return results
+
+    @property
+    def space(self) -> str:
+        return self.backends[0].space
+
+    def export(self) -> Dict[str, List[Any]]:
+        exported = {"ids": [], "embeddings": [], "metadatas": [], "documents": []}
+        for backend in self.backends:
+            shard = backend.export()
+            for key in exported:
+                exported[key].extend(shard[key])
+        return exported
+
+
+class QuantizedVectorIndex:
+    '''
+    Read-only vector index stored as memory-mapped files:
+      codes.npy      int8 codes (one scale per row) or sign bits packed 8 per byte
+      scales.npy     per-row dequantisation scale (int8 mode only)
+      vectors.npy    normalised float32 vectors, touched only when re-scoring candidates
+      norms.npy      the vectors' original lengths, for distances other than cosine
+      payload.bin    UTF-8 JSON of [id, metadata, document] per row, addressed by offsets.npy
+    Opening the index maps the files without reading them, so it starts in milliseconds and
+    worker processes share the page cache. Candidates are picked by the source collection's
+    distance function on the quantised codes, then re-scored with the float vectors, so
+    similarity scores mean the same whichever backend answers.
+    '''
+
+    MODES = ("int8", "binary")
+    SPACES = ("l2", "cosine", "ip")
+    # Binary codes rank much more coarsely, so they need a wider candidate pool to keep recall
+    DEFAULT_RESCORE_FACTORS = {"int8": 8, "binary": 64}
+    # int8 codes are widened to float32 one chunk at a time: 8192 rows of 768 dimensions is 24 MB
+    SCAN_CHUNK_ROWS = 8192
+    # Queries scored together by one matrix product; with SCAN_CHUNK_ROWS it bounds the score matrix
+    QUERY_BLOCK = 64
+    _POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+    def __init__(self, index_directory: str, embed_function: Optional[EmbedFunction] = None,
+                 rescore_factor: Optional[int] = None):
+        """
+        Args:
+            index_directory (str): Directory written by QuantizedVectorIndex.build
+            embed_function (Optional[EmbedFunction]): Used to embed query_texts; defaults to ollama with the index's model
+            rescore_factor (Optional[int]): Candidates re-scored with float vectors per requested result
+        """
+        with open(os.path.join(index_directory, "manifest.json"), 'r', encoding='utf-8') as file:
+            self.manifest = json.load(file)
+        self.mode = self.manifest["mode"]
+        self.count = self.manifest["count"]
+        self.rescore_factor = rescore_factor or self.DEFAULT_RESCORE_FACTORS[self.mode]
+        self._codes = np.load(os.path.join(index_directory, "codes.npy"), mmap_mode='r')
+        self._vectors = np.load(os.path.join(index_directory, "vectors.npy"), mmap_mode='r')
+        self._offsets = np.load(os.path.join(index_directory, "offsets.npy"), mmap_mode='r')
+        # Indexes built before distances followed the collection's space returned cosine distances
+        self.space = self.manifest.get("space", "cosine")
+        norms_path = os.path.join(index_directory, "norms.npy")
+        self._norms = np.load(norms_path, mmap_mode='r') if os.path.exists(norms_path) else None
+        self._scales = (np.load(os.path.join(index_directory, "scales.npy"), mmap_mode='r')
+                        if self.mode == "int8" else None)
+        self._payload = np.memmap(os.path.join(index_directory, "payload.bin"), dtype=np.uint8, mode='r') \
+            if self.manifest["payload_bytes"] else np.zeros(0, dtype=np.uint8)
+        self._embed_function = embed_function or ollama_embed_function(self.manifest.get("model_name", ""))
+
+    @staticmethod
+    def build(index_directory: str, ids: List[str], embeddings, metadatas: List[Dict[str, Any]],
+              documents: List[str], mode: str = "int8", model_name: str = "", space: str = "l2"):
+        """
+        Quantise a set of vectors and write the index files.
+
+        Args:
+            index_directory (str): Output directory
+            ids (List[str]): Record ids
+            embeddings: Float vectors, one per record
+            metadatas (List[Dict[str, Any]]): Record metadata
+            documents (List[str]): Record documents
+            mode (str): "int8" (4x smaller than float32) or "binary" (32x smaller)
+            model_name (str): Embedding model of the vectors, used to embed query texts
+            space (str): Distance function of the source collection ("l2", "cosine" or "ip"), returned by queries
+        """
+        if mode not in QuantizedVectorIndex.MODES:
+            raise ValueError(f"Unknown quantisation mode: [{mode}]")
+        if space not in QuantizedVectorIndex.SPACES:
+            raise ValueError(f"Unknown distance function: [{space}]")
+        os.makedirs(index_directory, exist_ok=True)
+
+        # An empty collection has no rows to infer the dimension from; it becomes an empty index
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1) if len(ids) \
+            else np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        np.save(os.path.join(index_directory, "norms.npy"), norms[:, 0].astype(np.float32))
+
+        if mode == "int8":
+            scales = np.abs(vectors).max(axis=1, initial=0.0) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.round(vectors / scales[:, None]).astype(np.int8)
+            np.save(os.path.join(index_directory, "scales.npy"), scales.astype(np.float32))
+        else:
+            codes = np.packbits(vectors > 0, axis=1)
+        np.save(os.path.join(index_directory, "codes.npy"), codes)
+        np.save(os.path.join(index_directory, "vectors.npy"), vectors)
+
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        with open(os.path.join(index_directory, "payload.bin"), 'wb') as file:
+            for row, (record_id, metadata, document) in enumerate(zip(ids, metadatas, documents)):
+                encoded = json.dumps([record_id, metadata, document]).encode('utf-8')
+                file.write(encoded)
+                offsets[row + 1] = offsets[row] + len(encoded)
+        np.save(os.path.join(index_directory, "offsets.npy"), offsets)
+
+        with open(os.path.join(index_directory, "manifest.json"), 'w', encoding='utf-8') as file:
+            json.dump({"mode": mode, "count": len(ids), "dimension": int(vectors.shape[1]),
+                       "model_name": model_name, "space": space, "payload_bytes": int(offsets[-1])}, file)
+
+    def _coarse_candidates(self, queries: np.ndarray, candidate_count: int, query_norms: np.ndarray) -> np.ndarray:
+        '''
+        Rows of the candidate_count best coarse scores per query. The codes estimate the cosine
+        similarity, which the stored norms turn into the collection's distance, so candidates are
+        picked by the measure they are ranked by. Only a running top-k is kept between chunks, so
+        memory is bounded by the chunk size rather than the row count.
+        '''
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        if self.mode == "binary":
+            query_bits = np.packbits(queries > 0, axis=1)
+        for start in range(0, self.count, self.SCAN_CHUNK_ROWS):
+            end = min(start + self.SCAN_CHUNK_ROWS, self.count)
+            codes = self._codes[start:end]
+            if self.mode == "int8":
+                similarities = (queries @ codes.astype(np.float32).T) * self._scales[start:end]
+            else:
+                differing = np.empty((len(queries), end - start), dtype=np.float32)
+                for i, bits in enumerate(query_bits):
+                    differing[i] = self._POPCOUNT[np.bitwise_xor(codes, bits)].sum(axis=1, dtype=np.int32)
+                # The share of differing sign bits estimates the angle between the vectors
+                similarities = np.cos(np.pi * differing / self.manifest["dimension"])
+            scores = -self._distances(np.arange(start, end), similarities, query_norms[:, None])
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))], axis=1)
+            if scores.shape[1] > candidate_count:
+                keep = np.argpartition(-scores, candidate_count - 1, axis=1)[:, :candidate_count]
+                scores, rows = np.take_along_axis(scores, keep, axis=1), np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+        return best_rows
+
+    def _search_many(self, queries: np.ndarray, n_results: int, query_norms: Optional[np.ndarray] = None) -> List[tuple]:
+        '''(rows, distances) per normalised query, nearest first; query_norms are the queries' original lengths.'''
+        n_results = min(n_results, self.count)
+        if n_results == 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)) for _ in queries]
+        query_norms = np.ones(len(queries)) if query_norms is None else np.asarray(query_norms, dtype=np.float64)
+        candidate_count = min(self.count, n_results * self.rescore_factor)
+
+        matches = []
+        for block_start in range(0, len(queries), self.QUERY_BLOCK):
+            block = queries[block_start:block_start + self.QUERY_BLOCK]
+            block_norms = query_norms[block_start:block_start + self.QUERY_BLOCK]
+            block_candidates = self._coarse_candidates(block, candidate_count, block_norms)
+            for query, query_norm, candidates in zip(block, block_norms, block_candidates):
+                candidates = np.sort(candidates)  # sequential page access on the float vectors
+                distances = self._distances(candidates, self._vectors[candidates] @ query, float(query_norm))
+                order = np.argsort(distances)[:n_results]
+                matches.append((candidates[order], distances[order]))
+        return matches
+
+    def _search(self, query: np.ndarray, n_results: int, query_norm: float = 1.0):
+        return self._search_many(query[None, :], n_results, np.array([query_norm]))[0]
+
+    def _record(self, row: int):
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return json.loads(self._payload[start:end].tobytes().decode('utf-8'))
+
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Optional[List[List[float]]] = None,
+              n_results: int = 5) -> Dict[str, List[List[Any]]]:
+        """
+        Chroma-compatible query. Distances use the source collection's distance function, like
+        Chroma: squared euclidean for "l2", 1 - cosine similarity for "cosine", 1 - dot product for "ip".
+        """
+        if query_embeddings is None:
+            query_embeddings = self._embed_function(query_texts)
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        results = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+        for rows, distances in self._search_many(queries, n_results, norms[:, 0]):
+            records = [self._record(int(row)) for row in rows]
+            results["ids"].append([record[0] for record in records])
+            results["metadatas"].append([record[1] for record in records])
+            results["documents"].append([record[2] for record in records])
+            results["distances"].append(distances.tolist())
+        return results
+
+    def _distances(self, rows: np.ndarray, similarities: np.ndarray, query_norm) -> np.ndarray:
+        '''Distances from cosine similarities to rows; query_norm is a float, or a column per row of similarities.'''
+        if self.space == "cosine":
+            return 1 - similarities.astype(np.float64)
+        row_norms = np.asarray(self._norms[rows], dtype=np.float64) if self._norms is not None else np.ones(len(rows))
+        dot = similarities.astype(np.float64) * row_norms * query_norm
+        if self.space == "ip":
+            return 1 - dot
+        return np.maximum(query_norm ** 2 + row_norms ** 2 - 2 * dot, 0.0)
+
+    def recall_at_k(self, query_embeddings: List[List[float]], k: int = 10) -> float:
+        """
+        Fraction of the exact float32 top-k that the quantised search returns.
+
+        Args:
+            query_embeddings (List[List[float]]): Sample query vectors
+            k (int): Cut-off
+
+        Returns:
+            float: Mean recall@k over the sample
+        """
+        hits = 0
+        total = 0
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            query_norm = float(np.linalg.norm(query))
+            query = query / (query_norm or 1)
+            exact = np.argsort(self._distances(np.arange(self.count), self._vectors @ query, query_norm))[:k]
+            approximate, _ = self._search(query, k, query_norm)
+            hits += len(set(exact.tolist()) & set(approximate.tolist()))
+            total += len(exact)
+        return hits / total if total else 1.0
+
+
+def quantized_index_directory(persistence_directory: str, collection_name: str) -> str:
+    return os.path.join(persistence_directory, f"{collection_name}.qidx")
+
+
+def _chroma_backend(persistence_directory: str, collection_name: str, model_name: str = ""):
+    '''The collection's Chroma data: all shards when ShardedEmbedding wrote it, else the single collection.'''
+    manifest = read_shard_manifest(persistence_directory, collection_name)
+    if manifest is None:
+        return ChromaVectorBackend(persistence_directory, collection_name)
+    return ShardedVectorBackend(
+        [ChromaVectorBackend(directory, collection_name)
+         for directory in shard_directories(persistence_directory, collection_name, manifest)],
+        ollama_embed_function(model_name or manifest["model_name"])
+    )
+
+
+def create_vector_backend(persistence_directory: str, collection_name: str, model_name: str = ""):
+    '''
+    Select the backend from $VECTOR_BACKEND: "chroma" (default) or "quantized", which opens the
+    index built next to the Chroma data by build_quantized_index_from_chroma. A sharded
+    collection is queried across all of its shards.
+    '''
+    backend = os.getenv('VECTOR_BACKEND', 'chroma')
+    if backend == 'chroma':
+        return _chroma_backend(persistence_directory, collection_name, model_name)
+    if backend == 'quantized':
+        return QuantizedVectorIndex(quantized_index_directory(persistence_directory, collection_name),
+                                    embed_function=ollama_embed_function(model_name) if model_name else None)
+    raise ValueError(f"Unknown vector backend: [{backend}]")
+
+
+def build_quantized_index_from_chroma(persistence_directory: str, collection_name: str, mode: str = "int8",
+                                      model_name: str = "") -> str:
+    # The shards of a sharded collection are merged into one index
+    if not model_name:
+        manifest = read_shard_manifest(persistence_directory, collection_name)
+        model_name = manifest["model_name"] if manifest else ""
+    if not model_name:
+        raise ValueError(f"The embedding model of {collection_name} is needed to embed query texts; pass model_name")
+    source = _chroma_backend(persistence_directory, collection_name, model_name)
+    exported = source.export()
+    index_directory = quantized_index_directory(persistence_directory, collection_name)
+    QuantizedVectorIndex.build(index_directory, exported["ids"], exported["embeddings"], exported["metadatas"],
+                               exported["documents"], mode=mode, model_name=model_name, space=source.space)
+    return index_directory
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Run from the src directory:
+    # python -m searchEngine.VectorBackend ./embeddings/code code_embeddings --mode int8 --model-name jina-embeddings-v2-base-code
+    parser = argparse.ArgumentParser(description="Build a quantized, memory-mapped index from a Chroma collection")
+    parser.add_argument("persistence_directory")
+    parser.add_argument("collection_name")
+    parser.add_argument("--mode", choices=QuantizedVectorIndex.MODES, default="int8")
+    parser.add_argument("--model-name", required=True,
+                        help="Embedding model of the collection, e.g. jina-embeddings-v2-base-code; used to embed query texts")
+    args = parser.parse_args()
+
+    print(build_quantized_index_from_chroma(args.persistence_directory, args.collection_name, args.mode, args.model_name))